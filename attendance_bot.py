@@ -1,9 +1,34 @@
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 from dotenv import load_dotenv
+import argparse
+import asyncio
+import contextvars
+import functools
+import hashlib
+import io
+import multiprocessing
+import tarfile
+import tempfile
+import threading
 import time
 import os
+import urllib.request
+import fnmatch
+import json
 import logging
-from urllib.parse import urlparse
+import re
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from urllib.parse import parse_qs, quote, urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # Slack workspace and channel identifiers
 TEAM_ID = "TNS9HAY6M"
@@ -15,6 +40,9 @@ EMAIL = os.getenv("SLACK_EMAIL")
 PASSWORD = os.getenv("SLACK_PASSWORD")
 SESSION_FILE = os.getenv("SESSION_FILE", "slack_auth.json")
 WORKSPACE_DOMAIN = os.getenv("WORKSPACE_DOMAIN", "wbscodingschool.slack.com")
+# Overridable so the bot can be pointed at a local stand-in (see benchmarks/).
+SLACK_URL_SCHEME = os.getenv("SLACK_URL_SCHEME", "https").strip()
+SLACK_APP_HOST = os.getenv("SLACK_APP_HOST", "app.slack.com").strip()
 BROWSER_PROFILE_DIR = os.getenv("BROWSER_PROFILE_DIR", "").strip()
 LOG_FILE = os.getenv("LOG_FILE")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -66,6 +94,58 @@ def unique_nonempty(values):
     return result
 
 
+# mkstemp creates files 0600; keep the permissions a plain open() would give.
+FILE_UMASK = os.umask(0o022)
+os.umask(FILE_UMASK)
+
+
+def write_file_atomic(path, content):
+    # Write-then-rename so readers never see a half-written file. The temp
+    # file is unique, so processes sharing *path* never write into each other's.
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=directory or "."
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.chmod(temp_path, 0o666 & ~FILE_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json_atomic(path, data, indent=2):
+    write_file_atomic(path, json.dumps(data, indent=indent))
+
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock on "<path>.lock" around a read-modify-write of *path*
+    # that several processes may share (batch accounts, a daemon and cron).
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.lock", "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is None:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 HEADLESS = parse_bool(os.getenv("HEADLESS"), default=False)
 ALLOW_INTERACTIVE_LOGIN = parse_bool(
     os.getenv("ALLOW_INTERACTIVE_LOGIN"),
@@ -76,21 +156,49 @@ CLOSED_SURVEY_PATTERNS = [
     "The survey is now closed.",
     "The survey is closed!",
 ]
+# Reply from the Mia Attendance Bot once the vote is stored.
+CONFIRMATION_TEXT = "Your selection (present) has been recorded successfully"
 
 WORKSPACE_SLUG = os.getenv("WORKSPACE_SLUG", WORKSPACE_DOMAIN.split(".")[0]).strip()
-if WORKSPACE_SLUG.endswith(".slack.com"):
-    WORKSPACE_SLUG = WORKSPACE_SLUG[: -len(".slack.com")]
-
-WORKSPACE_ARCHIVE_URL = f"https://{WORKSPACE_DOMAIN}/archives/{CHANNEL_ID}"
-APP_CHANNEL_URL = f"https://app.slack.com/client/{TEAM_ID}/{CHANNEL_ID}"
-WORKSPACE_SIGNIN_URL = (
-    f"https://{WORKSPACE_DOMAIN}/sign_in_with_password"
-    f"?redir=%2Farchives%2F{CHANNEL_ID}%3Fname%3D{CHANNEL_ID}"
-)
-CHANNEL_URLS = [
-    APP_CHANNEL_URL,
-    WORKSPACE_ARCHIVE_URL,
-]
+
+
+def derive_workspace_settings():
+    # URLs and sign-in candidates that follow from the account/workspace globals.
+    # Re-run whenever those globals change (see apply_account()).
+    global WORKSPACE_SLUG, WORKSPACE_ARCHIVE_URL, APP_CHANNEL_URL
+    global WORKSPACE_SIGNIN_URL, CHANNEL_URLS, WORKSPACE_CANDIDATES
+
+    if WORKSPACE_SLUG.endswith(".slack.com"):
+        WORKSPACE_SLUG = WORKSPACE_SLUG[: -len(".slack.com")]
+
+    WORKSPACE_ARCHIVE_URL = f"{SLACK_URL_SCHEME}://{WORKSPACE_DOMAIN}/archives/{CHANNEL_ID}"
+    APP_CHANNEL_URL = f"{SLACK_URL_SCHEME}://{SLACK_APP_HOST}/client/{TEAM_ID}/{CHANNEL_ID}"
+    WORKSPACE_SIGNIN_URL = (
+        f"{SLACK_URL_SCHEME}://{WORKSPACE_DOMAIN}/sign_in_with_password"
+        f"?redir=%2Farchives%2F{CHANNEL_ID}%3Fname%3D{CHANNEL_ID}"
+    )
+    CHANNEL_URLS = [
+        APP_CHANNEL_URL,
+        WORKSPACE_ARCHIVE_URL,
+    ]
+    WORKSPACE_CANDIDATES = unique_nonempty(
+        [
+            WORKSPACE_SLUG,
+            f"{WORKSPACE_SLUG}.slack.com" if WORKSPACE_SLUG else "",
+            WORKSPACE_DOMAIN,
+            EMAIL,
+        ]
+    )
+
+
+derive_workspace_settings()
+# Environment values a roster account falls back to (see apply_account()).
+ACCOUNT_DEFAULTS = {
+    "workspace_domain": WORKSPACE_DOMAIN,
+    "workspace_slug": WORKSPACE_SLUG,
+    "team_id": TEAM_ID,
+    "channel_id": CHANNEL_ID,
+}
 CHANNEL_CONTENT_MARKERS = [
     '[data-qa="message_pane"]',
     '[data-qa="message_content"]',
@@ -101,61 +209,626 @@ CHANNEL_CONTENT_MARKERS = [
     '[data-qa="slack_kit_list_container"]',
 ]
 WORKSPACE_SIGNIN_MAX_ATTEMPTS = int(os.getenv("WORKSPACE_SIGNIN_MAX_ATTEMPTS", "12"))
-WORKSPACE_CANDIDATES = unique_nonempty(
-    [
-        WORKSPACE_SLUG,
-        f"{WORKSPACE_SLUG}.slack.com" if WORKSPACE_SLUG else "",
-        WORKSPACE_DOMAIN,
-        EMAIL,
-    ]
-)
 workspace_signin_attempts = 0
+# Set by --force / ?force=1: click even if the ledger says the survey is done.
+force_run = False
 FIND_PRESENT_TIMEOUT_S = int(os.getenv("FIND_PRESENT_TIMEOUT_S", "45"))
+# Load every CHANNEL_URLS candidate in its own page at once and keep the first
+# that shows the channel, instead of trying them one after another.
+CHANNEL_URL_RACE = parse_bool(os.getenv("CHANNEL_URL_RACE"), default=False)
+CHANNEL_URL_RACE_TIMEOUT_S = 45
 AUTH_STABLE_SECONDS = int(os.getenv("AUTH_STABLE_SECONDS", "8"))
+# Login state machine: a handler that acted waits this long for the page to
+# move on before it runs again, and gives up after LOGIN_STATE_MAX_VISITS runs
+# in a row on the same state and URL.
+LOGIN_STATE_RETRY_S = 5
+LOGIN_STATE_MAX_VISITS = 3
 SLOW_MO_MS = parse_int(os.getenv("SLOW_MO_MS"), default=0)
 DEBUG_NAV_EVENTS = parse_bool(os.getenv("DEBUG_NAV_EVENTS"), default=False)
 KEEP_BROWSER_OPEN_SECONDS = parse_int(
     os.getenv("KEEP_BROWSER_OPEN_SECONDS"),
     default=0,
 )
+# Cron-style slots for --daemon mode, separated by ";" (minute hour dom month dow).
+DAEMON_SCHEDULE = os.getenv("DAEMON_SCHEDULE", "5 9,14 * * 1-5").strip()
+DAEMON_WARMUP_SECONDS = parse_int(os.getenv("DAEMON_WARMUP_SECONDS"), default=90)
+# --watch: keep the channel open for WATCH_WINDOW_MINUTES from each
+# WATCH_SCHEDULE slot and click every new survey as soon as it appears.
+WATCH_SCHEDULE = os.getenv("WATCH_SCHEDULE", "55 8,13 * * 1-5").strip()
+WATCH_WINDOW_MINUTES = parse_int(os.getenv("WATCH_WINDOW_MINUTES"), default=45)
+WATCH_RECHECK_S = 60
+WATCH_MAX_ATTEMPTS = 3
+WATCH_RETRY_S = 10
+# Local control API of --daemon mode (POST /run, GET /session, /report, /health).
+DAEMON_CONTROL_HOST = os.getenv("DAEMON_CONTROL_HOST", "127.0.0.1").strip()
+DAEMON_CONTROL_PORT = parse_int(os.getenv("DAEMON_CONTROL_PORT"), default=0)
+# Batch mode: accounts run in worker processes that share one Chromium over CDP.
+BATCH_CONCURRENCY = parse_int(os.getenv("BATCH_CONCURRENCY"), default=2)
+BATCH_CDP_PORT = parse_int(os.getenv("BATCH_CDP_PORT"), default=9333)
+
+# Attach to an already running Chromium instead of launching one per run:
+# BROWSER_CDP_URL for a fixed endpoint, or BROWSER_POOL_URL to lease one from
+# the --browser-pool sidecar.
+BROWSER_CDP_URL = os.getenv("BROWSER_CDP_URL", "").strip()
+BROWSER_POOL_URL = os.getenv("BROWSER_POOL_URL", "").strip().rstrip("/")
+BROWSER_POOL_HOST = os.getenv("BROWSER_POOL_HOST", "127.0.0.1").strip()
+BROWSER_POOL_PORT = parse_int(os.getenv("BROWSER_POOL_PORT"), default=9330)
+BROWSER_POOL_SIZE = parse_int(os.getenv("BROWSER_POOL_SIZE"), default=1)
+BROWSER_POOL_CDP_BASE_PORT = parse_int(os.getenv("BROWSER_POOL_CDP_BASE_PORT"), default=9340)
+BROWSER_POOL_MAX_USES = parse_int(os.getenv("BROWSER_POOL_MAX_USES"), default=20)
+BROWSER_POOL_MAX_MEMORY_MB = parse_int(os.getenv("BROWSER_POOL_MAX_MEMORY_MB"), default=1024)
+BROWSER_POOL_LEASE_TIMEOUT_S = parse_int(os.getenv("BROWSER_POOL_LEASE_TIMEOUT_S"), default=900)
+# Lean mode aborts assets that are not needed to click a radio button.
+LEAN_MODE = parse_bool(os.getenv("LEAN_MODE"), default=False)
+LEAN_BLOCK_RESOURCE_TYPES = {
+    value.lower()
+    for value in unique_nonempty(
+        os.getenv("LEAN_BLOCK_RESOURCE_TYPES", "image,media,font").split(",")
+    )
+}
+LEAN_BLOCK_HOSTS = unique_nonempty(
+    os.getenv(
+        "LEAN_BLOCK_HOSTS",
+        "slackb.com,*.slackb.com,*.sentry.io,www.google-analytics.com,"
+        "www.googletagmanager.com,*.doubleclick.net",
+    ).split(",")
+)
+# URL glob patterns that are never blocked, e.g. "*/emoji/*".
+LEAN_ALLOW_URLS = unique_nonempty(os.getenv("LEAN_ALLOW_URLS", "").split(","))
+# Typical response sizes per block reason, for estimating the bytes lean mode
+# saved when the run loaded nothing of that type to measure an average from.
+LEAN_TYPICAL_BYTES = {"image": 20_000, "media": 400_000, "font": 50_000, "telemetry": 2_000}
+LEAN_TYPICAL_BYTES_DEFAULT = 20_000
+
+# JSON run report with per-phase timings; written next to SESSION_FILE
+# unless RUN_REPORT_FILE points elsewhere.
+RUN_REPORT = parse_bool(os.getenv("RUN_REPORT"), default=True)
+RUN_REPORT_FILE = os.getenv("RUN_REPORT_FILE", "").strip()
+RUN_REPORT_MAX_SPANS = 500
+
+# Debug bundles (.tar.gz with screenshot, HTML and run report) captured on
+# failures; kept next to SESSION_FILE unless ARTIFACT_DIR points elsewhere and
+# rotated by count and total size.
+ARTIFACTS = parse_bool(os.getenv("ARTIFACTS"), default=True)
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "").strip()
+ARTIFACT_MAX_BUNDLES = parse_int(os.getenv("ARTIFACT_MAX_BUNDLES"), default=20)
+ARTIFACT_MAX_MB = parse_int(os.getenv("ARTIFACT_MAX_MB"), default=50)
+# Also bundle the channel view of every run. This replaces the old last_run.png,
+# which was written on every run; it is now opt-in.
+ARTIFACT_EVERY_RUN = parse_bool(os.getenv("ARTIFACT_EVERY_RUN"), default=False)
+ARTIFACT_MESSAGE_LIMIT = 30
+ARTIFACT_FLUSH_TIMEOUT_S = 20
+
+# Ledger of run outcomes per survey message and schedule slot, next to
+# SESSION_FILE unless LEDGER_FILE points elsewhere. A survey that already has
+# PRESENT_RECORDED is not clicked again (unless forced); a run starting within
+# LEDGER_SLOT_WINDOW_MINUTES of a slot already recorded does not start at all.
+LEDGER = parse_bool(os.getenv("LEDGER"), default=True)
+LEDGER_FILE = os.getenv("LEDGER_FILE", "").strip()
+LEDGER_SLOT_WINDOW_MINUTES = parse_int(os.getenv("LEDGER_SLOT_WINDOW_MINUTES"), default=60)
+LEDGER_MAX_ENTRIES = 1000
+
+# Global upper bound for one run; every wait phase is clipped to what is left.
+# The hard stop fires RUN_BUDGET_GRACE_S later if a browser call hangs.
+RUN_BUDGET_S = parse_int(os.getenv("RUN_BUDGET_S"), default=300)
+RUN_BUDGET_GRACE_S = 30
+# Polling backs off from POLL_INITIAL_MS to POLL_MAX_MS between checks.
+POLL_INITIAL_MS = parse_int(os.getenv("POLL_INITIAL_MS"), default=200)
+POLL_MAX_MS = parse_int(os.getenv("POLL_MAX_MS"), default=2000)
+POLL_BACKOFF = 1.6
+
+# Skip the validation pass when the session was verified recently and its
+# auth cookies are far from expiry; see is_session_fresh().
+SESSION_META_FILE = os.getenv("SESSION_META_FILE", "").strip()
+SESSION_FRESH_SECONDS = parse_int(os.getenv("SESSION_FRESH_SECONDS"), default=12 * 3600)
+SESSION_COOKIE_MIN_TTL_HOURS = parse_int(os.getenv("SESSION_COOKIE_MIN_TTL_HOURS"), default=72)
+SESSION_COOKIE_NAMES = unique_nonempty(os.getenv("SESSION_COOKIE_NAMES", "d").split(","))
+
+# Background refresh: reload the client so Slack rotates its cookies, then
+# re-save SESSION_FILE. Warn this many days before the auth cookies expire.
+SESSION_REFRESH_INTERVAL_HOURS = parse_int(
+    os.getenv("SESSION_REFRESH_INTERVAL_HOURS"),
+    default=6,
+)
+SESSION_REFRESH_SETTLE_SECONDS = parse_int(
+    os.getenv("SESSION_REFRESH_SETTLE_SECONDS"),
+    default=5,
+)
+SESSION_EXPIRY_WARN_DAYS = parse_int(os.getenv("SESSION_EXPIRY_WARN_DAYS"), default=7)
+
+# Remember which survey selector strategies matched and try them first next run.
+STRATEGY_CACHE = parse_bool(os.getenv("STRATEGY_CACHE"), default=True)
+STRATEGY_CACHE_FILE = os.getenv("STRATEGY_CACHE_FILE", "").strip()
+STRATEGY_CACHE_KINDS = ("survey_root", "present_option")
+
+# Prometheus/OpenMetrics exposition: an HTTP endpoint in daemon mode and/or
+# a node_exporter textfile-collector file that every run rewrites.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1").strip()
+METRICS_PORT = parse_int(os.getenv("METRICS_PORT"), default=0)
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "").strip()
+METRICS_BUCKETS_S = (1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180)
+# Histogram name -> (milestone it ends at, help text). Latencies are measured
+# from the start of the attendance attempt, so a daemon's warm wait is excluded.
+METRICS_LATENCIES = {
+    "channel_ready": (
+        "channel_ready",
+        "Seconds from attempt start until channel content rendered.",
+    ),
+    "present_found": (
+        "present_found",
+        "Seconds from attempt start until the present option was found.",
+    ),
+    "confirmation": (
+        "confirmed",
+        "Seconds from attempt start until the vote confirmation appeared.",
+    ),
+}
+
+
+run_metrics = {}
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def reset_run_metrics():
+    run_metrics.clear()
+    run_metrics.update(
+        {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "started": time.monotonic(),
+            "round_trips": 0,
+            "phases": {},
+            "spans": [],
+            "spans_dropped": 0,
+            "retries": {},
+            "strategies": {},
+            "milestones": {},
+            "budgets": {},
+            "survey_ts": None,
+        }
+    )
+
+
+reset_run_metrics()
+
+
+def count_round_trips(count=1):
+    run_metrics["round_trips"] += count
+
+
+def install_round_trip_counter():
+    # Every Playwright call that awaits a reply from the driver passes through
+    # Connection._send_message_to_server, so count there rather than at each
+    # call site. It is private API: without it round_trips stays at 0.
+    try:
+        from playwright._impl._connection import Connection
+
+        send = Connection._send_message_to_server
+    except (ImportError, AttributeError):
+        logging.warning("Playwright internals changed; round trips will not be counted")
+        return
+    if getattr(send, "counts_round_trips", False):
+        return
+
+    @functools.wraps(send)
+    def counted_send(self, object, method, params, no_reply=False):
+        if not no_reply:
+            count_round_trips()
+        return send(self, object, method, params, no_reply)
+
+    counted_send.counts_round_trips = True
+    Connection._send_message_to_server = counted_send
+
+
+install_round_trip_counter()
+
+
+def record_retry(name):
+    retries = run_metrics["retries"]
+    retries[name] = retries.get(name, 0) + 1
+
+
+def record_strategy_hit(kind, name, remember=True):
+    run_metrics["strategies"][kind] = name
+    if remember:
+        remember_strategy_hit(kind, name)
+
+
+def mark_milestone(name):
+    # Milliseconds since the run started, first occurrence only.
+    run_metrics["milestones"].setdefault(
+        name,
+        round((time.monotonic() - run_metrics["started"]) * 1000, 1),
+    )
+
+
+def record_span(name, parent, started, round_trips_before, status):
+    duration_ms = round((time.monotonic() - started) * 1000, 1)
+    round_trips = run_metrics["round_trips"] - round_trips_before
+    phase = run_metrics["phases"].setdefault(
+        name,
+        {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "round_trips": 0},
+    )
+    phase["calls"] += 1
+    phase["errors"] += status != "ok"
+    phase["total_ms"] = round(phase["total_ms"] + duration_ms, 1)
+    phase["max_ms"] = max(phase["max_ms"], duration_ms)
+    phase["round_trips"] += round_trips
+
+    if len(run_metrics["spans"]) >= RUN_REPORT_MAX_SPANS:
+        run_metrics["spans_dropped"] += 1
+        return
+    run_metrics["spans"].append(
+        {
+            "name": name,
+            "parent": parent,
+            "start_ms": round((started - run_metrics["started"]) * 1000, 1),
+            "duration_ms": duration_ms,
+            "round_trips": round_trips,
+            "status": status,
+        }
+    )
+
+
+@contextmanager
+def phase_span(name):
+    # Time a block with the monotonic clock; nested spans record their parent.
+    parent = current_span.get()
+    token = current_span.set(name)
+    started = time.monotonic()
+    round_trips_before = run_metrics["round_trips"]
+    status = "ok"
+    try:
+        yield
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        current_span.reset(token)
+        record_span(name, parent, started, round_trips_before, status)
+
+
+def timed_phase(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with phase_span(func.__name__):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+run_deadline = contextvars.ContextVar("run_deadline", default=None)
+
+
+@contextmanager
+def run_budget(seconds=RUN_BUDGET_S):
+    # Everything awaited inside shares one monotonic deadline (0 = unbounded).
+    token = run_deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+    try:
+        yield
+    finally:
+        run_deadline.reset(token)
+
+
+async def within_run_budget(awaitable, seconds=RUN_BUDGET_S):
+    # Hard stop behind the soft per-phase budgets; raises asyncio.TimeoutError.
+    with run_budget(seconds):
+        if seconds <= 0:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, timeout=seconds + RUN_BUDGET_GRACE_S)
+
+
+def remaining_budget_s():
+    deadline = run_deadline.get()
+    if deadline is None:
+        return float("inf")
+    return max(0.0, deadline - time.monotonic())
+
+
+@contextmanager
+def phase_budget(name, timeout_s):
+    # Clip a phase timeout to the run budget and log how much of it was used.
+    allowed_s = min(timeout_s, remaining_budget_s())
+    started = time.monotonic()
+    try:
+        yield allowed_s
+    finally:
+        used_s = time.monotonic() - started
+        budget = run_metrics["budgets"].setdefault(name, {"calls": 0, "allowed_s": 0.0, "used_s": 0.0})
+        budget["calls"] += 1
+        budget["allowed_s"] = round(budget["allowed_s"] + allowed_s, 1)
+        budget["used_s"] = round(budget["used_s"] + used_s, 1)
+        remaining_s = remaining_budget_s()
+        log_state(
+            "PHASE_BUDGET",
+            f"{name} used={used_s:.1f}s allowed={allowed_s:.1f}s run_remaining="
+            + ("unbounded" if remaining_s == float("inf") else f"{remaining_s:.0f}s"),
+        )
+
+
+def poll_interval_ms(attempt):
+    return min(POLL_MAX_MS, POLL_INITIAL_MS * POLL_BACKOFF ** attempt)
+
+
+async def poll_pause(page, attempt, deadline=None):
+    # Backoff pause that never sleeps past *deadline* (monotonic) or the run budget.
+    limit_s = remaining_budget_s()
+    if deadline is not None:
+        limit_s = min(limit_s, deadline - time.monotonic())
+    delay_ms = min(poll_interval_ms(attempt), limit_s * 1000)
+    if delay_ms > 0:
+        await page.wait_for_timeout(delay_ms)
+
+
+def run_report_path():
+    if RUN_REPORT_FILE:
+        return RUN_REPORT_FILE
+    return f"{os.path.splitext(SESSION_FILE)[0]}.run_report.json"
+
+
+def build_run_report(attendance_state, exit_code):
+    report = {
+        "outcome": attendance_state or "NO_VALID_SESSION",
+        "exit_code": exit_code,
+        "started_at": run_metrics["started_at"],
+        "duration_ms": round((time.monotonic() - run_metrics["started"]) * 1000, 1),
+        "round_trips": run_metrics["round_trips"],
+        "phases": run_metrics["phases"],
+        "retries": run_metrics["retries"],
+        "strategies": run_metrics["strategies"],
+        "milestones": run_metrics["milestones"],
+        "survey_ts": run_metrics["survey_ts"],
+        "budgets": run_metrics["budgets"],
+        "spans": run_metrics["spans"],
+        "spans_dropped": run_metrics["spans_dropped"],
+    }
+    if LEAN_MODE:
+        report["lean_mode"] = dict(lean_mode_stats)
+        report["lean_mode"]["bytes_saved_estimate"] = estimate_lean_bytes_saved()
+    return report
+
+
+def write_run_report(attendance_state, exit_code):
+    report = build_run_report(attendance_state, exit_code)
+    top_level = [
+        f"{span['name']}={span['duration_ms']:.0f}ms"
+        for span in run_metrics["spans"]
+        if span["parent"] is None
+    ]
+    log_state(
+        "RUN_TIMINGS",
+        f"total={report['duration_ms']:.0f}ms round_trips={run_metrics['round_trips']} "
+        + " ".join(top_level),
+    )
+    if not RUN_REPORT:
+        return report
+
+    path = run_report_path()
+    try:
+        write_json_atomic(path, report)
+        log_state("RUN_REPORT_SAVED", path)
+    except Exception as exc:
+        logger.warning("Could not write run report: %s", exc)
+    return report
 
 
 def use_persistent_profile():
     return bool(BROWSER_PROFILE_DIR)
 
 
-def launch_context(playwright, use_saved_state=True):
+@timed_phase
+async def launch_context(playwright, use_saved_state=True):
+    browser = await connect_prewarmed_browser(playwright)
+    if browser is not None:
+        # Only a fresh context is paid for; the browser process is already warm.
+        return browser, await new_browser_context(browser, use_saved_state=use_saved_state)
+
     if use_persistent_profile():
         os.makedirs(BROWSER_PROFILE_DIR, exist_ok=True)
-        context = playwright.chromium.launch_persistent_context(
+        context = await playwright.chromium.launch_persistent_context(
             user_data_dir=BROWSER_PROFILE_DIR,
             headless=HEADLESS,
             slow_mo=SLOW_MO_MS,
         )
+        await install_lean_mode(context)
         return None, context
 
-    browser = playwright.chromium.launch(
+    browser = await playwright.chromium.launch(
         headless=HEADLESS,
         slow_mo=SLOW_MO_MS,
     )
+    return browser, await new_browser_context(browser, use_saved_state=use_saved_state)
+
+
+@timed_phase
+async def new_browser_context(browser, use_saved_state=True):
     if (
         use_saved_state
         and os.path.exists(SESSION_FILE)
         and os.path.getsize(SESSION_FILE) > 0
     ):
-        context = browser.new_context(storage_state=SESSION_FILE)
+        context = await browser.new_context(storage_state=SESSION_FILE)
     else:
-        context = browser.new_context()
-    return browser, context
+        context = await browser.new_context()
+    await install_lean_mode(context)
+    return context
+
+
+lean_mode_stats = {}
+
+
+def reset_lean_mode_stats():
+    lean_mode_stats.clear()
+    lean_mode_stats.update(
+        {
+            "blocked": 0,
+            "blocked_by_type": {},
+            "allowed": 0,
+            "allowed_bytes": 0,
+            "allowed_by_type": {},
+        }
+    )
 
 
-def close_context(browser, context):
+reset_lean_mode_stats()
+
+
+def get_lean_block_reason(url, resource_type):
+    if any(fnmatch.fnmatch(url, pattern) for pattern in LEAN_ALLOW_URLS):
+        return None
+    if resource_type in LEAN_BLOCK_RESOURCE_TYPES:
+        return resource_type
+    host = get_url_host(url)
+    if any(fnmatch.fnmatch(host, pattern.lower()) for pattern in LEAN_BLOCK_HOSTS):
+        return "telemetry"
+    return None
+
+
+async def install_lean_mode(context):
+    if not LEAN_MODE:
+        return
+
+    async def on_route(route):
+        request = route.request
+        reason = get_lean_block_reason(request.url, request.resource_type)
+        if reason is None:
+            await route.continue_()
+            return
+        lean_mode_stats["blocked"] += 1
+        by_type = lean_mode_stats["blocked_by_type"]
+        by_type[reason] = by_type.get(reason, 0) + 1
+        await route.abort("blockedbyclient")
+
+    def on_response(response):
+        # Headers are already on the client, so this costs no extra round trip.
+        size = parse_int(response.headers.get("content-length"), default=0)
+        lean_mode_stats["allowed"] += 1
+        lean_mode_stats["allowed_bytes"] += size
+        if size:
+            # Per-type sizes feed the estimate of what the blocked requests cost.
+            by_type = lean_mode_stats["allowed_by_type"]
+            count, total = by_type.get(response.request.resource_type, (0, 0))
+            by_type[response.request.resource_type] = (count + 1, total + size)
+
+    await context.route("**/*", on_route)
+    context.on("response", on_response)
+
+
+def estimate_lean_bytes_saved():
+    # Blocked requests times the average Content-Length loaded for that type
+    # in this run, or LEAN_TYPICAL_BYTES when there is none. An estimate only:
+    # aborted requests never report their size.
+    saved = {}
+    for reason, count in lean_mode_stats["blocked_by_type"].items():
+        loaded_count, loaded_bytes = lean_mode_stats["allowed_by_type"].get(reason, (0, 0))
+        if loaded_count:
+            average = loaded_bytes / loaded_count
+        else:
+            average = LEAN_TYPICAL_BYTES.get(reason, LEAN_TYPICAL_BYTES_DEFAULT)
+        saved[reason] = round(count * average)
+    return saved
+
+
+def log_lean_mode_report():
+    if not LEAN_MODE:
+        return
+    saved = estimate_lean_bytes_saved()
+    by_type = ", ".join(
+        f"{reason}={count} ~{saved[reason]}B"
+        for reason, count in sorted(lean_mode_stats["blocked_by_type"].items())
+    )
+    log_state(
+        "LEAN_MODE_REPORT",
+        f"requests_blocked={lean_mode_stats['blocked']} ({by_type or 'none'}) "
+        f"bytes_saved_estimate={sum(saved.values())} "
+        f"requests_loaded={lean_mode_stats['allowed']} "
+        f"bytes_loaded={lean_mode_stats['allowed_bytes']}",
+    )
+
+
+@timed_phase
+async def close_context(browser, context):
     try:
+        await flush_artifacts()
         if context:
-            context.close()
+            await context.close()
     finally:
         if browser:
-            browser.close()
+            # For a CDP-attached browser this only disconnects.
+            await browser.close()
+            lease_id = browser_pool_leases.pop(browser, None)
+            renewal = browser_pool_renewals.pop(browser, None)
+            if renewal is not None:
+                renewal.cancel()
+            if lease_id is not None:
+                await release_pool_browser(lease_id)
+
+
+# Connected browser -> pool lease id, released again in close_context().
+browser_pool_leases = weakref.WeakKeyDictionary()
+# Connected browser -> task renewing its lease while it stays open (daemon, watch).
+browser_pool_renewals = weakref.WeakKeyDictionary()
+
+
+def pool_request(path, method="GET", timeout_s=90):
+    request = urllib.request.Request(f"{BROWSER_POOL_URL}{path}", data=b"" if method == "POST" else None, method=method)
+    with urllib.request.urlopen(request, timeout=timeout_s) as response:
+        return json.load(response)
+
+
+async def connect_prewarmed_browser(playwright):
+    # Returns a CDP-connected browser, or None to launch one locally.
+    lease_id = None
+    cdp_url = BROWSER_CDP_URL
+    if BROWSER_POOL_URL:
+        try:
+            lease = await asyncio.to_thread(pool_request, "/lease", "POST")
+            lease_id, cdp_url = lease["id"], lease["cdp_url"]
+            log_state("BROWSER_POOL_LEASED", f"{lease_id} {cdp_url}")
+        except Exception as exc:
+            logger.warning("STATE=BROWSER_POOL_UNAVAILABLE | %s; launching locally", exc)
+            cdp_url = BROWSER_CDP_URL
+    if not cdp_url:
+        return None
+    if use_persistent_profile():
+        logger.warning("BROWSER_PROFILE_DIR is ignored while attached over CDP; SESSION_FILE is used")
+
+    try:
+        browser = await playwright.chromium.connect_over_cdp(cdp_url, slow_mo=SLOW_MO_MS)
+    except Exception as exc:
+        logger.warning("STATE=BROWSER_CDP_CONNECT_FAILED | %s | %s; launching locally", cdp_url, exc)
+        if lease_id is not None:
+            await release_pool_browser(lease_id)
+        return None
+    if lease_id is not None:
+        browser_pool_leases[browser] = lease_id
+        browser_pool_renewals[browser] = asyncio.ensure_future(keep_pool_lease(lease_id))
+    log_state("BROWSER_CDP_ATTACHED", cdp_url)
+    return browser
+
+
+async def keep_pool_lease(lease_id):
+    # Long-lived holders keep the browser past BROWSER_POOL_LEASE_TIMEOUT_S;
+    # renew well before the pool's reaper would reclaim it.
+    while True:
+        await asyncio.sleep(max(BROWSER_POOL_LEASE_TIMEOUT_S / 3, 1))
+        try:
+            result = await asyncio.to_thread(pool_request, f"/renew?id={quote(lease_id)}", "POST", 10)
+        except Exception as exc:
+            logger.warning("Could not renew pool lease %s: %s", lease_id, exc)
+            continue
+        if not result.get("renewed"):
+            log_state("BROWSER_POOL_LEASE_LOST", lease_id)
+            return
+
+
+async def release_pool_browser(lease_id):
+    try:
+        await asyncio.to_thread(pool_request, f"/release?id={quote(lease_id)}", "POST", 10)
+    except Exception as exc:
+        logger.warning("Could not release pool browser %s: %s", lease_id, exc)
 
 
 def is_signin_url(url):
@@ -172,7 +845,7 @@ def get_url_host(url):
 
 def is_expected_slack_host(url):
     host = get_url_host(url)
-    return host in {"app.slack.com", WORKSPACE_DOMAIN.lower()}
+    return host in {SLACK_APP_HOST.lower(), WORKSPACE_DOMAIN.lower()}
 
 
 def is_authenticated_client_url(url):
@@ -187,7 +860,7 @@ def is_authenticated_client_url(url):
     client_target = f"/client/{TEAM_ID.lower()}/{CHANNEL_ID.lower()}"
     workspace_archive_target = f"/archives/{CHANNEL_ID.lower()}"
 
-    if host == "app.slack.com":
+    if host == SLACK_APP_HOST.lower():
         return client_target in value
 
     if host == WORKSPACE_DOMAIN.lower():
@@ -196,26 +869,320 @@ def is_authenticated_client_url(url):
     return False
 
 
-def click_auth_action_button(page):
-    selectors = [
-        'button[type="submit"]',
-        '[data-qa="signin_button"]',
-        'button:has-text("Continue")',
-        'button:has-text("Verify")',
-        'button:has-text("Submit")',
+SELECTOR_PROBE_STORE = "__attendanceProbeMatch"
+SELECTOR_PROBE_SCRIPT = """([strategies, scopes, storeKey]) => {
+    const normalize = (value) => (value || "").replace(/\\s+/g, " ").trim();
+    const isVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        if (!rect.width || !rect.height) return false;
+        return getComputedStyle(el).visibility !== "hidden";
+    };
+    const textMatches = (el, s) => {
+        const text = normalize(el.textContent);
+        if (s.pattern) return new RegExp(s.pattern, s.flags || "").test(text);
+        if (s.exact) return text === s.text;
+        return text.toLowerCase().includes(s.text.toLowerCase());
+    };
+    // Mirrors is_present_label(): exactly "present", else the word without a negation.
+    const isPresentOption = (el) => {
+        const labels = el.labels ? Array.from(el.labels).map((label) => label.textContent).join(" ") : "";
+        const label = normalize(
+            el.getAttribute("aria-label") || labels || el.textContent || (el.id || "").replace(/[-_]+/g, " ")
+        ).toLowerCase();
+        const value = (el.getAttribute("value") || "").trim().toLowerCase();
+        if (label === "present" || value === "present") return true;
+        return /\\bpresent\\b/.test(label) && !/\\b(?:not|non|no|never)\\b|n't\\b/.test(label);
+    };
+    const matches = (el, s) => {
+        if ((s.text || s.pattern) && !textMatches(el, s)) return false;
+        if (s.present && !isPresentOption(el)) return false;
+        if (s.visible && !isVisible(el)) return false;
+        if (s.enabled && el.disabled) return false;
+        return true;
+    };
+    const queryAll = (root, s) => {
+        if (!s.leaf) {
+            return Array.from(root.querySelectorAll(s.selector)).filter((el) => matches(el, s));
+        }
+        // Like get_by_text(): the innermost elements whose own text nodes match.
+        const found = new Set();
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+        while (walker.nextNode()) {
+            const parent = walker.currentNode.parentElement;
+            if (parent && !found.has(parent) && parent.matches(s.selector) && matches(parent, s)) {
+                found.add(parent);
+            }
+        }
+        return Array.from(found);
+    };
+
+    let counts = {};
+    const search = (root, scope) => {
+        counts = {};
+        for (let index = 0; index < strategies.length; index++) {
+            let found = [];
+            try {
+                found = queryAll(root, strategies[index]);
+            } catch (error) {
+                found = [];
+            }
+            counts[strategies[index].name] = found.length;
+            if (found.length) {
+                window[storeKey] = found;
+                return { index, name: strategies[index].name, count: found.length, counts, scope };
+            }
+        }
+        return null;
+    };
+
+    // Each matching scope in turn (its last element is the root); a miss
+    // inside one falls through to the next. No matching scope: the document.
+    let scoped = false;
+    for (const candidate of scopes) {
+        const found = queryAll(document, candidate);
+        if (!found.length) continue;
+        scoped = true;
+        const match = search(found[found.length - 1], candidate.name);
+        if (match) return match;
+    }
+    if (!scoped) {
+        const match = search(document, null);
+        if (match) return match;
+    }
+    window[storeKey] = [];
+    return { index: -1, name: null, count: 0, counts, scope: null };
+}"""
+
+
+def probe_strategy(name, selector, text=None, **options):
+    # Data-only description of one selector strategy for probe_selectors().
+    # Options: exact, pattern/flags, leaf, visible, enabled, present, action.
+    strategy = {"name": name, "selector": selector}
+    if text is not None:
+        strategy["text"] = text
+    strategy.update(options)
+    return strategy
+
+
+def present_option_strategy(name, selector, text=None, **options):
+    # Only keeps elements whose label passes is_present_label() (in the page),
+    # so "Not present" never matches a loose "present" selector.
+    return probe_strategy(name, selector, text, present=True, **options)
+
+
+async def probe_selectors(target, strategies, scopes=None, with_handles=False, label=None):
+    # Evaluate an ordered strategy list inside *target* (page or frame) in a
+    # single round trip. With *scopes*, the last element of each matching scope
+    # strategy is searched in turn until one holds a match. Returns it as a dict
+    # (name, strategy, count, counts, scope, elements) or None. A *label*
+    # records the matching strategy name in the run report.
+    try:
+        result = await target.evaluate(
+            SELECTOR_PROBE_SCRIPT,
+            [strategies, scopes or [], SELECTOR_PROBE_STORE],
+        )
+    except Exception as exc:
+        logger.debug("Selector probe failed: %s", exc)
+        return None
+
+    if not result or result.get("name") is None:
+        return None
+
+    match = dict(result)
+    match["strategy"] = strategies[result["index"]]
+    match["elements"] = []
+    if label:
+        record_strategy_hit(label, match["name"])
+    if with_handles:
+        # Only a hit pays for the extra round trip that fetches the handles.
+        try:
+            handle = await target.evaluate_handle(f"() => window.{SELECTOR_PROBE_STORE}")
+            properties = await handle.get_properties()
+            for key in sorted(properties, key=int):
+                element = properties[key].as_element()
+                if element is not None:
+                    match["elements"].append(element)
+            await handle.dispose()
+        except Exception as exc:
+            logger.debug("Selector probe handles unavailable: %s", exc)
+            return None
+    return match
+
+
+CHANNEL_MARKER_STRATEGIES = [
+    probe_strategy(selector, selector) for selector in CHANNEL_CONTENT_MARKERS
+]
+AUTH_ACTION_STRATEGIES = [
+    probe_strategy("submit", 'button[type="submit"]', visible=True, enabled=True),
+    probe_strategy("signin-button", '[data-qa="signin_button"]', visible=True, enabled=True),
+    probe_strategy("continue", "button", "Continue", visible=True, enabled=True),
+    probe_strategy("verify", "button", "Verify", visible=True, enabled=True),
+    probe_strategy("submit-text", "button", "Submit", visible=True, enabled=True),
+]
+
+
+def get_workspace_result_link_strategies():
+    # Built per call because the workspace can change between batch accounts.
+    return [
+        probe_strategy("workspace-domain", f'a[href*="{WORKSPACE_DOMAIN}"]', visible=True),
+        probe_strategy("workspace-slug", f'a[href*="{WORKSPACE_SLUG}.slack.com"]', visible=True),
+        probe_strategy("workspace-text", "a", WORKSPACE_SLUG, visible=True),
+        probe_strategy("client-link", 'a[href*="/client/"]', visible=True),
+        probe_strategy("open", "a", "Open", visible=True),
+        probe_strategy("continue", "a", "Continue", visible=True),
     ]
-    for selector in selectors:
-        button = page.locator(selector).first
+
+
+OPEN_APP_PROMPT_STRATEGIES = [
+    probe_strategy("use-in-browser", "button", "Use Slack in your browser", visible=True),
+    probe_strategy("continue-in-browser", "button", "Continue in browser", visible=True),
+    probe_strategy("use-in-browser-short", "button", "Use in browser", visible=True),
+    probe_strategy("not-now", "button", "Not now", visible=True),
+    probe_strategy("cancel", "button", "Cancel", visible=True),
+    probe_strategy("continue-in-browser-link", "a", "Continue in browser", visible=True),
+]
+# Times a visible cookie banner is waited on (and dismissed) before it is ignored.
+COOKIE_BANNER_MAX_ATTEMPTS = 3
+COOKIE_BANNER_STRATEGIES = [
+    probe_strategy("onetrust-accept", "#onetrust-accept-btn-handler", visible=True),
+    probe_strategy("accept-all", "button", "Accept All", visible=True),
+    probe_strategy("allow-all", "button", "Allow all", visible=True),
+    probe_strategy("i-agree", "button", "I agree", visible=True),
+    probe_strategy("i-accept", "button", "I Accept", visible=True),
+]
+SURVEY_ROOT_STRATEGIES = [
+    probe_strategy("document-prompt", 'div[role="document"]', "Please select an option"),
+    probe_strategy("document-present", 'div[role="document"]', "present"),
+    probe_strategy("message-prompt", 'div[data-qa="message_content"]', "Please select an option"),
+    probe_strategy("message-present", 'div[data-qa="message_content"]', "present"),
+]
+SURVEY_ROOT_STRATEGY_NAMES = {strategy["name"] for strategy in SURVEY_ROOT_STRATEGIES}
+PRESENT_OPTION_STRATEGIES = [
+    present_option_strategy("role-radio-text", '[role="radio"]', "present", action="click"),
+    present_option_strategy("role-radio-aria", '[role="radio"][aria-label*="present" i]', action="click"),
+    present_option_strategy("button-text", "button", "present", action="click"),
+    present_option_strategy("aria-any", '[aria-label*="present" i]', action="click"),
+    present_option_strategy("label-text", "label", "present", action="click"),
+    present_option_strategy("input-id", 'input[type="radio"][id*="-present-"]', action="check"),
+    present_option_strategy("input-value", 'input[type="radio"][value="present"]', action="check"),
+    present_option_strategy("input-aria", 'input[type="radio"][aria-label*="present" i]', action="check"),
+    present_option_strategy("text-contains", "*", "present", leaf=True, action="click"),
+    present_option_strategy("text-exact", "*", "present", exact=True, leaf=True, action="click"),
+    present_option_strategy(
+        "text-regex",
+        "*",
+        pattern="^\\s*present\\s*$",
+        flags="i",
+        leaf=True,
+        action="click",
+    ),
+]
+
+
+# Loaded lazily and keyed by path, since batch accounts switch SESSION_FILE.
+strategy_cache = {"path": None, "kinds": {}}
+
+
+def strategy_cache_path():
+    if STRATEGY_CACHE_FILE:
+        return STRATEGY_CACHE_FILE
+    return f"{os.path.splitext(SESSION_FILE)[0]}.strategies.json"
+
+
+def read_strategy_cache_file(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file).get("kinds") or {}
+    except Exception as exc:
+        logger.warning("Ignoring unreadable strategy cache %s: %s", path, exc)
+        return {}
+
+
+def load_strategy_cache():
+    path = strategy_cache_path()
+    if strategy_cache["path"] == path:
+        return strategy_cache["kinds"]
+    kinds = read_strategy_cache_file(path)
+    strategy_cache.update({"path": path, "kinds": kinds})
+    return kinds
+
+
+def remember_strategy_hit(kind, name):
+    if not STRATEGY_CACHE or kind not in STRATEGY_CACHE_KINDS:
+        return
+    path = strategy_cache_path()
+    try:
+        # Re-read under the lock so hits recorded by other processes are kept.
+        with file_lock(path):
+            kinds = read_strategy_cache_file(path)
+            entry = kinds.setdefault(kind, {}).setdefault(name, {"hits": 0, "last_success": None})
+            entry["hits"] += 1
+            entry["last_success"] = datetime.now().isoformat(timespec="seconds")
+            write_json_atomic(path, {"kinds": kinds})
+    except Exception as exc:
+        logger.warning("Could not write strategy cache: %s", exc)
+        return
+    strategy_cache.update({"path": path, "kinds": kinds})
+
+
+def ordered_strategies(kind, strategies):
+    # Most recent winner first, then by hit count; unseen strategies keep their
+    # original order behind them, so a miss still falls through the full list.
+    if not STRATEGY_CACHE:
+        return strategies
+    stats = load_strategy_cache().get(kind) or {}
+    if not stats:
+        return strategies
+
+    def rank(item):
+        index, strategy = item
+        entry = stats.get(strategy["name"])
+        if not entry:
+            return (1, 0.0, 0, index)
         try:
-            if button.count() > 0 and button.is_visible() and button.is_enabled():
-                button.click()
-                return True
-        except Exception:
-            continue
-    return False
+            last_success = datetime.fromisoformat(entry["last_success"]).timestamp()
+        except (TypeError, ValueError):
+            last_success = 0.0
+        return (0, -last_success, -entry["hits"], index)
+
+    ordered = [strategy for _, strategy in sorted(enumerate(strategies), key=rank)]
+    if ordered[0] is not strategies[0]:
+        logger.debug("Trying cached %s strategy %s first", kind, ordered[0]["name"])
+    return ordered
+
+
+async def wait_for_url_change(page, previous_url, timeout_ms=5000):
+    # Returns as soon as a submitted form navigates; False if it never does.
+    try:
+        await page.wait_for_url(
+            lambda url: url != previous_url,
+            wait_until="commit",
+            timeout=max(1, min(timeout_ms, remaining_budget_s() * 1000)),
+        )
+        return True
+    except Exception:
+        return page.url != previous_url
+
+
+async def click_auth_action_button(page):
+    match = await probe_selectors(
+        page,
+        AUTH_ACTION_STRATEGIES,
+        with_handles=True,
+        label="auth_action",
+    )
+    if not match or not match["elements"]:
+        return False
+    try:
+        await match["elements"][0].click()
+        return True
+    except Exception:
+        return False
 
 
-def submit_password_login_if_visible(page):
+async def submit_password_login_if_visible(page):
     # Some Slack flows redirect to workspace sign-in again after OTP.
     email_field = page.locator(
         'input[type="email"], input[name="email"], input[id*="email" i]'
@@ -225,80 +1192,72 @@ def submit_password_login_if_visible(page):
     ).first
 
     try:
-        if email_field.count() == 0 or password_field.count() == 0:
+        if await email_field.count() == 0 or await password_field.count() == 0:
             return False
 
-        if not email_field.is_visible() or not password_field.is_visible():
+        if not await email_field.is_visible() or not await password_field.is_visible():
             return False
 
-        email_field.fill(EMAIL or "")
-        password_field.fill(PASSWORD or "")
+        await email_field.fill(EMAIL or "")
+        await password_field.fill(PASSWORD or "")
 
-        if not click_auth_action_button(page):
-            page.keyboard.press("Enter")
+        previous_url = page.url
+        if not await click_auth_action_button(page):
+            await page.keyboard.press("Enter")
 
-        page.wait_for_timeout(2000)
         log_state("PASSWORD_LOGIN_SUBMITTED", page.url)
+        await wait_for_url_change(page, previous_url)
         return True
     except Exception:
         return False
 
 
-def click_workspace_result_link(page):
-    selectors = [
-        f'a[href*="{WORKSPACE_DOMAIN}"]',
-        f'a[href*="{WORKSPACE_SLUG}.slack.com"]',
-        f'a:has-text("{WORKSPACE_SLUG}")',
-        'a[href*="/client/"]',
-        'a:has-text("Open")',
-        'a:has-text("Continue")',
-    ]
-
-    for selector in selectors:
-        link = page.locator(selector).first
-        try:
-            if link.count() > 0 and link.is_visible():
-                link.click(timeout=3000)
-                log_state("WORKSPACE_SIGNIN_LINK_CLICKED", selector)
-                page.wait_for_timeout(1500)
-                return True
-        except Exception:
-            continue
-    return False
+async def click_workspace_result_link(page):
+    match = await probe_selectors(
+        page,
+        get_workspace_result_link_strategies(),
+        with_handles=True,
+        label="workspace_result_link",
+    )
+    if not match or not match["elements"]:
+        return False
+    try:
+        previous_url = page.url
+        await match["elements"][0].click(timeout=3000)
+        log_state("WORKSPACE_SIGNIN_LINK_CLICKED", match["name"])
+        await wait_for_url_change(page, previous_url)
+        return True
+    except Exception:
+        return False
 
 
-def dismiss_open_app_prompt(page):
+async def dismiss_open_app_prompt(page):
     # Browser/app handoff prompts can block rendering of the web client.
-    selectors = [
-        'button:has-text("Use Slack in your browser")',
-        'button:has-text("Continue in browser")',
-        'button:has-text("Use in browser")',
-        'button:has-text("Not now")',
-        'button:has-text("Cancel")',
-        'a:has-text("Continue in browser")',
-    ]
-    for selector in selectors:
-        try:
-            btn = page.locator(selector).first
-            if btn.count() > 0 and btn.is_visible():
-                btn.click(timeout=3000)
-                log_state("APP_PROMPT_DISMISSED", selector)
-                page.wait_for_timeout(1000)
-                return True
-        except Exception:
-            continue
-    return False
+    match = await probe_selectors(
+        page,
+        OPEN_APP_PROMPT_STRATEGIES,
+        with_handles=True,
+        label="open_app_prompt",
+    )
+    if not match or not match["elements"]:
+        return False
+    try:
+        await match["elements"][0].click(timeout=3000)
+        log_state("APP_PROMPT_DISMISSED", match["name"])
+        return True
+    except Exception:
+        return False
 
 
-def get_workspace_signin_candidates(field):
+async def get_workspace_signin_candidates(field):
     try:
         attributes = " ".join(
             [
-                field.get_attribute("type") or "",
-                field.get_attribute("name") or "",
-                field.get_attribute("id") or "",
-                field.get_attribute("placeholder") or "",
-                field.get_attribute("autocomplete") or "",
+                await field.get_attribute("type") or "",
+                await field.get_attribute("name") or "",
+                await field.get_attribute("id") or "",
+                await field.get_attribute("placeholder") or "",
+                await field.get_attribute("autocomplete") or "",
             ]
         ).lower()
     except Exception:
@@ -311,7 +1270,8 @@ def get_workspace_signin_candidates(field):
     return WORKSPACE_CANDIDATES
 
 
-def handle_workspace_signin(page):
+@timed_phase
+async def handle_workspace_signin(page):
     global workspace_signin_attempts
 
     if "workspace-signin" not in (page.url or "").lower():
@@ -325,9 +1285,10 @@ def handle_workspace_signin(page):
         return False
 
     workspace_signin_attempts += 1
+    record_retry("workspace_signin")
 
     # If Slack shows a workspace result list, prefer clicking a matching result.
-    if click_workspace_result_link(page):
+    if await click_workspace_result_link(page):
         return True
 
     field = page.locator(
@@ -341,7 +1302,7 @@ def handle_workspace_signin(page):
     ).first
 
     try:
-        if field.count() == 0:
+        if await field.count() == 0:
             return False
 
         submit = page.locator(
@@ -352,75 +1313,145 @@ def handle_workspace_signin(page):
             'button:has-text("Find your workspace")'
         ).first
 
-        candidates = get_workspace_signin_candidates(field)
+        candidates = await get_workspace_signin_candidates(field)
         if not candidates:
             return False
 
         for candidate in candidates:
             if not candidate:
                 continue
-            field.fill(candidate)
-            if submit.count() > 0 and submit.is_visible():
-                submit.click(timeout=3000)
-            elif not click_auth_action_button(page):
-                page.keyboard.press("Enter")
-            page.wait_for_timeout(1500)
+            await field.fill(candidate)
+            if await submit.count() > 0 and await submit.is_visible():
+                await submit.click(timeout=3000)
+            elif not await click_auth_action_button(page):
+                await page.keyboard.press("Enter")
             log_state("WORKSPACE_SIGNIN_SUBMITTED", candidate)
-            if "workspace-signin" not in (page.url or "").lower():
+            # Return as soon as Slack leaves the sign-in form instead of sleeping.
+            try:
+                await page.wait_for_url(
+                    lambda url: "workspace-signin" not in url.lower(),
+                    wait_until="commit",
+                    timeout=max(1, min(5000, remaining_budget_s() * 1000)),
+                )
                 return True
+            except Exception:
+                if "workspace-signin" not in (page.url or "").lower():
+                    return True
 
         return False
     except Exception:
         return False
 
 
-def goto_channel(page, timeout_ms=15000):
-    for url in CHANNEL_URLS:
+@timed_phase
+async def goto_channel(page, timeout_ms=15000):
+    for index, url in enumerate(CHANNEL_URLS):
+        if index:
+            record_retry("channel_url_fallback")
         try:
-            page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
-            dismiss_open_app_prompt(page)
-            if is_glitch_page(page):
+            await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+            await dismiss_open_app_prompt(page)
+            if await is_glitch_page(page):
                 log_state("GLITCH_PAGE_DETECTED", page.url)
                 continue
             if is_authenticated_client_url(page.url):
                 return
-            handle_workspace_signin(page)
+            await handle_workspace_signin(page)
         except Exception:
             continue
 
 
-def wait_for_authenticated_client(page, timeout_s=60):
-    deadline = time.time() + timeout_s
-
-    while time.time() < deadline:
-        goto_channel(page, timeout_ms=15000)
-
-        if wait_for_stable_authenticated_url(page, timeout_s=12):
-            return True
-
-        if is_glitch_page(page):
-            log_state("GLITCH_PAGE_DETECTED", page.url)
-            page.wait_for_timeout(1500)
-            continue
-
-        if is_signin_url(page.url):
-            log_state("WORKSPACE_SIGNIN_DETECTED", page.url)
-            if submit_password_login_if_visible(page):
-                page.wait_for_timeout(1500)
-                continue
-            if handle_workspace_signin(page):
-                page.wait_for_timeout(1500)
+@timed_phase
+async def open_channel(page, timeout_ms=15000):
+    # Reuse an already-loaded channel instead of booting the Slack client again.
+    if is_authenticated_client_url(page.url) and await has_channel_markers(page):
+        log_state("CHANNEL_REUSED", page.url)
+        return
+    await goto_channel(page, timeout_ms=timeout_ms)
+
+
+async def reopen_channel(page):
+    await goto_channel(page, timeout_ms=15000)
+    return True
+
+
+def get_login_state_handlers():
+    # Login state -> handler returning whether it acted. "navigating" has none
+    # and just waits; a client that never renders the channel is reopened.
+    return {
+        "glitch": reopen_channel,
+        "cookie_banner": dismiss_cookie_or_privacy_overlays,
+        "security_code": handle_security_code_challenge,
+        "password_form": submit_password_login_if_visible,
+        "app_prompt": dismiss_open_app_prompt,
+        "workspace_signin": handle_workspace_signin,
+        "client_loading": reopen_channel,
+        "elsewhere": reopen_channel,
+    }
+
+
+# Give redirects and client boot a moment before acting on these states.
+LOGIN_STATE_SETTLE_S = {"elsewhere": 3, "client_loading": 20}
+
+
+@timed_phase
+async def wait_for_authenticated_client(page, timeout_s=60):
+    # Login state machine: classify the page in one evaluation, run the
+    # handler for that state right away, otherwise poll with backoff.
+    with phase_budget("wait_for_authenticated_client", timeout_s) as allowed_s:
+        deadline = time.monotonic() + allowed_s
+        handlers = get_login_state_handlers()
+        current = None
+        entered_at = time.monotonic()
+        acted_at = {}
+        # (state, url) of the last handler run and how often it ran in a row
+        # without the page getting anywhere.
+        last_visit = None
+        repeats = 0
+        attempt = 0
+
+        while time.monotonic() < deadline:
+            state = await classify_page(page)
+            now = time.monotonic()
+            if state != current:
+                log_state("LOGIN_STATE", f"{state} | {page.url}")
+                current, entered_at, attempt = state, now, 0
+
+            if state == "authenticated":
+                if deadline - now < AUTH_STABLE_SECONDS:
+                    # No time left for the stability window; the channel is showing.
+                    log_state("AUTH_ACCEPTED_WITHOUT_STABILITY_CHECK", page.url)
+                    return True
+                stable_timeout_s = min(AUTH_STABLE_SECONDS + 2, deadline - now)
+                if await wait_for_stable_authenticated_url(page, timeout_s=stable_timeout_s):
+                    return True
+                await poll_pause(page, attempt, deadline)
+                attempt += 1
                 continue
 
-        handle_workspace_signin(page)
-        if not click_auth_action_button(page):
-            try:
-                page.keyboard.press("Enter")
-            except Exception:
-                pass
-        page.wait_for_timeout(2000)
+            handler = handlers.get(state)
+            ready = (
+                handler is not None
+                and now - entered_at >= LOGIN_STATE_SETTLE_S.get(state, 0)
+                and now - acted_at.get(state, float("-inf")) >= LOGIN_STATE_RETRY_S
+            )
+            if ready:
+                visit = (state, page.url)
+                repeats = repeats + 1 if visit == last_visit else 1
+                last_visit = visit
+                if repeats > LOGIN_STATE_MAX_VISITS:
+                    log_state("LOGIN_STATE_STUCK", f"{state} | {page.url}")
+                    return False
+                record_retry(f"login_{state}")
+                acted_at[state] = time.monotonic()
+                if await handler(page):
+                    attempt = 0
+                    continue
 
-    return False
+            await poll_pause(page, attempt, deadline)
+            attempt += 1
+
+        return False
 
 
 def log_state(state, detail=""):
@@ -430,7 +1461,7 @@ def log_state(state, detail=""):
         logger.info("STATE=%s", state)
 
 
-def maybe_pause_for_debug(reason):
+async def maybe_pause_for_debug(reason):
     if KEEP_BROWSER_OPEN_SECONDS <= 0:
         return
     logger.warning(
@@ -438,7 +1469,7 @@ def maybe_pause_for_debug(reason):
         reason,
         KEEP_BROWSER_OPEN_SECONDS,
     )
-    time.sleep(KEEP_BROWSER_OPEN_SECONDS)
+    await asyncio.sleep(KEEP_BROWSER_OPEN_SECONDS)
 
 
 def attach_page_debug_listeners(page, label="page"):
@@ -464,48 +1495,225 @@ def attach_page_debug_listeners(page, label="page"):
     page.on("console", on_console)
 
 
-def wait_for_stable_authenticated_url(page, timeout_s=20):
-    deadline = time.time() + timeout_s
-    stable_start = None
+async def wait_for_stable_authenticated_url(page, timeout_s=20):
+    deadline = time.monotonic() + min(timeout_s, remaining_budget_s())
+    attempt = 0
 
-    while time.time() < deadline:
-        if is_signin_url(page.url) or is_glitch_page(page):
+    while time.monotonic() < deadline:
+        if is_signin_url(page.url) or await is_glitch_page(page):
             return False
 
         if is_authenticated_client_url(page.url):
-            if stable_start is None:
-                stable_start = time.time()
-            if time.time() - stable_start >= AUTH_STABLE_SECONDS:
+            if deadline - time.monotonic() < AUTH_STABLE_SECONDS:
+                return False
+            # Stable unless Slack navigates away or glitches within the window.
+            state = await race_page_states(
+                AUTH_STABLE_SECONDS,
+                {
+                    "left_client": lambda: page.wait_for_url(
+                        lambda url: not is_authenticated_client_url(url),
+                        wait_until="commit",
+                        timeout=0,
+                    ),
+                    "glitch_page": channel_state_waiters(page)["glitch_page"],
+                },
+            )
+            if state is None:
                 return True
-        else:
-            stable_start = None
+            if state == "glitch_page":
+                return False
+            attempt = 0
+            continue
 
-        page.wait_for_timeout(1000)
+        # Not on the client yet; check again soon, backing off while nothing changes.
+        await poll_pause(page, attempt, deadline)
+        attempt += 1
 
     return False
 
 
-def is_glitch_page(page):
-    try:
-        title_text = (page.title() or "").lower()
-    except Exception:
-        title_text = ""
-
-    if "there's been a glitch" in title_text or "there’s been a glitch" in title_text:
-        return True
+PAGE_TEXT_PHRASES = {
+    "glitch": ["There's been a glitch", "There’s been a glitch"],
+    "closed": CLOSED_SURVEY_PATTERNS,
+    "prompt": ["Please select an option"],
+}
+# Repeated checks within this window reuse the last scan without a round trip.
+PAGE_TEXT_CACHE_MS = parse_int(os.getenv("PAGE_TEXT_CACHE_MS"), default=250)
+PAGE_TEXT_SCAN_SCRIPT = """(phrases) => {
+    const state = window.__attendanceTextScan
+        || (window.__attendanceTextScan = { generation: 0, scanned: -1, title: null, result: null });
+    if (!state.observer && document.documentElement) {
+        // Every DOM mutation batch bumps the generation; scans are cached per generation.
+        state.observer = new MutationObserver(() => { state.generation += 1; });
+        state.observer.observe(document.documentElement, {
+            childList: true,
+            subtree: true,
+            characterData: true,
+        });
+    }
+    const title = document.title || "";
+    if (state.result && state.scanned === state.generation && state.title === title) {
+        return { ...state.result, cached: true };
+    }
+
+    const normalize = (value) => (value || "").replace(/\\s+/g, " ").trim();
+    const keys = Object.keys(phrases);
+    const lowered = {};
+    const result = { generation: state.generation, cached: false };
+    for (const key of keys) {
+        lowered[key] = phrases[key].map((phrase) => phrase.toLowerCase());
+        result[key] = { found: false, phrase: null, location: null };
+    }
+    const check = (key, text) => lowered[key].findIndex((phrase) => text.includes(phrase));
+
+    const titleText = title.toLowerCase();
+    for (const key of keys) {
+        const index = check(key, titleText);
+        if (index >= 0) {
+            result[key] = { found: true, phrase: phrases[key][index], location: { container: "title" } };
+        }
+    }
+
+    // Text nodes only: unlike innerText this never forces a layout.
+    const parts = [];
+    const root = document.body || document.documentElement;
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+        const node = walker.currentNode;
+        const parent = node.parentElement;
+        if (!parent || ["SCRIPT", "STYLE", "NOSCRIPT"].includes(parent.tagName)) continue;
+        const text = (node.nodeValue || "").toLowerCase();
+        parts.push(text);
+        for (const key of keys) {
+            const index = check(key, text);
+            if (index < 0) continue;
+            // Keep overwriting so the last (newest) occurrence wins.
+            const section = parent.closest("div.p-rich_text_section");
+            const message = parent.closest('[data-item-key], [data-qa="message_content"], div[role="document"]');
+            // data-item-key sits on the outer list item, above message_content.
+            const item = parent.closest("[data-item-key]");
+            result[key] = {
+                found: true,
+                phrase: phrases[key][index],
+                location: {
+                    container: message
+                        ? message.getAttribute("data-qa") || message.getAttribute("role") || "item"
+                        : parent.tagName.toLowerCase(),
+                    itemKey: item ? item.getAttribute("data-item-key") : null,
+                    text: normalize((section || parent).textContent).slice(0, 300),
+                },
+            };
+        }
+    }
+
+    // Phrases split across elements only show up in the joined text.
+    const joined = parts.join("").replace(/\\s+/g, " ");
+    for (const key of keys) {
+        if (!result[key].found) {
+            const index = check(key, joined);
+            if (index >= 0) {
+                result[key] = { found: true, phrase: phrases[key][index], location: null };
+            }
+        }
+    }
+
+    state.scanned = state.generation;
+    state.title = title;
+    state.result = result;
+    return result;
+}"""
+page_text_cache = weakref.WeakKeyDictionary()
+
+
+async def scan_page_text(page, max_age_ms=PAGE_TEXT_CACHE_MS):
+    # One in-page scan for glitch, closed-survey and prompt phrases. Each entry
+    # is {"found", "phrase", "location"}; location names the newest match.
+    now = time.monotonic()
+    cached = page_text_cache.get(page)
+    if (
+        cached is not None
+        and cached["url"] == page.url
+        and (now - cached["at"]) * 1000 < max_age_ms
+    ):
+        return cached["result"]
 
     try:
-        body_text = page.locator("body").inner_text(timeout=1500).lower()
-    except Exception:
-        return False
-
-    return (
-        "there's been a glitch" in body_text
-        or "there’s been a glitch" in body_text
-    )
+        result = await page.evaluate(PAGE_TEXT_SCAN_SCRIPT, PAGE_TEXT_PHRASES)
+    except Exception as exc:
+        logger.debug("Page text scan failed: %s", exc)
+        return None
+    page_text_cache[page] = {"url": page.url, "at": now, "result": result}
+    return result
 
 
-def find_closed_survey_message(page, scope=None):
+async def is_glitch_page(page):
+    scan = await scan_page_text(page)
+    return bool(scan and scan["glitch"]["found"])
+
+
+# Element groups for classify_page(); the Python side decides precedence.
+PAGE_STATE_STRATEGIES = {
+    "security_code": [
+        probe_strategy("one-time-code", 'input[autocomplete="one-time-code"]', visible=True),
+        probe_strategy("numeric", 'input[inputmode="numeric"]', visible=True),
+        probe_strategy("code-name", 'input[name*="code"]', visible=True),
+        probe_strategy("code-id", 'input[id*="code"]', visible=True),
+    ],
+    "password_form": [
+        probe_strategy(
+            "password",
+            'input[type="password"], input[name="password"], input[id*="password" i]',
+            visible=True,
+        ),
+    ],
+    "app_prompt": OPEN_APP_PROMPT_STRATEGIES,
+    "cookie_banner": COOKIE_BANNER_STRATEGIES,
+    "channel": CHANNEL_MARKER_STRATEGIES,
+}
+PAGE_STATE_STORE = "__attendancePageState"
+PAGE_STATE_SCRIPT = f"""([groups, phrases, storeKey]) => {{
+    const probe = {SELECTOR_PROBE_SCRIPT};
+    const scan = ({PAGE_TEXT_SCAN_SCRIPT})(phrases);
+    const found = {{}};
+    for (const [group, strategies] of Object.entries(groups)) {{
+        found[group] = probe([strategies, [], storeKey]).name;
+    }}
+    return {{ found, glitch: scan.glitch.found }};
+}}"""
+
+
+async def classify_page(page):
+    # One evaluation covering every login-relevant page state.
+    try:
+        result = await page.evaluate(
+            PAGE_STATE_SCRIPT,
+            [PAGE_STATE_STRATEGIES, PAGE_TEXT_PHRASES, PAGE_STATE_STORE],
+        )
+    except Exception as exc:
+        # Usually the execution context going away mid-navigation.
+        logger.debug("Page classification failed: %s", exc)
+        return "navigating"
+
+    found = result["found"]
+    url = page.url
+    if result["glitch"]:
+        return "glitch"
+    if found["cookie_banner"]:
+        return "cookie_banner"
+    if found["security_code"]:
+        return "security_code"
+    if found["password_form"]:
+        return "password_form"
+    if found["app_prompt"]:
+        return "app_prompt"
+    if "workspace-signin" in (url or "").lower():
+        return "workspace_signin"
+    if is_authenticated_client_url(url):
+        return "authenticated" if found["channel"] else "client_loading"
+    return "elsewhere"
+
+
+async def find_closed_survey_message(page, scope=None):
     """Check whether the survey is closed.
 
     If *scope* is given (a Locator), only look inside that element.
@@ -513,20 +1721,25 @@ def find_closed_survey_message(page, scope=None):
     occurrence so that an older "closed" banner doesn't shadow a newer
     open survey.
     """
-    root = scope if scope is not None else page
+    if scope is None:
+        scan = await scan_page_text(page, max_age_ms=0)
+        if not scan or not scan["closed"]["found"]:
+            return None
+        location = scan["closed"]["location"] or {}
+        return location.get("text") or scan["closed"]["phrase"]
 
     for pattern in CLOSED_SURVEY_PATTERNS:
-        locator = root.locator("div.p-rich_text_section", has_text=pattern)
-        count = locator.count()
+        locator = scope.locator("div.p-rich_text_section", has_text=pattern)
+        count = await locator.count()
         if count > 0:
             try:
-                return locator.nth(count - 1).inner_text().strip()
+                return (await locator.nth(count - 1).inner_text()).strip()
             except Exception:
                 return pattern
 
     # Fallback: plain-text search inside the scoped root only
     try:
-        root_text = root.locator("body").inner_text(timeout=2000) if scope is None else root.inner_text(timeout=2000)
+        root_text = await scope.inner_text(timeout=2000)
     except Exception:
         root_text = ""
 
@@ -537,203 +1750,982 @@ def find_closed_survey_message(page, scope=None):
     return None
 
 
-def nudge_to_latest_messages(page):
-    # Slack renders inside nested scroll containers; scroll all of them down.
-    try:
-        page.evaluate(
-            """() => {
-                const nodes = Array.from(document.querySelectorAll("*"));
-                for (const node of nodes) {
+SCROLL_CONTAINER_CACHE = "__attendanceScrollContainers"
+SCROLL_ENGINE_SCRIPT = """([direction, cacheKey]) => {
+    const started = performance.now();
+    let containers = (window[cacheKey] || []).filter((node) => node.isConnected);
+    if (!containers.length) {
+        // Discover the virtual-list scrollers once; walk up a few levels from
+        // each marker to the element that actually scrolls.
+        const selectors = [
+            'div.c-virtual_list__scroll_container',
+            '[data-qa="message_pane"]',
+            '[data-qa="slack_kit_list_container"]',
+        ];
+        const found = new Set();
+        for (const selector of selectors) {
+            for (const marker of document.querySelectorAll(selector)) {
+                let node = marker;
+                for (let depth = 0; node && depth < 5; depth++, node = node.parentElement) {
+                    if (node === document.body) break;
                     if (node.scrollHeight > node.clientHeight) {
-                        node.scrollTop = node.scrollHeight;
+                        found.add(node);
+                        break;
                     }
                 }
-                window.scrollTo(0, document.body.scrollHeight);
-            }"""
+            }
+        }
+        containers = Array.from(found);
+        window[cacheKey] = containers;
+    }
+
+    if (!containers.length && direction === "latest") {
+        window.scrollTo(0, document.body.scrollHeight);
+    }
+
+    let atTop = true;
+    let atBottom = true;
+    for (const node of containers) {
+        if (direction === "latest") {
+            node.scrollTop = node.scrollHeight;
+        } else {
+            const step = Math.max(400, Math.floor(node.clientHeight * 0.8));
+            node.scrollTop = node.scrollTop + (direction === "up" ? -step : step);
+        }
+        atTop = atTop && node.scrollTop <= 0;
+        atBottom = atBottom && node.scrollTop + node.clientHeight >= node.scrollHeight - 2;
+    }
+    return {
+        containers: containers.length,
+        atTop: containers.length > 0 && atTop,
+        atBottom: containers.length > 0 && atBottom,
+        ms: performance.now() - started,
+    };
+}"""
+# Consecutive "at top" steps before history counts as exhausted; Slack keeps
+# loading older messages for a moment after the list first hits the top.
+SCROLL_TOP_EXHAUSTED_STEPS = 3
+
+
+@timed_phase
+async def scroll_messages(page, direction="latest"):
+    # Scroll only the cached message-list containers: "latest", "down" or "up".
+    started = time.monotonic()
+    try:
+        result = await page.evaluate(
+            SCROLL_ENGINE_SCRIPT,
+            [direction, SCROLL_CONTAINER_CACHE],
         )
     except Exception:
-        pass
+        return None
+    logger.debug(
+        "Scroll step %s | containers=%s at_top=%s at_bottom=%s in_page_ms=%.1f total_ms=%.1f",
+        direction,
+        result["containers"],
+        result["atTop"],
+        result["atBottom"],
+        result["ms"],
+        (time.monotonic() - started) * 1000,
+    )
+    return result
 
 
-def nudge_message_history(page, direction="down"):
-    delta_sign = 1 if direction == "down" else -1
-    try:
-        page.evaluate(
-            """(directionSign) => {
-                const selectors = [
-                    'div.c-virtual_list__scroll_container',
-                    '[data-qa="message_pane"]',
-                    '[data-qa="slack_kit_list_container"]',
-                ];
-                for (const selector of selectors) {
-                    const node = document.querySelector(selector);
-                    if (!node) continue;
-                    const step = Math.max(400, Math.floor(node.clientHeight * 0.8));
-                    node.scrollTop = node.scrollTop + (directionSign * step);
-                }
-            }""",
-            delta_sign,
-        )
-    except Exception:
-        pass
+async def nudge_to_latest_messages(page):
+    return await scroll_messages(page, direction="latest")
 
 
-def get_latest_survey_root(page):
-    # Focus the latest survey card from Mia, if present.
-    # Try multiple selectors for the survey container, in order of specificity.
-    survey_selectors = [
-        ('div[role="document"]', "Please select an option"),
-        ('div[role="document"]', "present"),
-        ('div[data-qa="message_content"]', "Please select an option"),
-        ('div[data-qa="message_content"]', "present"),
-    ]
-    for selector, text in survey_selectors:
-        survey_cards = page.locator(selector, has_text=text)
-        card_count = survey_cards.count()
-        if card_count > 0:
-            logger.debug(
-                "Found survey cards via %s with text '%s': %s",
-                selector, text, card_count,
-            )
-            return survey_cards.nth(card_count - 1)
-    return page
+async def nudge_message_history(page, direction="down"):
+    return await scroll_messages(page, direction=direction)
 
 
-def dismiss_cookie_or_privacy_overlays(page):
-    selectors = [
-        "#onetrust-accept-btn-handler",
-        'button:has-text("Accept All")',
-        'button:has-text("Accept all")',
-        'button:has-text("Allow all")',
-        'button:has-text("I agree")',
-        'button:has-text("I Accept")',
-    ]
+@timed_phase
+async def get_latest_survey_root(page):
+    # Focus the latest survey card from Mia, if present. One probe tries the
+    # survey container selectors in order of specificity.
+    match = await probe_selectors(
+        page,
+        ordered_strategies("survey_root", SURVEY_ROOT_STRATEGIES),
+        label="survey_root",
+    )
+    if not match:
+        return page
+    strategy = match["strategy"]
+    logger.debug(
+        "Found survey cards via %s with text '%s': %s",
+        strategy["selector"], strategy["text"], match["count"],
+    )
+    return page.locator(strategy["selector"], has_text=strategy["text"]).nth(match["count"] - 1)
 
+
+@timed_phase
+async def dismiss_cookie_or_privacy_overlays(page):
+    # One batched probe per frame instead of one round trip per selector.
     for frame in page.frames:
-        for selector in selectors:
-            try:
-                button = frame.locator(selector).first
-                if button.count() > 0 and button.is_visible():
-                    log_state("COOKIE_BANNER_DETECTED", selector)
-                    button.click(timeout=3000)
-                    page.wait_for_timeout(1200)
-                    log_state("COOKIE_BANNER_ACCEPTED", selector)
-                    return True
-            except Exception:
-                continue
+        match = await probe_selectors(
+            frame,
+            COOKIE_BANNER_STRATEGIES,
+            with_handles=True,
+            label="cookie_banner",
+        )
+        if not match or not match["elements"]:
+            continue
+        try:
+            log_state("COOKIE_BANNER_DETECTED", match["name"])
+            await match["elements"][0].click(timeout=3000)
+            log_state("COOKIE_BANNER_ACCEPTED", match["name"])
+            return True
+        except Exception:
+            continue
 
     return False
 
 
-def wait_for_channel_content(page, timeout_s=45):
-    deadline = time.time() + timeout_s
+def strategy_to_selector(strategy):
+    # Playwright selector for a simple probe strategy (selector + optional text).
+    if strategy.get("text"):
+        return f'{strategy["selector"]}:has-text("{strategy["text"]}")'
+    return strategy["selector"]
+
+
+CHANNEL_MARKER_SELECTOR = ", ".join(CHANNEL_CONTENT_MARKERS)
+COOKIE_BANNER_SELECTOR = ", ".join(
+    strategy_to_selector(strategy) for strategy in COOKIE_BANNER_STRATEGIES
+)
+CLOSED_REPLY_SELECTOR = ", ".join(
+    f'div.p-rich_text_section:has-text("{pattern}")' for pattern in CLOSED_SURVEY_PATTERNS
+)
+GLITCH_WAIT_SCRIPT = f"(phrases) => ({PAGE_TEXT_SCAN_SCRIPT})(phrases).glitch.found"
+# Playwright-side waits like wait_for_selector() can fail while a navigation
+# tears down the execution context; retry them after this pause.
+RACE_RETRY_DELAY_S = 0.25
+
+
+async def keep_waiting(wait):
+    while True:
+        try:
+            return await wait()
+        except Exception:
+            record_retry("race_waiter")
+            await asyncio.sleep(RACE_RETRY_DELAY_S)
+
+
+async def race_page_states(timeout_s, waiters):
+    # Run every waiter at once and return the name of the first one that
+    # completes, or None when *timeout_s* runs out first.
+    if timeout_s <= 0:
+        return None
+    tasks = {
+        asyncio.ensure_future(keep_waiting(wait)): name
+        for name, wait in waiters.items()
+    }
+    try:
+        done, _ = await asyncio.wait(
+            tasks,
+            timeout=timeout_s,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    # Several waiters can finish together; the earlier-listed one wins.
+    for task, name in tasks.items():
+        if task in done:
+            return name
+    return None
+
+
+def channel_state_waiters(page, watch_cookie_banner=True, watch_off_channel=False):
+    # Channel markers vs. glitch page vs. sign-in redirect vs. cookie banner.
+    waiters = {
+        "channel_markers": lambda: page.wait_for_selector(
+            CHANNEL_MARKER_SELECTOR,
+            state="attached",
+            timeout=0,
+        ),
+        "glitch_page": lambda: page.wait_for_function(
+            GLITCH_WAIT_SCRIPT,
+            arg=PAGE_TEXT_PHRASES,
+            polling=1000,
+            timeout=0,
+        ),
+        "signin_redirect": lambda: page.wait_for_url(
+            is_signin_url,
+            wait_until="commit",
+            timeout=0,
+        ),
+    }
+    if watch_cookie_banner:
+        waiters["cookie_banner"] = lambda: page.wait_for_selector(
+            COOKIE_BANNER_SELECTOR,
+            state="visible",
+            timeout=0,
+        )
+    if watch_off_channel:
+        waiters["off_channel"] = lambda: page.wait_for_url(
+            lambda url: not is_authenticated_client_url(url) and not is_signin_url(url),
+            wait_until="commit",
+            timeout=0,
+        )
+    return waiters
+
+
+@timed_phase
+async def wait_for_channel_content(page, timeout_s=45):
+    with phase_budget("wait_for_channel_content", timeout_s) as allowed_s:
+        return await _wait_for_channel_content(page, time.monotonic() + allowed_s)
 
-    while time.time() < deadline:
-        dismiss_cookie_or_privacy_overlays(page)
 
-        if has_channel_markers(page):
+async def _wait_for_channel_content(page, deadline):
+    cookie_attempts = 0
+    attempt = 0
+
+    while time.monotonic() < deadline:
+        # Iframe banners are not covered by the race; sweep them each round.
+        if await dismiss_cookie_or_privacy_overlays(page):
+            record_retry("cookie_banner_dismissed")
+
+        state = await race_page_states(
+            deadline - time.monotonic(),
+            channel_state_waiters(
+                page,
+                watch_cookie_banner=cookie_attempts < COOKIE_BANNER_MAX_ATTEMPTS,
+                watch_off_channel=True,
+            ),
+        )
+
+        if state == "cookie_banner":
+            # Dismissed at the top of the next round; a banner that will not go
+            # away stops being watched after a few tries.
+            cookie_attempts += 1
+            await poll_pause(page, attempt, deadline)
+            attempt += 1
+            continue
+
+        if state == "channel_markers":
             return True
 
-        if is_glitch_page(page):
+        if state == "glitch_page":
             log_state("CHANNEL_GLITCH_PAGE", page.url)
             return False
 
-        if is_signin_url(page.url):
+        if state == "signin_redirect":
             log_state("WORKSPACE_SIGNIN_DETECTED", page.url)
-            if handle_workspace_signin(page):
-                page.wait_for_timeout(1500)
+            if await handle_workspace_signin(page):
                 continue
             log_state("SESSION_REAUTH_REQUIRED", page.url)
             return False
 
-        nudge_to_latest_messages(page)
-        # Re-open the channel if Slack navigated away from the target content.
-        if not is_authenticated_client_url(page.url):
-            goto_channel(page, timeout_ms=15000)
-        page.wait_for_timeout(1000)
+        if state == "off_channel":
+            record_retry("channel_reopen")
+            # Re-open the channel if Slack navigated away from the target content.
+            await poll_pause(page, attempt, deadline)
+            attempt += 1
+            if not is_authenticated_client_url(page.url) and not is_signin_url(page.url):
+                await goto_channel(page, timeout_ms=15000)
 
     return False
 
 
-def has_channel_markers(page):
-    for selector in CHANNEL_CONTENT_MARKERS:
-        try:
-            if page.locator(selector).count() > 0:
-                return True
-        except Exception:
-            continue
-    return False
+async def has_channel_markers(page):
+    return await probe_selectors(page, CHANNEL_MARKER_STRATEGIES) is not None
+
+
+MESSAGE_PANE_SELECTOR = '[data-qa="message_pane"]'
+# Message pane without scripts/media and trimmed to the newest messages.
+MESSAGE_PANE_SNAPSHOT_SCRIPT = """(limit) => {
+    const pane = document.querySelector('[data-qa="message_pane"]')
+        || document.querySelector("div.c-virtual_list");
+    if (!pane) return null;
+    const clone = pane.cloneNode(true);
+    clone.querySelectorAll("script, style, svg, img, video, iframe").forEach((node) => node.remove());
+    const items = clone.querySelectorAll(".c-virtual_list__item");
+    for (let i = 0; i < items.length - limit; i++) items[i].remove();
+    return clone.outerHTML;
+}"""
+
+# Bundles still being captured/written; close_context() waits for them.
+artifact_tasks = set()
+# Bundles are written from worker threads; one rotation at a time.
+artifact_rotate_lock = threading.Lock()
+
 
+def artifact_dir():
+    if ARTIFACT_DIR:
+        return ARTIFACT_DIR
+    return f"{os.path.splitext(SESSION_FILE)[0]}.artifacts"
 
-def capture_debug_artifacts(page):
-    screenshot_path = os.getenv("ATTENDANCE_DEBUG_SCREENSHOT", "attendance_debug.png")
-    html_path = os.getenv("ATTENDANCE_DEBUG_HTML", "attendance_debug.html")
 
+def rotate_artifacts(directory):
+    # Drop the oldest bundles beyond ARTIFACT_MAX_BUNDLES / ARTIFACT_MAX_MB,
+    # always keeping the newest one. Another process sharing the directory
+    # may rotate at the same time, so a bundle can vanish under us.
+    with artifact_rotate_lock:
+        sizes = {}
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".tar.gz"):
+                continue
+            try:
+                sizes[name] = os.path.getsize(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+        bundles = list(sizes)
+        total = sum(sizes.values())
+        max_bytes = ARTIFACT_MAX_MB * 1024 * 1024
+        while len(bundles) > 1 and (len(bundles) > ARTIFACT_MAX_BUNDLES or total > max_bytes):
+            oldest = bundles.pop(0)
+            total -= sizes[oldest]
+            try:
+                os.remove(os.path.join(directory, oldest))
+            except FileNotFoundError:
+                continue
+            logger.debug("Rotated artifact bundle %s", oldest)
+
+
+def write_artifact_bundle(path, files):
+    # Runs in a worker thread: compress, rename into place, then rotate.
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tarfile.open(f"{path}.tmp", "w:gz") as bundle:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            bundle.addfile(info, io.BytesIO(data))
+    os.replace(f"{path}.tmp", path)
+    size = os.path.getsize(path)
+    rotate_artifacts(directory)
+    return size
+
+
+async def grab_screenshot(page):
+    # The message pane if it is on screen, otherwise the viewport; never full-page.
     try:
-        page.screenshot(path=screenshot_path, full_page=True)
-        logger.warning("Saved attendance debug screenshot to %s", screenshot_path)
+        pane = page.locator(MESSAGE_PANE_SELECTOR).first
+        if await pane.is_visible():
+            return await pane.screenshot(type="jpeg", quality=70, timeout=5000)
     except Exception:
         pass
+    return await page.screenshot(type="jpeg", quality=70, timeout=5000)
+
+
+@timed_phase
+async def save_debug_artifacts(page, reason, report):
+    started_at = datetime.now()
+    screenshot, html, pane_html = await asyncio.gather(
+        grab_screenshot(page),
+        page.content(),
+        page.evaluate(MESSAGE_PANE_SNAPSHOT_SCRIPT, ARTIFACT_MESSAGE_LIMIT),
+        return_exceptions=True,
+    )
+    files = {
+        "meta.json": json.dumps(
+            {"reason": reason, "url": page.url, "captured_at": started_at.isoformat(timespec="seconds")},
+            indent=2,
+        ).encode("utf-8"),
+        "run_report.json": json.dumps(report, indent=2).encode("utf-8"),
+    }
+    if isinstance(screenshot, bytes):
+        files["screenshot.jpg"] = screenshot
+    if isinstance(html, str):
+        files["page.html"] = html.encode("utf-8")
+    if isinstance(pane_html, str):
+        files["message_pane.html"] = pane_html.encode("utf-8")
+
+    path = os.path.join(
+        artifact_dir(),
+        f"{started_at.strftime('%Y%m%d-%H%M%S-%f')}_{reason.lower()}.tar.gz",
+    )
+    try:
+        size = await asyncio.to_thread(write_artifact_bundle, path, files)
+    except Exception as exc:
+        logger.warning("Could not write debug artifacts: %s", exc)
+        return None
+    log_state("ARTIFACTS_SAVED", f"{path} ({size / 1024:.1f} KB: {', '.join(sorted(files))})")
+    return path
+
+
+def capture_debug_artifacts(page, reason):
+    # Start a bundle in the background so the run is not held up by it.
+    if not ARTIFACTS:
+        return None
+    task = asyncio.ensure_future(save_debug_artifacts(page, reason, build_run_report(reason, None)))
+    artifact_tasks.add(task)
+    task.add_done_callback(artifact_tasks.discard)
+    return task
+
+
+async def flush_artifacts(timeout_s=ARTIFACT_FLUSH_TIMEOUT_S):
+    # Let pending captures finish before their page goes away.
+    if not artifact_tasks:
+        return
+    _, pending = await asyncio.wait(set(artifact_tasks), timeout=timeout_s)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning("Dropped %s unfinished debug artifact bundle(s)", len(pending))
+
+
+SURVEY_OBSERVER_BINDING = "__attendanceSurveyEvent"
+SURVEY_OBSERVER_SCRIPT = """(bindingName) => {
+    const target = document.querySelector('[data-qa="message_pane"]') || document.body;
+    if (!target) return false;
+    const existing = window.__attendanceSurveyObserver;
+    if (existing && existing.target === target && target.isConnected) return true;
+    if (existing) existing.observer.disconnect();
+
+    const isPresentOption = (node) => {
+        const text = [
+            node.textContent || "",
+            node.getAttribute("aria-label") || "",
+            node.getAttribute("value") || "",
+            node.id || "",
+        ].join(" ").toLowerCase();
+        return text.includes("present");
+    };
+    const optionSelector = '[role="radio"], input[type="radio"], button, label';
+
+    const observer = new MutationObserver((records) => {
+        const types = new Set();
+        for (const record of records) {
+            for (const node of record.addedNodes) {
+                if (node.nodeType !== Node.ELEMENT_NODE) continue;
+                const text = (node.textContent || "").toLowerCase();
+                if (text.includes("please select an option")) types.add("survey_card");
+                const options = node.matches(optionSelector)
+                    ? [node]
+                    : Array.from(node.querySelectorAll(optionSelector));
+                if (options.some(isPresentOption)) types.add("present_option");
+            }
+        }
+        if (types.size && typeof window[bindingName] === "function") {
+            window[bindingName]({ types: Array.from(types) });
+        }
+    });
+    observer.observe(target, { childList: true, subtree: true });
+    window.__attendanceSurveyObserver = { observer, target };
+    return true;
+}"""
+survey_event_states = weakref.WeakKeyDictionary()
+
+
+def get_survey_event_state(page):
+    # Per-page queue of survey events shared by the DOM and network observers.
+    state = survey_event_states.get(page)
+    if state is None:
+        state = {"types": set(), "event": asyncio.Event(), "bound": False, "network": None}
+        survey_event_states[page] = state
+    return state
+
+
+def notify_survey_event(state, types):
+    state["types"].update(types)
+    state["event"].set()
+    logger.debug("Survey event: %s", ", ".join(sorted(types)))
+
+
+async def install_survey_observer(page):
+    # Push survey render events from the page instead of polling for them.
+    state = get_survey_event_state(page)
+    if not state["bound"]:
+        def on_survey_event(source, payload):
+            notify_survey_event(state, set((payload or {}).get("types") or []))
+
+        try:
+            await page.expose_binding(SURVEY_OBSERVER_BINDING, on_survey_event)
+        except Exception as exc:
+            logger.debug("Survey observer binding unavailable: %s", exc)
+            return None
+        state["bound"] = True
+
+    # Re-attach after navigations or when Slack swaps out the message pane.
+    try:
+        await page.evaluate(SURVEY_OBSERVER_SCRIPT, SURVEY_OBSERVER_BINDING)
+    except Exception as exc:
+        logger.debug("Survey observer install failed: %s", exc)
+        return None
+    return state
+
+
+async def wait_for_survey_event(page, state, timeout_ms):
+    # Sleep on the event set by the binding/network callbacks; nothing is sent
+    # to the browser while waiting.
+    if state is None:
+        await page.wait_for_timeout(min(timeout_ms, 1000))
+        return set()
+
+    if not state["types"]:
+        try:
+            await asyncio.wait_for(state["event"].wait(), timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            return set()
+    types = set(state["types"])
+    state["types"].clear()
+    state["event"].clear()
+    return types
+
+
+SURVEY_BOT_NAME = os.getenv("SURVEY_BOT_NAME", "Mia").strip()
+SURVEY_API_METHODS = (
+    "conversations.history",
+    "conversations.view",
+    "conversations.replies",
+)
+SURVEY_PROMPT_TEXT = "please select an option"
+# Slack API call the web client makes when a survey option is clicked.
+SURVEY_ACTION_METHOD = "blocks.actions"
+
+
+def iter_slack_messages(payload, depth=0):
+    # Walk an API/websocket payload and yield every dict that looks like a message.
+    if depth > 8:
+        return
+    if isinstance(payload, dict):
+        if payload.get("ts") and isinstance(payload.get("blocks"), list):
+            yield payload
+        for value in payload.values():
+            if isinstance(value, (dict, list)):
+                yield from iter_slack_messages(value, depth + 1)
+    elif isinstance(payload, list):
+        for item in payload:
+            yield from iter_slack_messages(item, depth + 1)
+
+
+def is_survey_bot_message(message):
+    if not SURVEY_BOT_NAME:
+        return True
+    names = [
+        message.get("username") or "",
+        (message.get("bot_profile") or {}).get("name") or "",
+    ]
+    names = [name for name in names if name]
+    # Messages without any bot name (e.g. trimmed websocket events) stay eligible.
+    return not names or any(SURVEY_BOT_NAME.lower() in name.lower() for name in names)
 
+
+PRESENT_WORD_PATTERN = re.compile(r"\bpresent\b")
+NEGATION_PATTERN = re.compile(r"\b(?:not|non|no|never)\b|n't\b")
+
+
+def is_present_label(label, value):
+    # "exact" for an option labelled/valued exactly "present", "word" for a label
+    # that merely contains the word (e.g. "Present ✅") without a negation.
+    if label == "present" or value.lower() == "present":
+        return "exact"
+    if PRESENT_WORD_PATTERN.search(label) and not NEGATION_PATTERN.search(label):
+        return "word"
+    return None
+
+
+def extract_survey_block(message):
+    # Return ts/block_id/action_id/value of the "present" option in a survey message.
+    if message.get("channel") and message.get("channel") != CHANNEL_ID:
+        return None
+    if not is_survey_bot_message(message):
+        return None
+    if SURVEY_PROMPT_TEXT not in json.dumps(message["blocks"]).lower():
+        return None
+
+    fallback = None
+    for block in message["blocks"]:
+        if not isinstance(block, dict):
+            continue
+        elements = list(block.get("elements") or [])
+        if block.get("accessory"):
+            elements.append(block["accessory"])
+        for element in elements:
+            if not isinstance(element, dict):
+                continue
+            for option in element.get("options") or [element]:
+                if not isinstance(option, dict):
+                    continue
+                text = " ".join(((option.get("text") or {}).get("text") or "").split())
+                value = str(option.get("value") or "").strip()
+                match = is_present_label(text.lower(), value)
+                if not match:
+                    continue
+                survey = {
+                    "ts": str(message["ts"]),
+                    "block_id": block.get("block_id"),
+                    "action_id": element.get("action_id"),
+                    "value": value,
+                    "label": text,
+                }
+                if match == "exact":
+                    return survey
+                fallback = fallback or survey
+    return fallback
+
+
+def record_network_messages(network, payload):
+    found = False
+    for message in iter_slack_messages(payload):
+        survey = extract_survey_block(message)
+        if not survey:
+            continue
+        latest = network["survey"]
+        if latest is None or float(survey["ts"]) > float(latest["ts"]):
+            network["survey"] = survey
+            found = True
+    return found
+
+
+def get_request_param(request, name):
+    # A Slack API argument from the query string or the form body (urlencoded
+    # or multipart), or None.
+    values = parse_qs(urlparse(request.url).query).get(name)
+    if values:
+        return values[-1]
     try:
-        with open(html_path, "w", encoding="utf-8") as file:
-            file.write(page.content())
-        logger.warning("Saved attendance debug HTML to %s", html_path)
+        body = request.post_data or ""
     except Exception:
-        pass
+        return None
+    match = re.search(rf'name="{re.escape(name)}"\r?\n\r?\n([^\r\n]*)', body)
+    if match:
+        return match.group(1)
+    values = parse_qs(body).get(name)
+    return values[-1] if values else None
+
+
+def attach_network_survey_observer(page):
+    # Learn about the latest survey from Slack's API and websocket payloads,
+    # usually before the message list has rendered it.
+    state = get_survey_event_state(page)
+    if state["network"] is not None:
+        return state["network"]
+    network = {"survey": None, "pending": [], "announced": None, "action": None}
+    state["network"] = network
+
+    def on_response(response):
+        # Bodies are read later from the main flow, never inside the callback.
+        # History of other channels (sidebar previews, threads) is ignored.
+        if any(f"/api/{method}" in response.url for method in SURVEY_API_METHODS) and get_request_param(
+            response.request, "channel"
+        ) in {None, CHANNEL_ID}:
+            network["pending"].append(response)
+            notify_survey_event(state, {"network_response"})
+        action = network["action"]
+        if action is not None and f"/api/{SURVEY_ACTION_METHOD}" in response.url:
+            action["pending"].append(response)
+            notify_survey_event(state, {"action_response"})
+
+    def on_request(request):
+        action = network["action"]
+        if action is not None and f"/api/{SURVEY_ACTION_METHOD}" in request.url:
+            action["sent"] += 1
+            log_state("SURVEY_ACTION_SENT", SURVEY_ACTION_METHOD)
+
+    def on_request_failed(request):
+        action = network["action"]
+        if action is not None and f"/api/{SURVEY_ACTION_METHOD}" in request.url:
+            action["outcome"] = action["outcome"] or "rejected"
+            action["detail"] = request.failure or "request failed"
+            notify_survey_event(state, {"action_failed"})
+
+    def on_frame(payload):
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8", "ignore")
+        action = network["action"]
+        outcome = None
+        if action is not None and action["outcome"] is None:
+            outcome = classify_action_reply(payload)
+        if not outcome and SURVEY_PROMPT_TEXT not in (payload or "").lower():
+            return
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return
+        if outcome and is_action_reply_frame(data, action):
+            # The app's reply to the vote is pushed over the websocket.
+            action["outcome"] = outcome
+            action["detail"] = "websocket"
+            notify_survey_event(state, {"action_reply"})
+        if SURVEY_PROMPT_TEXT not in payload.lower():
+            return
+        if record_network_messages(network, data):
+            notify_survey_event(state, {"network_survey"})
 
+    def on_websocket(websocket):
+        websocket.on("framereceived", on_frame)
 
-def find_present_option(page):
-    root = get_latest_survey_root(page)
-
-    candidates = [
-        ("role-radio-text", "click", root.locator('[role="radio"]:has-text("present")')),
-        ("role-radio-aria", "click", root.locator('[role="radio"][aria-label*="present" i]')),
-        ("button-text", "click", root.locator('button:has-text("present")')),
-        ("aria-any", "click", root.locator('[aria-label*="present" i]')),
-        ("label-text", "click", root.locator('label:has-text("present")')),
-        ("input-id", "check", root.locator('input[type="radio"][id*="-present-"]')),
-        ("input-value", "check", root.locator('input[type="radio"][value="present"]')),
-        ("input-aria", "check", root.locator('input[type="radio"][aria-label*="present" i]')),
-        ("text-contains", "click", root.get_by_text("present")),
-        ("text-exact", "click", root.get_by_text("present", exact=True)),
-        (
-            "text-regex",
-            "click",
-            root.locator(':text-matches("^\\s*present\\s*$", "i")'),
-        ),
+    page.on("request", on_request)
+    page.on("requestfailed", on_request_failed)
+    page.on("response", on_response)
+    page.on("websocket", on_websocket)
+    return network
+
+
+async def get_network_survey(page):
+    state = survey_event_states.get(page)
+    network = state["network"] if state else None
+    if network is None:
+        return None
+
+    pending, network["pending"] = network["pending"], []
+    for response in pending:
+        try:
+            record_network_messages(network, await response.json())
+        except Exception:
+            continue
+
+    survey = network["survey"]
+    if survey and network["announced"] != survey["ts"]:
+        network["announced"] = survey["ts"]
+        log_state(
+            "NETWORK_SURVEY_DETECTED",
+            f"ts={survey['ts']} block_id={survey['block_id']} action_id={survey['action_id']}",
+        )
+    return survey
+
+
+def classify_action_reply(text):
+    # "confirmed"/"closed" when *text* carries the app's reply to a vote.
+    text = (text or "").lower()
+    if CONFIRMATION_TEXT.lower() in text:
+        return "confirmed"
+    if any(pattern.lower() in text for pattern in CLOSED_SURVEY_PATTERNS):
+        return "closed"
+    return None
+
+
+def watch_survey_action(page, survey_ts=None):
+    # Start tracking the blocks.actions call and reply for the next click on
+    # the survey message *survey_ts*.
+    network = attach_network_survey_observer(page)
+    network["action"] = {
+        "ts": survey_ts,
+        "channel": CHANNEL_ID,
+        "sent": 0,
+        "pending": [],
+        "acknowledged": False,
+        "outcome": None,
+        "detail": None,
+    }
+    return network["action"]
+
+
+def collect_frame_refs(payload, refs, depth=0):
+    # Gather the channel ids and message ts values a websocket event mentions.
+    if depth > 8:
+        return refs
+    if isinstance(payload, dict):
+        for key, value in payload.items():
+            if key in {"channel", "channel_id"}:
+                channel = value.get("id") if isinstance(value, dict) else value
+                if isinstance(channel, str):
+                    refs["channels"].add(channel)
+            elif key in {"ts", "thread_ts", "message_ts", "parent_ts"} and isinstance(value, str):
+                refs["ts"].add(value)
+            if isinstance(value, (dict, list)):
+                collect_frame_refs(value, refs, depth + 1)
+    elif isinstance(payload, list):
+        for item in payload:
+            collect_frame_refs(item, refs, depth + 1)
+    return refs
+
+
+def is_action_reply_frame(data, action):
+    # Only events in the survey's channel that refer to the clicked message
+    # (card update, thread reply, reply carrying its message_ts) count.
+    refs = collect_frame_refs(data, {"channels": set(), "ts": set()})
+    if action["channel"] and action["channel"] not in refs["channels"]:
+        return False
+    return not action["ts"] or action["ts"] in refs["ts"]
+
+
+async def read_action_responses(action):
+    pending, action["pending"] = action["pending"], []
+    for response in pending:
+        try:
+            data = await response.json()
+        except Exception:
+            continue
+        if not data.get("ok"):
+            action["outcome"] = action["outcome"] or "rejected"
+            action["detail"] = data.get("error") or f"HTTP {response.status}"
+            continue
+        if not action["acknowledged"]:
+            action["acknowledged"] = True
+            mark_milestone("action_acknowledged")
+            log_state("SURVEY_ACTION_ACKNOWLEDGED", SURVEY_ACTION_METHOD)
+        # Some clients get the reply in the response body rather than the socket.
+        outcome = classify_action_reply(json.dumps(data))
+        if outcome and action["outcome"] is None:
+            action["outcome"] = outcome
+            action["detail"] = SURVEY_ACTION_METHOD
+
+
+async def wait_for_action_reply(page, action):
+    # Sleeps on the network observer's event until the vote has an outcome.
+    state = get_survey_event_state(page)
+    while True:
+        await read_action_responses(action)
+        if action["outcome"] is not None:
+            return action["outcome"]
+        await state["event"].wait()
+        state["event"].clear()
+        state["types"].clear()
+
+
+async def get_current_survey_ts(page):
+    # Message ts of the newest survey seen on the network or rendered in the
+    # channel (the card get_latest_survey_root() would pick), or None.
+    candidates = []
+    survey = await get_network_survey(page)
+    if survey:
+        candidates.append(survey["ts"])
+    scan = await scan_page_text(page, max_age_ms=0)
+    if scan and scan["prompt"]["found"]:
+        candidates.append((scan["prompt"]["location"] or {}).get("itemKey"))
+
+    timestamps = []
+    for ts in candidates:
+        try:
+            float(ts)
+        except (TypeError, ValueError):
+            continue
+        timestamps.append(ts)
+    return max(timestamps, key=float) if timestamps else None
+
+
+def css_string(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def network_survey_scopes(survey):
+    # Message-row/block selectors for a survey known from the network.
+    ts = css_string(survey["ts"])
+    scopes = [
+        probe_strategy("network-item-key", f'[data-item-key="{ts}"]'),
+        probe_strategy("network-message-id", f'[id$="{ts}"]'),
     ]
+    if survey.get("block_id"):
+        block_id = css_string(survey["block_id"])
+        scopes.append(probe_strategy("network-block-id", f'[data-block-id="{block_id}"]'))
+    return scopes
+
+
+def network_option_strategies(survey):
+    # The option the network block says is "present", by its value or exact
+    # label; searched inside the survey's message row (network_survey_scopes).
+    strategies = []
+    if survey.get("value"):
+        value = css_string(survey["value"])
+        strategies.append(probe_strategy("network-option-value", f'input[type="radio"][value="{value}"]', action="check"))
+    if survey.get("label"):
+        strategies += [
+            probe_strategy("network-option-radio", '[role="radio"]', survey["label"], exact=True, action="click"),
+            probe_strategy("network-option-text", "*", survey["label"], exact=True, leaf=True, action="click"),
+        ]
+    return strategies
+
+
+def survey_permalink(survey):
+    return f"{SLACK_URL_SCHEME}://{WORKSPACE_DOMAIN}/archives/{CHANNEL_ID}/p{survey['ts'].replace('.', '')}"
+
+
+@timed_phase
+async def find_present_option(page):
+    # Returns (action, element handles, count); the survey root is resolved in
+    # the same in-page probe, so each poll is a single round trip.
+    observer = await install_survey_observer(page)
+    survey_root_strategies = ordered_strategies("survey_root", SURVEY_ROOT_STRATEGIES)
+    present_option_strategies = ordered_strategies("present_option", PRESENT_OPTION_STRATEGIES)
+
+    with phase_budget("find_present_option", FIND_PRESENT_TIMEOUT_S) as timeout_s:
+        return await _find_present_option(
+            page,
+            observer,
+            timeout_s,
+            survey_root_strategies,
+            present_option_strategies,
+        )
+
+
+async def _find_present_option(page, observer, timeout_s, survey_root_strategies, present_option_strategies):
+    start = time.monotonic()
+    jumped_to_latest = False
+    top_steps = 0
+    opened_permalink = False
+    while time.monotonic() - start < timeout_s:
+        # A survey seen on the network is targeted first by its message ts/block id.
+        survey = await get_network_survey(page)
+        scopes = survey_root_strategies
+        strategies = present_option_strategies
+        if survey:
+            scopes = network_survey_scopes(survey) + survey_root_strategies
+            strategies = network_option_strategies(survey) + present_option_strategies
+        match = await probe_selectors(
+            page,
+            strategies,
+            scopes=scopes,
+            with_handles=True,
+        )
+        if match and match["elements"]:
+            # Strategies built from the network survey are not worth caching.
+            record_strategy_hit("present_option", match["name"], remember=not match["name"].startswith("network-"))
+            logger.debug(
+                "Matched present selector %s (%s elements, scope=%s)",
+                match["name"],
+                match["count"],
+                match["scope"],
+            )
+            if match["scope"] in SURVEY_ROOT_STRATEGY_NAMES:
+                record_strategy_hit("survey_root", match["scope"])
+            return match["strategy"]["action"], match["elements"], len(match["elements"])
 
-    timeout_s = FIND_PRESENT_TIMEOUT_S
-    start = time.time()
-    while time.time() - start < timeout_s:
-        for name, action, locator in candidates:
-            count = locator.count()
-            if count > 0:
-                logger.debug("Matched present selector %s (%s elements)", name, count)
-                return action, locator, count
-
-        elapsed = time.time() - start
-        # Slack lazily renders content. Start at latest messages, then search upward.
+        elapsed = time.monotonic() - start
+        # Slack lazily renders content. Start at latest messages and sleep until
+        # the observer reports a survey render, then search upward through history.
         if elapsed < timeout_s * 0.5:
-            nudge_to_latest_messages(page)
-            nudge_message_history(page, direction="down")
+            if not jumped_to_latest:
+                await nudge_to_latest_messages(page)
+                try:
+                    await page.keyboard.press("End")
+                except Exception:
+                    pass
+                jumped_to_latest = True
+            wait_ms = int((timeout_s * 0.5 - elapsed) * 1000)
+        elif survey and not opened_permalink:
+            # Jump straight to the survey message instead of paging through history.
+            opened_permalink = True
             try:
-                page.keyboard.press("End")
-            except Exception:
-                pass
+                await page.goto(survey_permalink(survey), wait_until="domcontentloaded", timeout=15000)
+                await dismiss_open_app_prompt(page)
+                log_state("SURVEY_PERMALINK_OPENED", page.url)
+            except Exception as exc:
+                logger.warning("Survey permalink navigation failed: %s", exc)
+            observer = await install_survey_observer(page)
+            wait_ms = 1000
+        elif top_steps < SCROLL_TOP_EXHAUSTED_STEPS:
+            record_retry("history_page_up")
+            scroll = await nudge_message_history(page, direction="up")
+            if not scroll or not scroll["containers"]:
+                try:
+                    await page.keyboard.press("PageUp")
+                except Exception:
+                    pass
+            top_steps = top_steps + 1 if scroll and scroll["atTop"] else 0
+            if top_steps >= SCROLL_TOP_EXHAUSTED_STEPS:
+                log_state("MESSAGE_HISTORY_EXHAUSTED")
+            wait_ms = 1000
+            # Scrolling can re-mount the pane; keep the observer attached.
+            observer = await install_survey_observer(page)
         else:
-            nudge_message_history(page, direction="up")
-            try:
-                page.keyboard.press("PageUp")
-            except Exception:
-                pass
-        page.wait_for_timeout(1000)
+            # Nothing older to page in; just wait for a late render.
+            wait_ms = int((timeout_s - elapsed) * 1000)
+
+        events = await wait_for_survey_event(page, observer, max(1, wait_ms))
+        if "survey_card" in events:
+            log_state("SURVEY_CARD_RENDERED")
+        if "network_survey" in events:
+            log_state("NETWORK_SURVEY_EVENT")
 
     return None, None, 0
 
 
-def handle_security_code_challenge(page):
+async def handle_security_code_challenge(page):
     # Detect common OTP/code inputs shown after Slack sign-in.
     code_fields = page.locator(
         'input[autocomplete="one-time-code"], '
@@ -742,8 +2734,8 @@ def handle_security_code_challenge(page):
         'input[id*="code"]'
     )
 
-    if code_fields.count() == 0:
-        return
+    if await code_fields.count() == 0:
+        return False
 
     log_state("SECURITY_CODE_REQUIRED")
 
@@ -758,15 +2750,15 @@ def handle_security_code_challenge(page):
             "Run container with -it for bootstrap runs."
         )
 
-    secure_code = input("Enter Slack security code: ").strip()
+    secure_code = (await asyncio.to_thread(input, "Enter Slack security code: ")).strip()
     if not secure_code:
         raise RuntimeError("Security code was empty")
 
     visible_fields = []
-    for idx in range(code_fields.count()):
+    for idx in range(await code_fields.count()):
         field = code_fields.nth(idx)
         try:
-            if field.is_visible() and field.is_enabled():
+            if await field.is_visible() and await field.is_enabled():
                 visible_fields.append(field)
         except Exception:
             continue
@@ -777,360 +2769,1940 @@ def handle_security_code_challenge(page):
         for idx, field in enumerate(visible_fields):
             if idx >= len(secure_code):
                 break
-            field.fill(secure_code[idx])
+            await field.fill(secure_code[idx])
     else:
         target = visible_fields[0] if visible_fields else code_fields.first
-        target.click()
+        await target.click()
         try:
-            target.fill("")
+            await target.fill("")
         except Exception:
             pass
-        page.keyboard.type(secure_code, delay=60)
+        await page.keyboard.type(secure_code, delay=60)
 
-    if not click_auth_action_button(page):
-        page.keyboard.press("Enter")
-    page.wait_for_timeout(3000)
+    previous_url = page.url
+    if not await click_auth_action_button(page):
+        await page.keyboard.press("Enter")
+    await wait_for_url_change(page, previous_url)
+    return True
 
 
-def login_and_save_session():
-    # Log into Slack and store session cookies locally
+@timed_phase
+async def login_and_save_session(context):
+    # Log into Slack inside *context* and store session cookies locally.
+    # Returns the logged-in page so the caller can keep using the loaded client.
     log_state("LOGIN_REQUIRED", "No valid session found")
 
     if not EMAIL or not PASSWORD:
         raise RuntimeError("Missing SLACK_EMAIL or SLACK_PASSWORD in environment")
 
-    with sync_playwright() as p:
-        # Create a fresh browser context for login.
-        browser, context = launch_context(p, use_saved_state=False)
-        page = context.new_page()
-        attach_page_debug_listeners(page, label="login")
+    page = await context.new_page()
+    attach_page_debug_listeners(page, label="login")
+    attach_network_survey_observer(page)
 
-        # 1) Always start at workspace password page with attendance-channel redirect.
-        page.goto(WORKSPACE_SIGNIN_URL, wait_until="domcontentloaded")
-        page.wait_for_timeout(1000)
-        submit_password_login_if_visible(page)
+    # Start at the workspace password page with the attendance-channel redirect;
+    # the state machine handles password, OTP, workspace pickers and handoff
+    # prompts in whatever order Slack shows them.
+    await page.goto(WORKSPACE_SIGNIN_URL, wait_until="domcontentloaded")
 
-        # 2) OTP challenge after password sign-in.
-        page.wait_for_timeout(1500)
-        handle_security_code_challenge(page)
+    # Reach the authenticated Slack client before saving session.
+    authenticated = await wait_for_authenticated_client(page, timeout_s=90)
+    if authenticated:
+        log_state("LOGIN_AUTHENTICATED")
+    else:
+        capture_debug_artifacts(page, "LOGIN_AUTHENTICATED_NOT_CONFIRMED")
+        logger.error("STATE=LOGIN_AUTHENTICATED_NOT_CONFIRMED")
+        await maybe_pause_for_debug("LOGIN_AUTHENTICATED_NOT_CONFIRMED")
+        raise RuntimeError("Login not confirmed; refusing to save invalid session")
+
+    # Save session cookies and storage for later reuse
+    await save_session_state(context)
+    log_state("SESSION_SAVED", SESSION_FILE)
+    if use_persistent_profile():
+        log_state("PROFILE_SAVED", BROWSER_PROFILE_DIR)
 
-        # Slack can ask for password again after OTP redirect.
-        submit_password_login_if_visible(page)
+    return page
 
-        # 3) Ensure auth redirect is fully loaded.
-        try:
-            page.wait_for_load_state("networkidle", timeout=15000)
-        except Exception:
-            pass
 
-        # 4) Switch to app client, ignore handoff popup, then continue to attendance channel.
-        try:
-            page.goto(APP_CHANNEL_URL, wait_until="domcontentloaded", timeout=20000)
-            dismiss_open_app_prompt(page)
-        except Exception:
-            pass
+def has_saved_session():
+    # Check if session file exists and is not empty
+    if not os.path.exists(SESSION_FILE):
+        return False
+    return os.path.getsize(SESSION_FILE) > 0
 
-        # Try to reach authenticated Slack client before saving session.
-        authenticated = wait_for_authenticated_client(page, timeout_s=90)
-        if authenticated:
-            log_state("LOGIN_AUTHENTICATED")
-        else:
-            screenshot_path = os.getenv("LOGIN_DEBUG_SCREENSHOT", "login_failed.png")
-            try:
-                page.screenshot(path=screenshot_path, full_page=True)
-                logger.warning("Saved login debug screenshot to %s", screenshot_path)
-            except Exception:
-                pass
-            logger.error("STATE=LOGIN_AUTHENTICATED_NOT_CONFIRMED")
-            maybe_pause_for_debug("LOGIN_AUTHENTICATED_NOT_CONFIRMED")
-            close_context(browser, context)
-            raise RuntimeError("Login not confirmed; refusing to save invalid session")
 
-        # Save session cookies and storage for later reuse
-        context.storage_state(path=SESSION_FILE)
-        log_state("SESSION_SAVED", SESSION_FILE)
-        if use_persistent_profile():
-            log_state("PROFILE_SAVED", BROWSER_PROFILE_DIR)
+def session_meta_path():
+    if SESSION_META_FILE:
+        return SESSION_META_FILE
+    return f"{os.path.splitext(SESSION_FILE)[0]}.meta.json"
 
-        close_context(browser, context)
 
+def get_profile_fingerprint():
+    # Identifies the browser profile the verification was made with.
+    profile = os.path.abspath(BROWSER_PROFILE_DIR) if BROWSER_PROFILE_DIR else ""
+    return hashlib.sha256(profile.encode("utf-8")).hexdigest()[:16]
 
-def is_session_valid():
-    # Check if session file exists and is not empty
-    if not os.path.exists(SESSION_FILE):
+
+def get_session_file_mtime():
+    try:
+        return os.path.getmtime(SESSION_FILE)
+    except OSError:
+        return None
+
+
+def load_session_meta():
+    try:
+        with open(session_meta_path(), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def get_auth_cookie_expiry(cookies):
+    # {cookie name: unix expiry} for the auth cookies of the Slack hosts.
+    hosts = {get_url_host(f"//{host}").split(":")[0] for host in (SLACK_APP_HOST, WORKSPACE_DOMAIN)}
+    expiry = {}
+    for cookie in cookies:
+        domain = cookie.get("domain", "").lstrip(".").lower()
+        if not any(host == domain or host.endswith(f".{domain}") for host in hosts):
+            continue
+        if cookie["name"] in SESSION_COOKIE_NAMES:
+            # Session-only cookies report -1; keep the soonest real expiry.
+            expires = cookie.get("expires", -1)
+            current = expiry.get(cookie["name"])
+            expiry[cookie["name"]] = expires if current is None else min(current, expires)
+    return expiry
+
+
+def get_saved_session_expiry():
+    # Earliest auth-cookie expiry in SESSION_FILE, -1 for session-only, or None.
+    try:
+        with open(SESSION_FILE, encoding="utf-8") as file:
+            cookies = json.load(file).get("cookies") or []
+    except (OSError, ValueError, AttributeError):
+        return None
+    expiry = get_auth_cookie_expiry(cookies)
+    if not expiry:
+        return None
+    return min(expiry.values())
+
+
+def check_session_expiry():
+    # Warn ahead of time when the saved session will need an interactive bootstrap.
+    expires = get_saved_session_expiry()
+    if expires is None or expires < 0:
+        return
+    remaining_s = expires - time.time()
+    expires_at = datetime.fromtimestamp(expires).isoformat(timespec="minutes")
+    if remaining_s <= 0:
+        logger.error(
+            "STATE=SESSION_EXPIRED | expired %s; run an interactive bootstrap "
+            "(ALLOW_INTERACTIVE_LOGIN=true)",
+            expires_at,
+        )
+    elif remaining_s < SESSION_EXPIRY_WARN_DAYS * 86400:
+        logger.warning(
+            "STATE=SESSION_EXPIRING | expires %s (%.1f days); run an interactive "
+            "bootstrap before then",
+            expires_at,
+            remaining_s / 86400,
+        )
+
+
+async def save_session_state(context):
+    # Atomic so a crash never leaves a truncated SESSION_FILE behind.
+    write_json_atomic(SESSION_FILE, await context.storage_state(), indent=None)
+
+
+async def record_session_verified(context):
+    # Store when the session was last proven good and when its cookies expire.
+    try:
+        cookies = await context.cookies()
+    except Exception as exc:
+        logger.debug("Could not read cookies for session metadata: %s", exc)
+        return
+    meta = {
+        "verified_at": round(time.time()),
+        "session_file_mtime": get_session_file_mtime(),
+        "profile": get_profile_fingerprint(),
+        "cookie_expiry": get_auth_cookie_expiry(cookies),
+    }
+    try:
+        write_json_atomic(session_meta_path(), meta)
+    except Exception as exc:
+        logger.warning("Could not write session metadata: %s", exc)
+
+
+def forget_session_verification():
+    try:
+        os.remove(session_meta_path())
+    except OSError:
+        pass
+
+
+def get_session_staleness(meta):
+    # Reason the session needs a validation pass, or None when it is fresh.
+    if SESSION_FRESH_SECONDS <= 0:
+        return "disabled"
+    if not meta:
+        return "never_verified"
+    now = time.time()
+    if now - meta.get("verified_at", 0) > SESSION_FRESH_SECONDS:
+        return "verification_old"
+    if meta.get("profile") != get_profile_fingerprint():
+        return "profile_changed"
+    if meta.get("session_file_mtime") != get_session_file_mtime():
+        return "session_file_changed"
+    expiry = meta.get("cookie_expiry") or {}
+    min_expiry = now + SESSION_COOKIE_MIN_TTL_HOURS * 3600
+    for name in SESSION_COOKIE_NAMES:
+        expires = expiry.get(name)
+        if expires is None or expires < 0:
+            return f"cookie_{name}_unknown"
+        if expires < min_expiry:
+            return f"cookie_{name}_expiring"
+    return None
+
+
+def is_session_fresh():
+    if not has_saved_session():
         return False
-    if os.path.getsize(SESSION_FILE) == 0:
+    meta = load_session_meta()
+    staleness = get_session_staleness(meta)
+    if staleness:
+        logger.debug("Session needs validation: %s", staleness)
         return False
+    log_state(
+        "SESSION_FRESH",
+        f"verified {int((time.time() - meta['verified_at']) / 60)} min ago",
+    )
+    return True
 
-    with sync_playwright() as p:
-        browser, context = launch_context(p, use_saved_state=True)
-        try:
-            # Load stored session/profile
-            page = context.new_page()
-            attach_page_debug_listeners(page, label="session-check")
-
-            # Open target workspace/channel to verify login.
-            goto_channel(page, timeout_ms=15000)
-            page.wait_for_load_state("domcontentloaded")
-
-            if is_signin_url(page.url):
-                log_state("WORKSPACE_SIGNIN_DETECTED", page.url)
-                if handle_workspace_signin(page):
-                    page.wait_for_timeout(1500)
-                else:
-                    log_state("SESSION_INVALID_SIGNIN_URL", page.url)
-                    return False
 
-            if is_glitch_page(page):
-                log_state("SESSION_INVALID_GLITCH_PAGE", page.url)
+@timed_phase
+async def is_session_valid(page):
+    # Verify the stored session/profile on *page*, leaving the channel loaded.
+    try:
+        # Open target workspace/channel to verify login.
+        await open_channel(page, timeout_ms=15000)
+        await page.wait_for_load_state("domcontentloaded")
+
+        if is_signin_url(page.url):
+            log_state("WORKSPACE_SIGNIN_DETECTED", page.url)
+            if not await handle_workspace_signin(page):
+                log_state("SESSION_INVALID_SIGNIN_URL", page.url)
                 return False
 
-            # Prefer channel-content markers, but accept slow Slack UI when URL stays authenticated.
-            if has_channel_markers(page):
-                return True
+        if await is_glitch_page(page):
+            log_state("SESSION_INVALID_GLITCH_PAGE", page.url)
+            return False
 
-            deadline = time.time() + 15
-            while time.time() < deadline:
-                dismiss_cookie_or_privacy_overlays(page)
-                if is_signin_url(page.url):
-                    log_state("WORKSPACE_SIGNIN_DETECTED", page.url)
-                    if handle_workspace_signin(page):
-                        page.wait_for_timeout(1500)
-                        continue
-                    log_state("SESSION_REAUTH_REQUIRED", page.url)
-                    return False
-                if is_glitch_page(page):
-                    log_state("SESSION_INVALID_GLITCH_PAGE", page.url)
-                    return False
-                if has_channel_markers(page):
-                    return True
-                page.wait_for_timeout(1000)
+        # Prefer channel-content markers, but accept slow Slack UI when URL stays authenticated.
+        if await has_channel_markers(page):
+            return True
 
-            log_state("SESSION_VALID_NO_CHANNEL_MARKERS", page.url)
+        with phase_budget("session_channel_markers", 15) as allowed_s:
+            state = await wait_for_session_markers(page, time.monotonic() + allowed_s)
+        if state is not None:
+            return state
 
-            return True
-        except Exception as exc:
-            # Any error -> treat as invalid session
-            logger.warning("Session validation failed, will re-login: %s", exc)
+        log_state("SESSION_VALID_NO_CHANNEL_MARKERS", page.url)
+
+        return True
+    except Exception as exc:
+        # Any error -> treat as invalid session
+        logger.warning("Session validation failed, will re-login: %s", exc)
+        return False
+
+
+async def wait_for_session_markers(page, deadline):
+    # True/False once the channel settles either way, None if it never does.
+    cookie_attempts = 0
+    attempt = 0
+    while time.monotonic() < deadline:
+        await dismiss_cookie_or_privacy_overlays(page)
+        state = await race_page_states(
+            deadline - time.monotonic(),
+            channel_state_waiters(page, watch_cookie_banner=cookie_attempts < COOKIE_BANNER_MAX_ATTEMPTS),
+        )
+        if state == "cookie_banner":
+            cookie_attempts += 1
+            await poll_pause(page, attempt, deadline)
+            attempt += 1
+            continue
+        if state == "signin_redirect":
+            log_state("WORKSPACE_SIGNIN_DETECTED", page.url)
+            if await handle_workspace_signin(page):
+                continue
+            log_state("SESSION_REAUTH_REQUIRED", page.url)
             return False
-        finally:
-            close_context(browser, context)
+        if state == "glitch_page":
+            log_state("SESSION_INVALID_GLITCH_PAGE", page.url)
+            return False
+        if state == "channel_markers":
+            return True
+    return None
 
 
-def mark_present():
+@timed_phase
+async def mark_present(page):
     # Open the channel and click the newest "present" radio button
     log_state("ATTENDANCE_ATTEMPT_STARTED")
+    mark_milestone("attempt_started")
+    # Only the attempt right after the race counts; a reused page has not raced again.
+    raced = page in channel_race_winners
+    channel_race_winners.discard(page)
 
-    with sync_playwright() as p:
-        # Use stored session/profile so no login is needed
-        browser, context = launch_context(p, use_saved_state=True)
-        page = context.new_page()
-        attach_page_debug_listeners(page, label="attendance")
-
-        # Open the Slack channel where the attendance form exists
-        goto_channel(page, timeout_ms=15000)
-        log_state("CHANNEL_OPENED", page.url)
+    # Open the Slack channel where the attendance form exists, reusing the
+    # page left behind by session validation when it is still on the channel.
+    await open_channel(page, timeout_ms=15000)
+    log_state("CHANNEL_OPENED", page.url)
 
-        # Wait for Slack to render initial content
+    # Wait for Slack to render initial content
+    try:
+        await page.wait_for_load_state("domcontentloaded", timeout=10000)
+    except Exception:
+        pass
+    await dismiss_cookie_or_privacy_overlays(page)
+
+    # Try to wait for message pane to render before selector lookups.
+    channel_ready = await wait_for_channel_content(page, timeout_s=45)
+    # A page that won a channel URL race already tried the archive URL alongside the client.
+    if not channel_ready and not is_signin_url(page.url) and not raced:
+        logger.warning(
+            "Channel markers missing on /client URL, trying archive fallback | url=%s",
+            page.url,
+        )
+        record_retry("channel_archive_fallback")
         try:
-            page.wait_for_load_state("domcontentloaded", timeout=10000)
-        except Exception:
-            pass
-        dismiss_cookie_or_privacy_overlays(page)
-
-        # Try to wait for message pane to render before selector lookups.
-        channel_ready = wait_for_channel_content(page, timeout_s=45)
-        if not channel_ready and not is_signin_url(page.url):
-            logger.warning(
-                "Channel markers missing on /client URL, trying archive fallback | url=%s",
-                page.url,
+            await page.goto(
+                WORKSPACE_ARCHIVE_URL,
+                wait_until="domcontentloaded",
+                timeout=20000,
             )
-            try:
-                page.goto(
-                    WORKSPACE_ARCHIVE_URL,
-                    wait_until="domcontentloaded",
-                    timeout=20000,
-                )
-                log_state("CHANNEL_ARCHIVE_FALLBACK_OPENED", page.url)
-            except Exception as exc:
-                logger.warning("Archive fallback navigation failed: %s", exc)
-            try:
-                page.wait_for_load_state("domcontentloaded", timeout=10000)
-            except Exception:
-                pass
-            dismiss_cookie_or_privacy_overlays(page)
-            channel_ready = wait_for_channel_content(page, timeout_s=35)
-
-        if not channel_ready and is_signin_url(page.url):
-            logger.error("STATE=SESSION_REAUTH_REQUIRED | %s", page.url)
-            maybe_pause_for_debug("SESSION_REAUTH_REQUIRED")
-            close_context(browser, context)
-            return "SESSION_REAUTH_REQUIRED"
-
-        if not channel_ready and is_glitch_page(page):
-            logger.error("STATE=CHANNEL_GLITCH_PAGE | %s", page.url)
-            capture_debug_artifacts(page)
-            maybe_pause_for_debug("CHANNEL_GLITCH_PAGE")
-            close_context(browser, context)
-            return "CHANNEL_GLITCH_PAGE"
-
-        if not channel_ready:
-            logger.warning(
-                "Message pane selector did not appear within timeout | url=%s",
-                page.url,
-            )
-            try:
-                logger.warning("Page title while waiting: %s", page.title())
-            except Exception:
-                pass
-            log_state("CHANNEL_MARKERS_MISSING_CONTINUING", page.url)
-
-        # Always capture a debug screenshot so we can inspect what the bot sees.
-        try:
-            page.screenshot(path="/session/last_run.png", full_page=True)
-            logger.info("STATE=DEBUG_SCREENSHOT_SAVED | /session/last_run.png")
+            log_state("CHANNEL_ARCHIVE_FALLBACK_OPENED", page.url)
         except Exception as exc:
-            logger.warning("Could not save debug screenshot: %s", exc)
-
+            logger.warning("Archive fallback navigation failed: %s", exc)
         try:
-            body_text = page.locator("body").inner_text(timeout=3000).lower()
-            prompt_present = "please select an option" in body_text
-            closed_present = "the survey is now closed." in body_text or "the survey is closed!" in body_text
-            log_state(
-                "SURVEY_TEXT_SCAN",
-                f"prompt_present={prompt_present} closed_present={closed_present}",
-            )
+            await page.wait_for_load_state("domcontentloaded", timeout=10000)
+        except Exception:
+            pass
+        await dismiss_cookie_or_privacy_overlays(page)
+        channel_ready = await wait_for_channel_content(page, timeout_s=35)
+
+    if channel_ready:
+        mark_milestone("channel_ready")
+
+    if not channel_ready and is_signin_url(page.url):
+        logger.error("STATE=SESSION_REAUTH_REQUIRED | %s", page.url)
+        await maybe_pause_for_debug("SESSION_REAUTH_REQUIRED")
+        return "SESSION_REAUTH_REQUIRED"
+
+    if not channel_ready and await is_glitch_page(page):
+        logger.error("STATE=CHANNEL_GLITCH_PAGE | %s", page.url)
+        capture_debug_artifacts(page, "CHANNEL_GLITCH_PAGE")
+        await maybe_pause_for_debug("CHANNEL_GLITCH_PAGE")
+        return "CHANNEL_GLITCH_PAGE"
+
+    if not channel_ready:
+        logger.warning(
+            "Message pane selector did not appear within timeout | url=%s",
+            page.url,
+        )
+        try:
+            logger.warning("Page title while waiting: %s", await page.title())
         except Exception:
-            logger.warning("Failed to read body text for survey text scan")
-
-        # IMPORTANT: Search for the "Present" button FIRST.  The channel
-        # may contain *both* an older closed survey AND a newer open one.
-        # Only declare "closed" when no clickable option exists at all.
-        action, present_options, count = find_present_option(page)
-        if count == 0:
-            # No present button anywhere — now check if survey is closed.
-            survey_root = get_latest_survey_root(page)
-            closed_message = find_closed_survey_message(page, scope=survey_root if survey_root is not page else None)
-            if closed_message:
-                log_state("SURVEY_CLOSED", closed_message)
-                maybe_pause_for_debug("SURVEY_CLOSED")
-                close_context(browser, context)
-                return "SURVEY_CLOSED"
-
-            logger.error("STATE=PRESENT_OPTION_NOT_FOUND")
-            capture_debug_artifacts(page)
-            maybe_pause_for_debug("PRESENT_OPTION_NOT_FOUND")
-            close_context(browser, context)
-            return "PRESENT_OPTION_NOT_FOUND"
-
-        # Select the newest "present" option
-        newest_present = present_options.nth(count - 1)
-        newest_present.scroll_into_view_if_needed()
-
-        # Prepare confirmation message check (from the Mia Attendance Bot)
-        confirmation_text = "Your selection (present) has been recorded successfully"
-        confirmation_locator = page.locator(
-            "div.p-rich_text_section",
-            has_text=confirmation_text,
+            pass
+        log_state("CHANNEL_MARKERS_MISSING_CONTINUING", page.url)
+
+    if ARTIFACT_EVERY_RUN:
+        # Keep what the bot saw before searching, for inspection later.
+        capture_debug_artifacts(page, "CHANNEL_VIEW")
+
+    scan = await scan_page_text(page)
+    if scan:
+        prompt_location = (scan["prompt"]["location"] or {}).get("itemKey")
+        log_state(
+            "SURVEY_TEXT_SCAN",
+            f"prompt_present={scan['prompt']['found']} "
+            f"closed_present={scan['closed']['found']} "
+            f"prompt_item={prompt_location}",
         )
-        previous_confirmations = confirmation_locator.count()
+    else:
+        logger.warning("Failed to read page text for survey text scan")
+
+    # IMPORTANT: Search for the "Present" button FIRST.  The channel
+    # may contain *both* an older closed survey AND a newer open one.
+    # Only declare "closed" when no clickable option exists at all.
+    action, present_options, count = await find_present_option(page)
+    if count == 0:
+        # No present button anywhere — now check if survey is closed.
+        survey_root = await get_latest_survey_root(page)
+        closed_message = await find_closed_survey_message(page, scope=survey_root if survey_root is not page else None)
+        if closed_message:
+            log_state("SURVEY_CLOSED", closed_message)
+            await maybe_pause_for_debug("SURVEY_CLOSED")
+            return "SURVEY_CLOSED"
+
+        logger.error("STATE=PRESENT_OPTION_NOT_FOUND")
+        capture_debug_artifacts(page, "PRESENT_OPTION_NOT_FOUND")
+        await maybe_pause_for_debug("PRESENT_OPTION_NOT_FOUND")
+        return "PRESENT_OPTION_NOT_FOUND"
+
+    mark_milestone("present_found")
+    run_metrics["survey_ts"] = await get_current_survey_ts(page)
+    recorded = None if force_run else ledger_survey_done(run_metrics["survey_ts"], ("PRESENT_RECORDED",))
+    if recorded:
+        log_state(
+            "SURVEY_ALREADY_RECORDED",
+            f"survey_ts={recorded['survey_ts']} at={recorded['started_at']}",
+        )
+        return "ALREADY_RECORDED"
+
+    # Select the newest "present" option
+    newest_present = present_options[-1]
+    await newest_present.scroll_into_view_if_needed()
+
+    # Prepare confirmation message check (from the Mia Attendance Bot)
+    confirmation_locator = page.locator(
+        "div.p-rich_text_section",
+        has_text=CONFIRMATION_TEXT,
+    )
+    closed_locator = page.locator(CLOSED_REPLY_SELECTOR)
+    previous_confirmations = await confirmation_locator.count()
+    previous_closed = await closed_locator.count()
+    vote = watch_survey_action(page, run_metrics["survey_ts"])
 
+    with phase_span("click_present"):
         try:
             if action == "check":
-                newest_present.check(timeout=5000)
+                await newest_present.check(timeout=5000)
             else:
-                newest_present.click(timeout=5000)
+                await newest_present.click(timeout=5000)
         except Exception:
+            record_retry("forced_click")
             if action == "check":
-                newest_present.check(force=True)
+                await newest_present.check(force=True)
             else:
-                newest_present.click(force=True)
-
-        # Wait for the new confirmation message
-        confirmed = False
-        timeout_s = 15
-        start = time.time()
-        while time.time() - start < timeout_s:
-            if confirmation_locator.count() > previous_confirmations:
-                confirmed = True
-                break
-            time.sleep(0.5)
+                await newest_present.click(force=True)
+
+    # Wait for the app's reply: a new confirmation/closed message in the DOM,
+    # or the blocks.actions response/websocket push, whichever comes first.
+    with phase_span("wait_for_confirmation"), phase_budget("wait_for_confirmation", 15) as allowed_s:
+        try:
+            reply = await race_page_states(
+                allowed_s,
+                {
+                    "confirmed": lambda: confirmation_locator.nth(previous_confirmations).wait_for(
+                        state="attached",
+                        timeout=0,
+                    ),
+                    "closed": lambda: closed_locator.nth(previous_closed).wait_for(
+                        state="attached",
+                        timeout=0,
+                    ),
+                    "network": lambda: wait_for_action_reply(page, vote),
+                },
+            )
+        finally:
+            attach_network_survey_observer(page)["action"] = None
+        if reply == "network":
+            reply = vote["outcome"]
+
+    if reply == "confirmed":
+        mark_milestone("confirmed")
+        log_state("PRESENT_RECORDED", CONFIRMATION_TEXT)
+        return "PRESENT_RECORDED"
+
+    if reply == "closed":
+        log_state("SURVEY_CLOSED_AFTER_ATTEMPT", vote["detail"] or "closed message")
+        await maybe_pause_for_debug("SURVEY_CLOSED_AFTER_ATTEMPT")
+        return "SURVEY_CLOSED"
+
+    if reply == "rejected":
+        log_state("SURVEY_ACTION_REJECTED", vote["detail"])
+    elif not vote["sent"]:
+        log_state("SURVEY_ACTION_NOT_SENT", "the click did not reach Slack")
+
+    logger.warning("STATE=NO_CONFIRMATION_AFTER_CLICK")
+    capture_debug_artifacts(page, "NO_CONFIRMATION_AFTER_CLICK")
+    await maybe_pause_for_debug("NO_CONFIRMATION_AFTER_CLICK")
+    return "NO_CONFIRMATION_AFTER_CLICK"
+
+
+async def replace_context_for_login(browser, context):
+    # A persistent profile is its own browser; log in right inside it.
+    if browser is None:
+        return context
+    # Otherwise swap the rejected saved state for a fresh context on the same browser.
+    await context.close()
+    return await new_browser_context(browser, use_saved_state=False)
+
+
+async def new_attendance_page(context):
+    page = await context.new_page()
+    attach_page_debug_listeners(page, label="attendance")
+    attach_network_survey_observer(page)
+    return page
 
-        if confirmed:
-            log_state("PRESENT_RECORDED", confirmation_text)
-            # Small delay to ensure the click is registered
-            time.sleep(3)
-            close_context(browser, context)
-            return "PRESENT_RECORDED"
 
-        closed_message = find_closed_survey_message(page)
-        if closed_message:
-            log_state("SURVEY_CLOSED_AFTER_ATTEMPT", closed_message)
-            maybe_pause_for_debug("SURVEY_CLOSED_AFTER_ATTEMPT")
-            close_context(browser, context)
-            return "SURVEY_CLOSED"
+# Pages that won open_attendance_page()'s race, i.e. reached the channel.
+channel_race_winners = weakref.WeakSet()
+
+
+async def load_channel_candidate(page, url, timeout_s):
+    # Returns *page* once it shows the authenticated channel, else None.
+    try:
+        await page.goto(url, wait_until="domcontentloaded", timeout=timeout_s * 1000)
+    except Exception as exc:
+        logger.debug("Channel candidate %s failed: %s", url, exc)
+        return None
+    await dismiss_open_app_prompt(page)
+    state = await race_page_states(
+        timeout_s,
+        channel_state_waiters(page, watch_cookie_banner=False),
+    )
+    if state == "channel_markers" and is_authenticated_client_url(page.url):
+        return page
+    return None
+
+
+@timed_phase
+async def open_attendance_page(context):
+    # A new attendance page. With CHANNEL_URL_RACE it is already on the channel:
+    # the first of the parallel candidates to get there wins, the rest close.
+    if not CHANNEL_URL_RACE or len(CHANNEL_URLS) < 2:
+        return await new_attendance_page(context)
+
+    pages = [await new_attendance_page(context) for _ in CHANNEL_URLS]
+    winner = None
+    with phase_budget("channel_url_race", CHANNEL_URL_RACE_TIMEOUT_S) as allowed_s:
+        tasks = [
+            asyncio.ensure_future(load_channel_candidate(page, url, allowed_s))
+            for page, url in zip(pages, CHANNEL_URLS)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=max(allowed_s, 0.001)):
+                winner = await next_done
+                if winner is not None:
+                    break
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    if winner is None:
+        # Nobody made it; the first page is left for validation to sort out.
+        log_state("CHANNEL_URL_RACE_NO_WINNER", pages[0].url)
+        winner = pages[0]
+    else:
+        log_state("CHANNEL_URL_RACE_WON", winner.url)
+        channel_race_winners.add(winner)
+    for page in pages:
+        if page is not winner:
+            await page.close()
+    return winner
 
-        logger.warning("STATE=NO_CONFIRMATION_AFTER_CLICK")
-        capture_debug_artifacts(page)
-        maybe_pause_for_debug("NO_CONFIRMATION_AFTER_CLICK")
-        # Small delay to ensure the click is registered
-        time.sleep(3)
-        close_context(browser, context)
-        return "NO_CONFIRMATION_AFTER_CLICK"
 
+@timed_phase
+async def ensure_session(browser, context):
+    # Reuse valid session if possible, otherwise login again on the same browser.
+    # Returns (context, page) ready for attendance, or (context, None) on failure.
+    page = await open_attendance_page(context)
 
-def ensure_session():
-    # Reuse valid session if possible, otherwise login again
-    if is_session_valid():
+    if has_saved_session() and await is_session_valid(page):
         log_state("SESSION_VALID")
-        return True
+        await record_session_verified(context)
+        return context, page
 
     if not ALLOW_INTERACTIVE_LOGIN:
         logger.error(
             "STATE=SESSION_INVALID_INTERACTIVE_LOGIN_DISABLED | "
             "Enable ALLOW_INTERACTIVE_LOGIN=true for a bootstrap run."
         )
-        return False
+        return context, None
 
+    await page.close()
+    context = await replace_context_for_login(browser, context)
     try:
-        login_and_save_session()
+        page = await login_and_save_session(context)
     except Exception as exc:
         logger.error("STATE=LOGIN_FAILED | %s", exc)
-        return False
+        return context, None
 
-    if is_session_valid():
+    if await is_session_valid(page):
         log_state("SESSION_VALID_AFTER_LOGIN")
-        return True
+        await record_session_verified(context)
+        return context, page
 
     logger.error("STATE=SESSION_INVALID_AFTER_LOGIN")
-    return False
+    return context, None
 
 
-def run_once():
-    global workspace_signin_attempts
-    workspace_signin_attempts = 0
+async def run_attendance_with_session(browser, context):
+    # Returns (context, attendance_state); the state is None without a valid session.
+    # A recently verified session goes straight to the attendance flow and only
+    # falls back to validation/login if that flow lands on sign-in.
+    fresh = is_session_fresh()
+    if fresh:
+        page = await open_attendance_page(context)
+    else:
+        context, page = await ensure_session(browser, context)
+        if page is None:
+            return context, None
+
+    attendance_state = await mark_present(page)
+    if not fresh:
+        return context, attendance_state
+
+    if attendance_state == "SESSION_REAUTH_REQUIRED":
+        log_state("SESSION_FRESH_REJECTED", page.url)
+        forget_session_verification()
+        await page.close()
+        context, page = await ensure_session(browser, context)
+        if page is None:
+            return context, None
+        return context, await mark_present(page)
+
+    if "channel_ready" in run_metrics["milestones"]:
+        # The channel loaded without sign-in, which is a verification too.
+        await record_session_verified(context)
+    return context, attendance_state
+
+
+async def run_attendance_pipeline():
+    # One Playwright/browser/context for validation, login fallback and the click.
+    async with async_playwright() as p:
+        browser, context = await launch_context(p, use_saved_state=True)
+        try:
+            context, attendance_state = await within_run_budget(
+                run_attendance_with_session(browser, context)
+            )
+            return attendance_state
+        except asyncio.TimeoutError:
+            log_state("RUN_BUDGET_EXCEEDED", f"{RUN_BUDGET_S}s")
+            return "RUN_BUDGET_EXCEEDED"
+        finally:
+            log_lean_mode_report()
+            await close_context(browser, context)
 
-    # Single run: ensure session exists, then mark attendance
-    log_state("RUN_STARTED")
+
+def report_attendance_state(attendance_state):
+    # Log the run outcome and map it to the process exit code.
+    if attendance_state is None:
+        log_state("RUN_FAILED", "No valid session")
+        return 2
+
+    if attendance_state in {"PRESENT_RECORDED", "SURVEY_CLOSED", "ALREADY_RECORDED"}:
+        log_state("RUN_COMPLETED", attendance_state)
+        return 0
+
+    log_state("RUN_FAILED", attendance_state)
+    return 3
+
+
+def log_runtime_config():
     logger.info(
         "STATE=RUNTIME_CONFIG | headless=%s slow_mo_ms=%s debug_nav_events=%s",
         HEADLESS,
         SLOW_MO_MS,
         DEBUG_NAV_EVENTS,
     )
-    if not ensure_session():
-        log_state("RUN_FAILED", "No valid session")
-        raise SystemExit(2)
-    attendance_state = mark_present()
 
-    if attendance_state in {"PRESENT_RECORDED", "SURVEY_CLOSED"}:
-        log_state("RUN_COMPLETED", attendance_state)
+
+def new_metrics_state():
+    return {
+        "runs": {},
+        "histograms": {
+            name: {"buckets": [0] * len(METRICS_BUCKETS_S), "sum": 0.0, "count": 0}
+            for name in list(METRICS_LATENCIES) + ["run_duration"]
+        },
+        "last_run": None,
+    }
+
+
+def metrics_state_path():
+    # Counters must survive between cron runs, so the textfile keeps a sidecar.
+    return f"{METRICS_TEXTFILE}.state.json"
+
+
+def load_metrics_state():
+    state = new_metrics_state()
+    if not METRICS_TEXTFILE or not os.path.exists(metrics_state_path()):
+        return state
+    try:
+        with open(metrics_state_path(), encoding="utf-8") as file:
+            saved = json.load(file)
+        state["runs"].update(saved.get("runs") or {})
+        for name, histogram in (saved.get("histograms") or {}).items():
+            if name in state["histograms"] and len(histogram["buckets"]) == len(METRICS_BUCKETS_S):
+                state["histograms"][name] = histogram
+        state["last_run"] = saved.get("last_run")
+    except Exception as exc:
+        logger.warning("Could not read metrics state, starting over: %s", exc)
+    return state
+
+
+def observe_histogram(histogram, value):
+    for index, bound in enumerate(METRICS_BUCKETS_S):
+        if value <= bound:
+            histogram["buckets"][index] += 1
+    histogram["sum"] = round(histogram["sum"] + value, 3)
+    histogram["count"] += 1
+
+
+def observe_run(state, attendance_state, exit_code):
+    # Fold the finished run (run_metrics) into the exported counters.
+    outcome = attendance_state or "NO_VALID_SESSION"
+    state["runs"][outcome] = state["runs"].get(outcome, 0) + 1
+
+    milestones = run_metrics["milestones"]
+    attempt_started = milestones.get("attempt_started")
+    if attempt_started is not None:
+        for name, (milestone, _) in METRICS_LATENCIES.items():
+            if milestone in milestones:
+                observe_histogram(
+                    state["histograms"][name],
+                    (milestones[milestone] - attempt_started) / 1000,
+                )
+    # A daemon run idles between warm-up and its slot; that is not latency.
+    idle_ms = run_metrics["phases"].get("daemon_slot_wait", {}).get("total_ms", 0.0)
+    observe_histogram(
+        state["histograms"]["run_duration"],
+        max(0.0, time.monotonic() - run_metrics["started"] - idle_ms / 1000),
+    )
+    state["last_run"] = {
+        "timestamp": round(time.time(), 3),
+        "outcome": outcome,
+        "exit_code": exit_code,
+    }
+
+
+def get_session_age_seconds():
+    try:
+        return max(0.0, time.time() - os.path.getmtime(SESSION_FILE))
+    except OSError:
+        return None
+
+
+def metric_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_metrics(state):
+    lines = [
+        "# HELP attendance_runs_total Attendance runs by outcome.",
+        "# TYPE attendance_runs_total counter",
+    ]
+    for outcome, count in sorted(state["runs"].items()):
+        lines.append(f'attendance_runs_total{{outcome="{metric_label(outcome)}"}} {count}')
+
+    help_texts = {name: help_text for name, (_, help_text) in METRICS_LATENCIES.items()}
+    help_texts["run_duration"] = "Seconds for a whole run, excluding the daemon slot wait."
+    for name, histogram in state["histograms"].items():
+        metric = f"attendance_{name}_seconds"
+        lines.append(f"# HELP {metric} {help_texts[name]}")
+        lines.append(f"# TYPE {metric} histogram")
+        for bound, count in zip(METRICS_BUCKETS_S, histogram["buckets"]):
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram["count"]}')
+        lines.append(f"{metric}_sum {histogram['sum']}")
+        lines.append(f"{metric}_count {histogram['count']}")
+
+    last_run = state["last_run"]
+    if last_run:
+        lines += [
+            "# HELP attendance_last_run_timestamp_seconds Unix time the last run finished.",
+            "# TYPE attendance_last_run_timestamp_seconds gauge",
+            f"attendance_last_run_timestamp_seconds {last_run['timestamp']}",
+            "# HELP attendance_last_run_exit_code Exit code of the last run.",
+            "# TYPE attendance_last_run_exit_code gauge",
+            f'attendance_last_run_exit_code{{outcome="{metric_label(last_run["outcome"])}"}} '
+            f"{last_run['exit_code']}",
+        ]
+
+    session_age = get_session_age_seconds()
+    if session_age is not None:
+        lines += [
+            "# HELP attendance_session_age_seconds Seconds since the saved session was written.",
+            "# TYPE attendance_session_age_seconds gauge",
+            f"attendance_session_age_seconds {session_age:.0f}",
+        ]
+    session_expiry = get_saved_session_expiry()
+    if session_expiry is not None and session_expiry >= 0:
+        lines += [
+            "# HELP attendance_session_expiry_timestamp_seconds Unix time the saved auth cookies expire.",
+            "# TYPE attendance_session_expiry_timestamp_seconds gauge",
+            f"attendance_session_expiry_timestamp_seconds {session_expiry:.0f}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_textfile(state):
+    if not METRICS_TEXTFILE:
         return
+    try:
+        # node_exporter may read at any moment; only ever rename complete files.
+        write_json_atomic(metrics_state_path(), state, indent=None)
+        write_file_atomic(METRICS_TEXTFILE, render_metrics(state))
+    except Exception as exc:
+        logger.warning("Could not write metrics textfile: %s", exc)
+
+
+def record_run_metrics(state, attendance_state, exit_code):
+    if state is None:
+        return
+    observe_run(state, attendance_state, exit_code)
+    write_metrics_textfile(state)
+
+
+async def start_http_server(host, port, route):
+    # Minimal HTTP/1.0 server on the running loop; no extra dependency needed.
+    # *route(method, path, query, body)* returns (status, content_type, text).
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            headers = {}
+            while True:
+                line = (await asyncio.wait_for(reader.readline(), timeout=5)).decode("latin-1")
+                if not line.strip():
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = b""
+            length = parse_int(headers.get("content-length"), default=0)
+            if length > 0:
+                body = await asyncio.wait_for(reader.readexactly(min(length, 65536)), timeout=5)
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                status, content_type, text = 400, "text/plain; charset=utf-8", "bad request\n"
+            else:
+                url = urlparse(parts[1])
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                status, content_type, text = await route(
+                    parts[0].upper(),
+                    url.path.rstrip("/") or "/",
+                    query,
+                    body.decode("utf-8", "replace"),
+                )
+            payload = text.encode("utf-8")
+            writer.write(
+                (
+                    f"HTTP/1.0 {status} {HTTPStatus(status).phrase}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode("latin-1")
+                + payload
+            )
+            await writer.drain()
+        except Exception as exc:
+            logger.debug("HTTP request failed: %s", exc)
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+def json_response(data, status=200):
+    return status, "application/json", json.dumps(data) + "\n"
+
+
+def text_response(text, status=200):
+    return status, "text/plain; charset=utf-8", text
+
+
+async def start_metrics_server(state):
+    async def route(method, path, query, body):
+        if method == "GET" and path in {"/", "/metrics"}:
+            return 200, "text/plain; version=0.0.4; charset=utf-8", render_metrics(state)
+        return text_response("not found\n", status=404)
+
+    server = await start_http_server(METRICS_HOST, METRICS_PORT, route)
+    log_state("METRICS_SERVER_STARTED", f"http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return server
+
+
+def ledger_path():
+    if LEDGER_FILE:
+        return LEDGER_FILE
+    return f"{os.path.splitext(SESSION_FILE)[0]}.ledger.json"
+
+
+def load_ledger():
+    # Oldest-first list of {"slot", "survey_ts", "outcome", "exit_code", ...}.
+    try:
+        with open(ledger_path(), encoding="utf-8") as file:
+            return json.load(file).get("runs") or []
+    except (OSError, ValueError, AttributeError):
+        return []
+
+
+def record_ledger_entry(slot_key, report, trigger, survey_ts=None):
+    if not LEDGER:
+        return
+    entry = {
+        "slot": slot_key,
+        "account": EMAIL,
+        "survey_ts": survey_ts or report.get("survey_ts"),
+        "outcome": report["outcome"],
+        "exit_code": report["exit_code"],
+        "trigger": trigger,
+        "started_at": report["started_at"],
+        "duration_ms": report["duration_ms"],
+    }
+    try:
+        # Re-read under the lock so runs appended by other processes are kept.
+        with file_lock(ledger_path()):
+            runs = load_ledger()
+            runs.append(entry)
+            write_json_atomic(ledger_path(), {"runs": runs[-LEDGER_MAX_ENTRIES:]})
+    except Exception as exc:
+        logger.warning("Could not write run ledger: %s", exc)
+
+
+def ledger_slot_key(moment=None, schedule_expression=None, now=None):
+    # The schedule slot a run belongs to: a retry at 09:20 shares the 09:05
+    # slot. Runs more than LEDGER_SLOT_WINDOW_MINUTES after the latest slot
+    # (or before the first one) belong to none and are keyed by survey only.
+    if moment is not None:
+        return moment.isoformat(timespec="minutes")
+    try:
+        schedules = parse_cron_schedule(schedule_expression or DAEMON_SCHEDULE)
+    except ValueError:
+        return None
+    moment = previous_cron_time(schedules, now or datetime.now(), max_minutes=LEDGER_SLOT_WINDOW_MINUTES)
+    return moment.isoformat(timespec="minutes") if moment else None
+
+
+def ledger_slot_done(slot_key):
+    if not LEDGER or slot_key is None:
+        return None
+    for entry in reversed(load_ledger()):
+        if (
+            entry["slot"] == slot_key
+            and entry.get("account", EMAIL) == EMAIL
+            and entry["outcome"] == "PRESENT_RECORDED"
+        ):
+            return entry
+    return None
+
+
+def ledger_survey_done(survey_ts, outcomes=("PRESENT_RECORDED", "SURVEY_CLOSED")):
+    # The ledger entry for *survey_ts* with one of *outcomes*, or None.
+    if not LEDGER or not survey_ts:
+        return None
+    for entry in reversed(load_ledger()):
+        if (
+            entry.get("survey_ts") == survey_ts
+            and entry.get("account", EMAIL) == EMAIL
+            and entry["outcome"] in outcomes
+        ):
+            return entry
+    return None
+
+
+def skip_recorded_slot(slot_key):
+    # Logs and returns True when *slot_key* is already PRESENT_RECORDED.
+    entry = ledger_slot_done(slot_key)
+    if entry is None:
+        return False
+    log_state(
+        "RUN_SKIPPED_ALREADY_RECORDED",
+        f"slot={slot_key} survey_ts={entry.get('survey_ts')} at={entry['started_at']}",
+    )
+    return True
+
+
+def print_ledger_history(limit=20):
+    runs = load_ledger()[-limit:] if limit > 0 else load_ledger()
+    if not runs:
+        print(f"No runs recorded in {ledger_path()}")
+        return
+    columns = ["slot", "started_at", "outcome", "exit_code", "trigger", "survey_ts", "duration_ms"]
+    rows = [["" if entry.get(column) is None else str(entry.get(column)) for column in columns] for entry in runs]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(widths[i]) for i, column in enumerate(columns)))
+    for row in rows:
+        print("  ".join(value.ljust(widths[i]) for i, value in enumerate(row)).rstrip())
+
+
+def run_once(force=False, schedule_expression=None):
+    global workspace_signin_attempts, force_run
+    workspace_signin_attempts = 0
+    force_run = force
+
+    # Single run: ensure session exists, then mark attendance
+    reset_lean_mode_stats()
+    reset_run_metrics()
+    slot_key = ledger_slot_key(schedule_expression=schedule_expression)
+    if not force and skip_recorded_slot(slot_key):
+        return
+    log_state("RUN_STARTED", slot_key or "")
+    log_runtime_config()
+    check_session_expiry()
+    attendance_state = asyncio.run(run_attendance_pipeline())
+    exit_code = report_attendance_state(attendance_state)
+    record_ledger_entry(slot_key, write_run_report(attendance_state, exit_code), "once")
+    if METRICS_TEXTFILE:
+        record_run_metrics(load_metrics_state(), attendance_state, exit_code)
+    if exit_code:
+        raise SystemExit(exit_code)
+
+
+@timed_phase
+async def refresh_session_in_context(context):
+    # Load the client with the saved state, give Slack a moment to rotate its
+    # cookies, then re-save SESSION_FILE. Never logs in; returns True on success.
+    page = await open_attendance_page(context)
+    try:
+        if not has_saved_session() or not await is_session_valid(page):
+            logger.error(
+                "STATE=SESSION_REFRESH_FAILED | saved session is no longer valid; "
+                "run an interactive bootstrap (ALLOW_INTERACTIVE_LOGIN=true)"
+            )
+            forget_session_verification()
+            return False
+        await page.wait_for_timeout(SESSION_REFRESH_SETTLE_SECONDS * 1000)
+        await save_session_state(context)
+        await record_session_verified(context)
+    finally:
+        await page.close()
+
+    expires = get_saved_session_expiry()
+    log_state(
+        "SESSION_REFRESHED",
+        "cookie expiry unknown" if expires is None or expires < 0
+        else f"expires {datetime.fromtimestamp(expires).isoformat(timespec='minutes')}",
+    )
+    check_session_expiry()
+    return True
+
+
+async def run_session_refresh():
+    async with async_playwright() as p:
+        browser, context = await launch_context(p, use_saved_state=True)
+        try:
+            return await within_run_budget(refresh_session_in_context(context))
+        except asyncio.TimeoutError:
+            log_state("RUN_BUDGET_EXCEEDED", f"{RUN_BUDGET_S}s")
+            return False
+        finally:
+            await close_context(browser, context)
+
+
+def refresh_once():
+    # Cron-friendly refresh job; exit code 2 means a bootstrap is needed.
+    global workspace_signin_attempts
+    workspace_signin_attempts = 0
+
+    reset_run_metrics()
+    log_state("SESSION_REFRESH_STARTED", SESSION_FILE)
+    check_session_expiry()
+    if not asyncio.run(run_session_refresh()):
+        raise SystemExit(2)
+
+
+def parse_cron_field(field, low, high):
+    # Supports "*", "a", "a-b", "a,b" and "/step" on any of those.
+    values = set()
+    for part in field.split(","):
+        part = part.strip()
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Invalid cron step: {field}")
+        if part in {"", "*"}:
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron value out of range {low}-{high}: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def parse_cron_schedule(expression):
+    # Parse one or more ";"-separated cron expressions into field sets.
+    schedules = []
+    for entry in expression.split(";"):
+        fields = entry.split()
+        if not fields:
+            continue
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {entry.strip()}")
+        days_of_week = parse_cron_field(fields[4], 0, 7)
+        if 7 in days_of_week:
+            days_of_week = (days_of_week - {7}) | {0}
+        schedules.append(
+            {
+                "minutes": parse_cron_field(fields[0], 0, 59),
+                "hours": parse_cron_field(fields[1], 0, 23),
+                "days": parse_cron_field(fields[2], 1, 31),
+                "months": parse_cron_field(fields[3], 1, 12),
+                "weekdays": days_of_week,
+                "days_restricted": fields[2] != "*",
+                "weekdays_restricted": fields[4] != "*",
+            }
+        )
+    if not schedules:
+        raise ValueError("Empty cron schedule")
+    return schedules
+
+
+def cron_matches(schedule, moment):
+    if moment.minute not in schedule["minutes"]:
+        return False
+    if moment.hour not in schedule["hours"]:
+        return False
+    if moment.month not in schedule["months"]:
+        return False
+
+    day_match = moment.day in schedule["days"]
+    weekday_match = (moment.weekday() + 1) % 7 in schedule["weekdays"]
+    # Like cron: when both day fields are restricted, either one may match.
+    if schedule["days_restricted"] and schedule["weekdays_restricted"]:
+        return day_match or weekday_match
+    return day_match and weekday_match
+
+
+def previous_cron_time(schedules, before, max_minutes=366 * 24 * 60):
+    # Latest slot at or before *before*, or None within *max_minutes*.
+    moment = before.replace(second=0, microsecond=0)
+    for _ in range(max_minutes + 1):
+        if any(cron_matches(schedule, moment) for schedule in schedules):
+            return moment
+        moment -= timedelta(minutes=1)
+    return None
+
+
+def next_cron_time(schedules, after):
+    # Walk minute by minute; a year of minutes bounds impossible schedules.
+    moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    for _ in range(366 * 24 * 60):
+        if any(cron_matches(schedule, moment) for schedule in schedules):
+            return moment
+        moment += timedelta(minutes=1)
+    raise ValueError("Cron schedule never fires")
 
-    log_state("RUN_FAILED", attendance_state)
-    raise SystemExit(3)
+
+async def sleep_until(moment):
+    while True:
+        remaining = (moment - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, 60))
+
+
+def load_last_run_report():
+    try:
+        with open(run_report_path(), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def get_session_health():
+    meta = load_session_meta()
+    expires = get_saved_session_expiry()
+    return {
+        "saved": has_saved_session(),
+        "needs_validation": get_session_staleness(meta) if has_saved_session() else "no_session",
+        "verified_at": datetime.fromtimestamp(meta["verified_at"]).isoformat(timespec="seconds")
+        if meta and meta.get("verified_at") else None,
+        "cookie_expires_at": datetime.fromtimestamp(expires).isoformat(timespec="seconds")
+        if expires is not None and expires >= 0 else None,
+    }
+
+
+def new_daemon_state(playwright, metrics_state, schedule_expression=DAEMON_SCHEDULE):
+    # Warm browser shared by scheduled and on-demand runs; *lock* serializes them.
+    return {
+        "playwright": playwright,
+        "schedule": schedule_expression,
+        "browser": None,
+        "context": None,
+        "page": None,
+        "lock": asyncio.Lock(),
+        "queued": None,
+        "metrics": metrics_state,
+        "last_report": None,
+        # Survey ts values answered or found closed; works with LEDGER=false too.
+        "answered": set(),
+    }
+
+
+async def reset_daemon_browser(daemon):
+    # Start from a fresh browser next time in case this one is wedged.
+    try:
+        await close_context(daemon["browser"], daemon["context"])
+    except Exception:
+        pass
+    daemon.update({"browser": None, "context": None, "page": None})
+
+
+async def ensure_daemon_context(daemon):
+    if daemon["context"] is None:
+        daemon["browser"], daemon["context"] = await launch_context(
+            daemon["playwright"], use_saved_state=True
+        )
+        log_state("DAEMON_BROWSER_LAUNCHED")
+
+
+async def warm_daemon_channel(daemon):
+    # Call within the run's budget.
+    if daemon["page"] is not None:
+        await daemon["page"].close()
+        daemon["page"] = None
+    # Validating the session reloads the channel, which is the warm-up.
+    daemon["context"], daemon["page"] = await ensure_session(daemon["browser"], daemon["context"])
+    if daemon["page"] is not None:
+        log_state("DAEMON_CHANNEL_WARM", daemon["page"].url)
+
+
+async def run_daemon_attendance(daemon, slot=None, slot_key=None, survey_ts=None, trigger="api", force=False):
+    # One run on the warm browser; call with daemon["lock"] held. Scheduled
+    # runs warm the channel up and wait for *slot*; on-demand runs reuse the
+    # page left on the channel when there is one. Returns the run report.
+    global workspace_signin_attempts, force_run
+    slot_key = slot_key or ledger_slot_key(slot, daemon["schedule"])
+    workspace_signin_attempts = 0
+    force_run = force
+    reset_lean_mode_stats()
+    reset_run_metrics()
+    log_state("RUN_STARTED", slot.isoformat(timespec="minutes") if slot else "on demand")
+    reused = slot is None and daemon["page"] is not None and not daemon["page"].is_closed()
+
+    async def warm_up():
+        await ensure_daemon_context(daemon)
+        if not reused:
+            await warm_daemon_channel(daemon)
+
+    async def attend():
+        attendance_state = None
+        if daemon["page"] is not None:
+            attendance_state = await mark_present(daemon["page"])
+        if reused and attendance_state == "SESSION_REAUTH_REQUIRED":
+            # The kept page went stale; validate (or log in) once and retry.
+            await warm_daemon_channel(daemon)
+            if daemon["page"] is not None:
+                attendance_state = await mark_present(daemon["page"])
+        return attendance_state
+
+    try:
+        # One RUN_BUDGET_S for warm-up, click and retry; the slot wait is not part of it.
+        budget_s = RUN_BUDGET_S
+        warm_started = time.monotonic()
+        await within_run_budget(warm_up(), budget_s)
+        if budget_s > 0:
+            budget_s -= time.monotonic() - warm_started
+            if budget_s <= 0:
+                raise asyncio.TimeoutError
+        if slot is not None:
+            with phase_span("daemon_slot_wait"):
+                await sleep_until(slot)
+        attendance_state = await within_run_budget(attend(), budget_s)
+    except asyncio.TimeoutError:
+        log_state("RUN_BUDGET_EXCEEDED", f"{RUN_BUDGET_S}s")
+        attendance_state = "RUN_BUDGET_EXCEEDED"
+        await reset_daemon_browser(daemon)
+    except Exception as exc:
+        logger.error("STATE=DAEMON_RUN_ERROR | %s", exc)
+        attendance_state = "DAEMON_RUN_ERROR"
+        await reset_daemon_browser(daemon)
+    log_lean_mode_report()
+    exit_code = report_attendance_state(attendance_state)
+    report = write_run_report(attendance_state, exit_code)
+    record_run_metrics(daemon["metrics"], attendance_state, exit_code)
+    record_ledger_entry(slot_key, report, "schedule" if slot else trigger, survey_ts=survey_ts)
+    daemon["last_report"] = report
+    return report
+
+
+def trigger_daemon_run(daemon, force=False):
+    # Returns (future of the run report, coalesced). Triggers arriving before
+    # the queued run starts share it; one arriving mid-run queues the next.
+    # Without *force* a slot that is already PRESENT_RECORDED is not re-run,
+    # checked again once the run holds the lock (a run ahead of it may record it).
+    def recorded_entry():
+        if force:
+            return None
+        return ledger_slot_done(ledger_slot_key(schedule_expression=daemon["schedule"]))
+
+    entry = recorded_entry()
+    if entry is not None:
+        future = asyncio.get_running_loop().create_future()
+        future.set_result({"outcome": "ALREADY_RECORDED", "ledger": entry})
+        return future, False
+    if daemon["queued"] is not None:
+        return daemon["queued"], True
+    future = asyncio.get_running_loop().create_future()
+    daemon["queued"] = future
+
+    async def run():
+        async with daemon["lock"]:
+            daemon["queued"] = None
+            try:
+                entry = recorded_entry()
+                if entry is not None:
+                    log_state("RUN_SKIPPED_ALREADY_RECORDED", f"slot={entry['slot']} at={entry['started_at']}")
+                    report = {"outcome": "ALREADY_RECORDED", "ledger": entry}
+                else:
+                    report = await run_daemon_attendance(daemon, force=force)
+            except Exception as exc:
+                report = {"outcome": "DAEMON_RUN_ERROR", "error": str(exc)}
+            future.set_result(report)
+
+    log_state("DAEMON_RUN_TRIGGERED")
+    asyncio.ensure_future(run())
+    return future, False
+
+
+async def start_control_server(daemon):
+    async def route(method, path, query, body):
+        if method == "POST" and path == "/run":
+            future, coalesced = trigger_daemon_run(daemon, force=parse_bool(query.get("force"), default=False))
+            if future.done() or parse_bool(query.get("wait"), default=False):
+                report = await asyncio.shield(future)
+                return json_response({"coalesced": coalesced, "report": report})
+            return json_response({"queued": True, "coalesced": coalesced}, status=202)
+        if method == "GET" and path == "/session":
+            health = get_session_health()
+            health["browser_warm"] = daemon["context"] is not None
+            return json_response(health)
+        if method == "GET" and path == "/report":
+            report = daemon["last_report"] or load_last_run_report()
+            if report is None:
+                return json_response({"error": "no run report yet"}, status=404)
+            return json_response(report)
+        if method == "GET" and path == "/history":
+            limit = parse_int(query.get("limit"), default=20)
+            return json_response({"runs": load_ledger()[-limit:] if limit > 0 else load_ledger()})
+        if method == "GET" and path == "/health":
+            return json_response(
+                {
+                    "ok": True,
+                    "running": daemon["lock"].locked(),
+                    "queued": daemon["queued"] is not None,
+                }
+            )
+        return text_response("not found\n", status=404)
+
+    server = await start_http_server(DAEMON_CONTROL_HOST, DAEMON_CONTROL_PORT, route)
+    log_state("DAEMON_CONTROL_STARTED", f"http://{DAEMON_CONTROL_HOST}:{DAEMON_CONTROL_PORT}")
+    return server
+
+
+async def run_daemon(schedule_expression=DAEMON_SCHEDULE):
+    global workspace_signin_attempts
+
+    # Keep one browser warm between slots and refresh the channel shortly before each.
+    schedules = parse_cron_schedule(schedule_expression)
+    log_state("DAEMON_STARTED", schedule_expression)
+    log_runtime_config()
+    check_session_expiry()
+    if not use_persistent_profile():
+        logger.warning(
+            "STATE=DAEMON_NO_PERSISTENT_PROFILE | "
+            "Set BROWSER_PROFILE_DIR so Slack keeps its cookies fresh between slots."
+        )
+
+    metrics_state = None
+    metrics_server = None
+    control_server = None
+    if METRICS_PORT or METRICS_TEXTFILE:
+        metrics_state = load_metrics_state()
+    if METRICS_PORT:
+        metrics_server = await start_metrics_server(metrics_state)
+
+    async with async_playwright() as p:
+        daemon = new_daemon_state(p, metrics_state, schedule_expression)
+        try:
+            if DAEMON_CONTROL_PORT:
+                control_server = await start_control_server(daemon)
+            while True:
+                slot = next_cron_time(schedules, datetime.now())
+                log_state("DAEMON_NEXT_SLOT", slot.isoformat(timespec="minutes"))
+                warm_at = slot - timedelta(seconds=DAEMON_WARMUP_SECONDS)
+                # Refresh the saved session on long gaps so it never ages out between slots.
+                refresh_interval = timedelta(hours=SESSION_REFRESH_INTERVAL_HOURS)
+                while refresh_interval and datetime.now() + refresh_interval < warm_at:
+                    await sleep_until(datetime.now() + refresh_interval)
+                    async with daemon["lock"]:
+                        workspace_signin_attempts = 0
+                        try:
+                            await ensure_daemon_context(daemon)
+                            await within_run_budget(refresh_session_in_context(daemon["context"]))
+                        except Exception as exc:
+                            logger.error("STATE=SESSION_REFRESH_ERROR | %s", exc)
+                            await reset_daemon_browser(daemon)
+                await sleep_until(warm_at)
+
+                async with daemon["lock"]:
+                    if skip_recorded_slot(ledger_slot_key(slot)):
+                        continue
+                    await run_daemon_attendance(daemon, slot)
+        finally:
+            if control_server is not None:
+                control_server.close()
+            if metrics_server is not None:
+                metrics_server.close()
+            if daemon["context"] is not None:
+                await close_context(daemon["browser"], daemon["context"])
+
+
+async def watch_window(daemon, window_start, window_end):
+    # Keep the channel open until *window_end* and click each new survey once.
+    slot_key = ledger_slot_key(window_start)
+    attempts = {}
+    baseline_ts = None
+    log_state("WATCH_WINDOW_OPEN", f"until {window_end.isoformat(timespec='minutes')}")
+    while datetime.now() < window_end:
+        remaining_s = (window_end - datetime.now()).total_seconds()
+        try:
+            page = daemon["page"]
+            if page is None or page.is_closed() or is_signin_url(page.url):
+                await ensure_daemon_context(daemon)
+                await within_run_budget(warm_daemon_channel(daemon))
+                page = daemon["page"]
+                if page is None:
+                    log_state("WATCH_NO_VALID_SESSION")
+                    await asyncio.sleep(min(WATCH_RECHECK_S, remaining_s))
+                    continue
+
+            observer = await install_survey_observer(page)
+            ts = await get_current_survey_ts(page)
+            if ts and baseline_ts is None:
+                # Seed from the first scan: a card posted before the window
+                # opened is an earlier survey, not the one this window waits for.
+                baseline_ts = ts if float(ts) < window_start.timestamp() else ""
+            if ts and baseline_ts and float(ts) <= float(baseline_ts):
+                daemon["answered"].add(ts)
+            if ts and ts not in daemon["answered"] and ledger_survey_done(ts):
+                daemon["answered"].add(ts)
+            if ts and ts not in daemon["answered"] and attempts.get(ts, 0) < WATCH_MAX_ATTEMPTS:
+                attempts[ts] = attempts.get(ts, 0) + 1
+                log_state("WATCH_SURVEY_DETECTED", f"ts={ts} attempt={attempts[ts]}")
+                report = await run_daemon_attendance(daemon, slot_key=slot_key, survey_ts=ts, trigger="watch")
+                if report["outcome"] in {"PRESENT_RECORDED", "SURVEY_CLOSED", "ALREADY_RECORDED"}:
+                    daemon["answered"].add(ts)
+                elif attempts[ts] < WATCH_MAX_ATTEMPTS:
+                    # Back off before retrying instead of hammering a failing click.
+                    remaining_s = (window_end - datetime.now()).total_seconds()
+                    await asyncio.sleep(max(0, min(WATCH_RETRY_S * 2 ** (attempts[ts] - 1), remaining_s)))
+                continue
+
+            # Sleep until the observers see a survey render or survey traffic.
+            await wait_for_survey_event(page, observer, min(WATCH_RECHECK_S, remaining_s) * 1000)
+        except Exception as exc:
+            logger.error("STATE=WATCH_ERROR | %s", exc)
+            await reset_daemon_browser(daemon)
+            await asyncio.sleep(min(WATCH_RECHECK_S, max(remaining_s, 0)))
+    log_state("WATCH_WINDOW_CLOSED")
+
+
+async def run_watch(schedule_expression=WATCH_SCHEDULE):
+    # Like --daemon, but instead of clicking at fixed times, watch the channel
+    # during each window and react to the survey itself.
+    schedules = parse_cron_schedule(schedule_expression)
+    window = timedelta(minutes=WATCH_WINDOW_MINUTES)
+    log_state("WATCH_STARTED", f"{schedule_expression} for {WATCH_WINDOW_MINUTES} min")
+    log_runtime_config()
+    check_session_expiry()
+
+    metrics_state = None
+    metrics_server = None
+    if METRICS_PORT or METRICS_TEXTFILE:
+        metrics_state = load_metrics_state()
+    if METRICS_PORT:
+        metrics_server = await start_metrics_server(metrics_state)
+
+    async with async_playwright() as p:
+        daemon = new_daemon_state(p, metrics_state, schedule_expression)
+        try:
+            while True:
+                # A window that is already open (e.g. after a restart) counts too.
+                start = next_cron_time(schedules, datetime.now() - window)
+                if start > datetime.now():
+                    log_state("WATCH_NEXT_WINDOW", start.isoformat(timespec="minutes"))
+                    await sleep_until(start)
+                await watch_window(daemon, start, start + window)
+                # No need to hold a browser between windows.
+                await reset_daemon_browser(daemon)
+        finally:
+            if metrics_server is not None:
+                metrics_server.close()
+            if daemon["context"] is not None:
+                await close_context(daemon["browser"], daemon["context"])
+
+
+def load_roster(path):
+    # Roster: a JSON list of accounts (or {"accounts": [...]}) with email,
+    # password or password_env, session_file, and optional workspace_domain,
+    # workspace_slug, team_id, channel_id and name.
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    accounts = data.get("accounts") if isinstance(data, dict) else data
+    if not isinstance(accounts, list) or not accounts:
+        raise ValueError("Roster must contain a non-empty list of accounts")
+
+    roster = []
+    names = set()
+    for index, entry in enumerate(accounts):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Roster entry {index + 1} is not an object")
+        account = dict(entry)
+        if account.get("password_env"):
+            account["password"] = os.getenv(account["password_env"])
+        account["name"] = str(account.get("name") or account.get("email") or f"account-{index + 1}")
+        if not account.get("session_file"):
+            raise ValueError(f"Roster account {account['name']} needs a session_file")
+        if account["name"] in names:
+            raise ValueError(f"Duplicate roster account name: {account['name']}")
+        names.add(account["name"])
+        roster.append(account)
+    return roster
+
+
+def apply_account(account):
+    # Point the module-level account/workspace settings at one roster account.
+    # Unset fields fall back to the environment, never to a previous account
+    # (pool workers run several accounts).
+    global EMAIL, PASSWORD, SESSION_FILE, BROWSER_PROFILE_DIR
+    global WORKSPACE_DOMAIN, WORKSPACE_SLUG, TEAM_ID, CHANNEL_ID
+    global workspace_signin_attempts
+
+    EMAIL = account.get("email")
+    PASSWORD = account.get("password")
+    SESSION_FILE = account["session_file"]
+    # Each account is isolated by its own session file, not a shared profile.
+    BROWSER_PROFILE_DIR = ""
+    WORKSPACE_DOMAIN = account.get("workspace_domain") or ACCOUNT_DEFAULTS["workspace_domain"]
+    if account.get("workspace_domain"):
+        WORKSPACE_SLUG = WORKSPACE_DOMAIN.split(".")[0]
+    else:
+        WORKSPACE_SLUG = ACCOUNT_DEFAULTS["workspace_slug"]
+    WORKSPACE_SLUG = (account.get("workspace_slug") or WORKSPACE_SLUG).strip()
+    TEAM_ID = account.get("team_id") or ACCOUNT_DEFAULTS["team_id"]
+    CHANNEL_ID = account.get("channel_id") or ACCOUNT_DEFAULTS["channel_id"]
+    derive_workspace_settings()
+    workspace_signin_attempts = 0
+
+
+async def run_batch_account(account, cdp_endpoint, force=False):
+    # Runs in a worker process: own Playwright driver, shared Chromium.
+    global force_run
+    apply_account(account)
+    force_run = force
+    reset_lean_mode_stats()
+    reset_run_metrics()
+    started = time.monotonic()
+    slot_key = ledger_slot_key()
+    if not force and skip_recorded_slot(slot_key):
+        return {
+            "name": account["name"],
+            "outcome": "ALREADY_RECORDED",
+            "exit_code": 0,
+            "duration_s": 0.0,
+        }
+    log_state("BATCH_ACCOUNT_STARTED", account["name"])
+    attendance_state = None
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.connect_over_cdp(cdp_endpoint, slow_mo=SLOW_MO_MS)
+            context = None
+            try:
+                context = await new_browser_context(browser, use_saved_state=True)
+                context, attendance_state = await within_run_budget(
+                    run_attendance_with_session(browser, context)
+                )
+            finally:
+                log_lean_mode_report()
+                # Closing a connected browser only disconnects this worker.
+                await close_context(browser, context)
+    except asyncio.TimeoutError:
+        log_state("RUN_BUDGET_EXCEEDED", f"{account['name']} {RUN_BUDGET_S}s")
+        attendance_state = "RUN_BUDGET_EXCEEDED"
+    except Exception as exc:
+        logger.error("STATE=BATCH_ACCOUNT_ERROR | %s | %s", account["name"], exc)
+        attendance_state = "BATCH_ACCOUNT_ERROR"
+
+    exit_code = report_attendance_state(attendance_state)
+    record_ledger_entry(slot_key, write_run_report(attendance_state, exit_code), "batch")
+    return {
+        "name": account["name"],
+        "outcome": attendance_state or "NO_VALID_SESSION",
+        "exit_code": exit_code,
+        "duration_s": round(time.monotonic() - started, 1),
+    }
+
+
+def run_batch_worker(account, cdp_endpoint, force=False):
+    # Process pool entry point; each worker runs its own event loop.
+    return asyncio.run(run_batch_account(account, cdp_endpoint, force))
+
+
+def log_batch_results(results):
+    log_state("BATCH_RESULTS", f"accounts={len(results)}")
+    name_width = max([len("ACCOUNT")] + [len(result["name"]) for result in results])
+    outcome_width = max([len("OUTCOME")] + [len(result["outcome"]) for result in results])
+    logger.info("%s | %s | EXIT | SECONDS", "ACCOUNT".ljust(name_width), "OUTCOME".ljust(outcome_width))
+    for result in results:
+        logger.info(
+            "%s | %s | %s | %s",
+            result["name"].ljust(name_width),
+            result["outcome"].ljust(outcome_width),
+            str(result["exit_code"]).ljust(4),
+            "-" if result["duration_s"] is None else result["duration_s"],
+        )
+
+
+async def run_batch(roster_path, concurrency=BATCH_CONCURRENCY, force=False):
+    # One Chromium process serves every account through isolated contexts.
+    roster = load_roster(roster_path)
+    concurrency = max(1, min(concurrency, len(roster)))
+    log_state("BATCH_STARTED", f"accounts={len(roster)} concurrency={concurrency}")
+    log_runtime_config()
+
+    loop = asyncio.get_running_loop()
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(
+            headless=HEADLESS,
+            args=[f"--remote-debugging-port={BATCH_CDP_PORT}"],
+        )
+        cdp_endpoint = f"http://127.0.0.1:{BATCH_CDP_PORT}"
+        try:
+            # Workers are reused across accounts; apply_account() resets the
+            # account globals before each one.
+            with ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as pool:
+
+                async def run_in_worker(account):
+                    try:
+                        return await loop.run_in_executor(
+                            pool,
+                            run_batch_worker,
+                            account,
+                            cdp_endpoint,
+                            force,
+                        )
+                    except Exception as exc:
+                        logger.error("STATE=BATCH_WORKER_ERROR | %s | %s", account["name"], exc)
+                        return {
+                            "name": account["name"],
+                            "outcome": "BATCH_WORKER_ERROR",
+                            "exit_code": 3,
+                            "duration_s": None,
+                        }
+
+                ordered = await asyncio.gather(
+                    *(run_in_worker(account) for account in roster)
+                )
+        finally:
+            await browser.close()
+
+    log_batch_results(ordered)
+    return max(result["exit_code"] for result in ordered)
+
+
+def find_browser_pid(cdp_port):
+    # Linux: the browser process is the oldest one carrying our debugging port.
+    if not os.path.isdir("/proc"):
+        return None
+    flag = f"--remote-debugging-port={cdp_port}".encode()
+    matches = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as file:
+                if flag in file.read().split(b"\0"):
+                    matches.append(int(entry))
+        except OSError:
+            continue
+    return min(matches) if matches else None
+
+
+def get_process_tree_rss_mb(pid):
+    # Linux: VmRSS summed over *pid* and its descendants (shared pages count
+    # more than once, so this errs on the high side). None when unavailable.
+    if not pid or not os.path.isdir("/proc"):
+        return None
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as file:
+                parent = int(file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status", encoding="utf-8") as file:
+                for line in file:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+        pending.extend(children.get(current, []))
+    return total_kb / 1024
+
+
+async def run_browser_pool(size=BROWSER_POOL_SIZE):
+    # Sidecar: keep *size* Chromium instances warm behind CDP and lease them to
+    # bot runs (BROWSER_POOL_URL). Instances are recycled after
+    # BROWSER_POOL_MAX_USES leases or above BROWSER_POOL_MAX_MEMORY_MB.
+    size = max(1, size)
+    log_state("BROWSER_POOL_STARTING", f"size={size}")
+
+    async with async_playwright() as p:
+        instances = []
+        changed = asyncio.Condition()
+
+        async def start_instance(index, generation=0):
+            port = BROWSER_POOL_CDP_BASE_PORT + index
+            browser = await p.chromium.launch(
+                headless=HEADLESS,
+                args=[f"--remote-debugging-port={port}"],
+            )
+            instance = {
+                "id": f"{index}-{generation}",
+                "index": index,
+                "generation": generation,
+                "port": port,
+                "browser": browser,
+                "pid": find_browser_pid(port),
+                "uses": 0,
+                "leased_at": None,
+                "recycling": False,
+                "started": time.time(),
+            }
+            log_state("BROWSER_POOL_INSTANCE_STARTED", f"{instance['id']} port={port}")
+            return instance
+
+        def get_recycle_reason(instance):
+            if not instance["browser"].is_connected():
+                return "disconnected"
+            if BROWSER_POOL_MAX_USES and instance["uses"] >= BROWSER_POOL_MAX_USES:
+                return f"uses={instance['uses']}"
+            rss_mb = get_process_tree_rss_mb(instance["pid"])
+            if BROWSER_POOL_MAX_MEMORY_MB and rss_mb and rss_mb > BROWSER_POOL_MAX_MEMORY_MB:
+                return f"rss={rss_mb:.0f}MB"
+            return None
+
+        async def recycle(instance, reason):
+            log_state("BROWSER_POOL_RECYCLING", f"{instance['id']} {reason}")
+            try:
+                await instance["browser"].close()
+            except Exception:
+                pass
+            fresh = await start_instance(instance["index"], instance["generation"] + 1)
+            async with changed:
+                instances[instance["index"]] = fresh
+                changed.notify_all()
+
+        def is_idle(instance):
+            return instance["leased_at"] is None and not instance["recycling"]
+
+        async def lease():
+            async with changed:
+                try:
+                    await asyncio.wait_for(
+                        changed.wait_for(lambda: any(is_idle(item) for item in instances)),
+                        timeout=60,
+                    )
+                except asyncio.TimeoutError:
+                    return json_response({"error": "no idle browser"}, status=503)
+                instance = next(item for item in instances if is_idle(item))
+                instance["leased_at"] = time.time()
+                instance["uses"] += 1
+            log_state("BROWSER_POOL_LEASED", f"{instance['id']} uses={instance['uses']}")
+            return json_response(
+                {"id": instance["id"], "cdp_url": f"http://127.0.0.1:{instance['port']}"}
+            )
+
+        async def release(lease_id, reason=None):
+            async with changed:
+                instance = next((item for item in instances if item["id"] == lease_id), None)
+                if instance is None or instance["leased_at"] is None:
+                    return json_response({"released": False})
+                instance["leased_at"] = None
+                reason = reason or get_recycle_reason(instance)
+                instance["recycling"] = bool(reason)
+                changed.notify_all()
+            log_state("BROWSER_POOL_RELEASED", lease_id)
+            if reason:
+                await recycle(instance, reason)
+            return json_response({"released": True})
+
+        async def renew(lease_id):
+            async with changed:
+                instance = next((item for item in instances if item["id"] == lease_id), None)
+                if instance is None or instance["leased_at"] is None:
+                    return json_response({"renewed": False})
+                instance["leased_at"] = time.time()
+            return json_response({"renewed": True})
+
+        def status():
+            return json_response(
+                [
+                    {
+                        "id": item["id"],
+                        "port": item["port"],
+                        "uses": item["uses"],
+                        "leased": item["leased_at"] is not None,
+                        "recycling": item["recycling"],
+                        "rss_mb": get_process_tree_rss_mb(item["pid"]),
+                        "uptime_s": round(time.time() - item["started"]),
+                    }
+                    for item in instances
+                ]
+            )
+
+        async def route(method, path, query, body):
+            if path == "/lease" and method == "POST":
+                return await lease()
+            if path == "/release" and method == "POST":
+                return await release(query.get("id"))
+            if path == "/renew" and method == "POST":
+                return await renew(query.get("id"))
+            if path in {"/", "/status"} and method == "GET":
+                return status()
+            return text_response("not found\n", status=404)
+
+        async def reap():
+            # Free leases whose bot never came back, and recycle bloated idle browsers.
+            while True:
+                await asyncio.sleep(30)
+                now = time.time()
+                for instance in list(instances):
+                    leased_at = instance["leased_at"]
+                    if leased_at and now - leased_at > BROWSER_POOL_LEASE_TIMEOUT_S:
+                        await release(instance["id"], reason="lease_timeout")
+                    elif is_idle(instance):
+                        reason = get_recycle_reason(instance)
+                        if reason:
+                            instance["recycling"] = True
+                            await recycle(instance, reason)
+
+        for index in range(size):
+            instances.append(await start_instance(index))
+        server = await start_http_server(BROWSER_POOL_HOST, BROWSER_POOL_PORT, route)
+        log_state("BROWSER_POOL_READY", f"http://{BROWSER_POOL_HOST}:{BROWSER_POOL_PORT}")
+        reaper = asyncio.ensure_future(reap())
+        try:
+            await asyncio.Event().wait()
+        finally:
+            reaper.cancel()
+            server.close()
+            for instance in instances:
+                try:
+                    await instance["browser"].close()
+                except Exception:
+                    pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mark Slack attendance as present.")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="stay running and mark attendance on a built-in schedule",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="stay running and mark attendance as soon as the survey appears in each watch window",
+    )
+    parser.add_argument(
+        "--browser-pool",
+        action="store_true",
+        help="run the sidecar that keeps warm Chromium instances for BROWSER_POOL_URL",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=BROWSER_POOL_SIZE,
+        help="warm browsers kept by --browser-pool (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--refresh-session",
+        action="store_true",
+        help="reload Slack with the saved session and re-save it, without marking attendance",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="ROSTER",
+        help="run every account in a JSON roster file in one shared browser",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=BATCH_CONCURRENCY,
+        help="accounts to run at once in --batch mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="run even if the run ledger already has PRESENT_RECORDED for the current slot or survey",
+    )
+    parser.add_argument(
+        "--history",
+        nargs="?",
+        type=int,
+        const=20,
+        metavar="N",
+        help="print the last N runs from the run ledger (default: 20; 0 for all) and exit",
+    )
+    parser.add_argument(
+        "--schedule",
+        help='cron-style slots for --daemon and the run ledger (or window starts for --watch), '
+        f'separated by ";" (default: "{DAEMON_SCHEDULE}" / "{WATCH_SCHEDULE}")',
+    )
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    # Run once and exit (no scheduler / no infinite loop)
-    run_once()
+    args = parse_args()
+    if args.history is not None:
+        print_ledger_history(args.history)
+        raise SystemExit(0)
+    if args.batch:
+        raise SystemExit(asyncio.run(run_batch(args.batch, args.concurrency, args.force)))
+    if args.browser_pool:
+        try:
+            asyncio.run(run_browser_pool(args.pool_size))
+        except KeyboardInterrupt:
+            log_state("BROWSER_POOL_STOPPED")
+    elif args.refresh_session:
+        refresh_once()
+    elif args.daemon:
+        try:
+            asyncio.run(run_daemon(args.schedule or DAEMON_SCHEDULE))
+        except KeyboardInterrupt:
+            log_state("DAEMON_STOPPED")
+    elif args.watch:
+        try:
+            asyncio.run(run_watch(args.schedule or WATCH_SCHEDULE))
+        except KeyboardInterrupt:
+            log_state("WATCH_STOPPED")
+    else:
+        # Run once and exit; schedule externally or use --daemon
+        run_once(force=args.force, schedule_expression=args.schedule)
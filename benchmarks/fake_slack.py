@@ -0,0 +1,567 @@
+"""Offline stand-in for the parts of Slack the attendance bot touches.
+
+Serves synthetic sign-in, workspace sign-in, OTP, glitch and channel pages, a
+paged conversations.history API with a Mia survey, and a blocks.actions
+endpoint that answers the vote. Point the bot at it with:
+
+    SLACK_URL_SCHEME=http
+    SLACK_APP_HOST=app.localhost:<port>
+    WORKSPACE_DOMAIN=wbs.localhost:<port>
+
+Chromium resolves every *.localhost name to the loopback address, so both
+hosts reach this one server.
+
+Run standalone for manual debugging:
+
+    python benchmarks/fake_slack.py --port 8765 --survey open --messages 200
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+DEFAULT_OPTIONS = {
+    # Session state on the first request: True behaves like a valid saved session.
+    "authenticated": True,
+    # Where an unauthenticated channel request is sent: "password" or "workspace".
+    "signin": "password",
+    "otp_code": None,
+    # Serve the "There's been a glitch" page instead of the channel.
+    "glitch": False,
+    # Channel content: message count, survey state ("open", "closed" or None)
+    # and how many messages were posted after the survey.
+    "messages": 40,
+    "survey": "open",
+    "survey_offset": 0,
+    # Messages returned per conversations.history page / rendered per batch.
+    "page_size": 40,
+    # Reply to the vote: "recorded", "closed" or "none".
+    "confirm": "recorded",
+    # Timing knobs, all in milliseconds.
+    "latency_ms": 0,
+    "render_delay_ms": 300,
+    "history_delay_ms": 300,
+    "confirm_delay_ms": 200,
+}
+
+BOT_NAME = "Mia"
+BASE_TS = 1700000000
+PROMPT_TEXT = "Please select an option"
+CONFIRMATION_TEXT = "Your selection (present) has been recorded successfully"
+CLOSED_TEXT = "The survey is now closed. Further changes to your selections will not be recorded."
+OPTIONS = ["present", "absent", "late"]
+
+
+def message_ts(index):
+    return f"{BASE_TS + index * 60}.000100"
+
+
+def permalink_ts(digits):
+    return f"{digits[:-6]}.{digits[-6:]}"
+
+
+def build_messages(options, channel):
+    # Oldest first, like the rendered list; the API pages from the end.
+    count = max(0, options["messages"])
+    survey_index = count - 1 - options["survey_offset"] if options["survey"] else None
+    messages = []
+    for index in range(count):
+        if index == survey_index:
+            blocks = [
+                {
+                    "type": "section",
+                    "block_id": "attendance_prompt",
+                    "text": {"type": "mrkdwn", "text": f"Good morning! {PROMPT_TEXT}"},
+                }
+            ]
+            if options["survey"] == "open":
+                blocks.append(
+                    {
+                        "type": "actions",
+                        "block_id": "attendance_choice",
+                        "elements": [
+                            {
+                                "type": "radio_buttons",
+                                "action_id": "attendance_radio",
+                                "options": [
+                                    {"text": {"type": "plain_text", "text": label}, "value": label}
+                                    for label in OPTIONS
+                                ],
+                            }
+                        ],
+                    }
+                )
+            else:
+                blocks.append(
+                    {
+                        "type": "section",
+                        "block_id": "attendance_closed",
+                        "text": {"type": "mrkdwn", "text": CLOSED_TEXT},
+                    }
+                )
+            messages.append(
+                {
+                    "type": "message",
+                    "channel": channel,
+                    "ts": message_ts(index),
+                    "username": BOT_NAME,
+                    "bot_profile": {"name": BOT_NAME},
+                    "blocks": blocks,
+                }
+            )
+            continue
+        messages.append(
+            {
+                "type": "message",
+                "channel": channel,
+                "ts": message_ts(index),
+                "username": f"student{index % 7}",
+                "blocks": [
+                    {
+                        "type": "section",
+                        "block_id": f"filler_{index}",
+                        "text": {"type": "mrkdwn", "text": f"Message {index}: notes from the morning session."},
+                    }
+                ],
+            }
+        )
+    return messages
+
+
+PAGE_TEMPLATE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 0; }}
+form {{ margin: 40px; display: flex; flex-direction: column; gap: 8px; width: 320px; }}
+[data-qa="message_pane"] {{ height: 600px; overflow-y: auto; border-top: 1px solid #ddd; }}
+.c-virtual_list__item {{ padding: 8px 16px; min-height: 48px; }}
+[role="radio"] {{ display: inline-block; margin-right: 12px; padding: 4px 8px; border: 1px solid #999; cursor: pointer; }}
+</style></head>
+<body>{body}</body></html>"""
+
+SIGNIN_BODY = """<form method="post" action="/sign_in_with_password">
+<h1>Sign in to the workspace</h1>
+<input type="hidden" name="redir" value="{redir}">
+<input type="email" name="email" placeholder="name@work-email.com">
+<input type="password" name="password" placeholder="Your password">
+<button type="submit" data-qa="signin_button">Sign In</button>
+</form>"""
+
+OTP_BODY = """<form method="post" action="/signin/otp">
+<h1>Check your email for a code</h1>
+<input type="hidden" name="redir" value="{redir}">
+<input name="code" autocomplete="one-time-code" inputmode="numeric">
+<button type="submit">Verify</button>
+</form>"""
+
+WORKSPACE_SIGNIN_BODY = """<form method="post" action="/workspace-signin">
+<h1>Find your workspace</h1>
+<input type="hidden" name="redir" value="{redir}">
+<input type="text" name="domain" placeholder="your-workspace.slack.com">
+<button type="submit">Continue</button>
+</form>"""
+
+GLITCH_BODY = """<h1>There's been a glitch…</h1>
+<p>We're not quite sure what went wrong. Please try again.</p>"""
+
+CHANNEL_SCRIPT = """<div id="boot">Loading…</div>
+<script>
+const CONFIG = __CONFIG__;
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+let pane = null;
+let list = null;
+let oldestTs = null;
+let hasMore = true;
+let loading = false;
+
+function renderMessage(message) {
+    const item = document.createElement("div");
+    item.className = "c-virtual_list__item";
+    item.dataset.itemKey = message.ts;
+    item.id = "message-list_" + message.ts;
+    const content = document.createElement("div");
+    content.dataset.qa = "message_content";
+    content.setAttribute("role", "document");
+    const sender = document.createElement("span");
+    sender.dataset.qa = "message_sender_name";
+    sender.textContent = message.username;
+    content.appendChild(sender);
+    for (const block of message.blocks) {
+        if (block.type === "section") {
+            const text = document.createElement("div");
+            text.className = "p-rich_text_section";
+            text.textContent = block.text.text;
+            content.appendChild(text);
+        } else if (block.type === "actions") {
+            const group = document.createElement("div");
+            group.setAttribute("role", "radiogroup");
+            group.dataset.blockId = block.block_id;
+            for (const element of block.elements) {
+                for (const option of element.options) {
+                    const radio = document.createElement("div");
+                    radio.setAttribute("role", "radio");
+                    radio.setAttribute("aria-checked", "false");
+                    radio.textContent = option.text.text;
+                    radio.addEventListener("click", () => vote(message, element, option, radio));
+                    group.appendChild(radio);
+                }
+            }
+            content.appendChild(group);
+        }
+    }
+    item.appendChild(content);
+    return item;
+}
+
+async function vote(message, element, option, radio) {
+    radio.setAttribute("aria-checked", "true");
+    const response = await fetch("/api/blocks.actions", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ ts: message.ts, action_id: element.action_id, value: option.value }),
+    });
+    const data = await response.json();
+    if (data.reply) {
+        list.appendChild(renderMessage(data.reply));
+        pane.scrollTop = pane.scrollHeight;
+    }
+}
+
+async function history(params) {
+    const query = new URLSearchParams(Object.assign({ channel: CONFIG.channel }, params));
+    const response = await fetch("/api/conversations.history?" + query.toString(), { method: "POST" });
+    return response.json();
+}
+
+async function loadOlder() {
+    if (loading || !hasMore) return;
+    loading = true;
+    await sleep(CONFIG.historyDelayMs);
+    const data = await history({ latest: oldestTs });
+    const anchor = list.firstChild;
+    const before = pane.scrollHeight;
+    for (const message of data.messages) {
+        list.insertBefore(renderMessage(message), list.firstChild);
+    }
+    if (data.messages.length) oldestTs = data.messages[data.messages.length - 1].ts;
+    hasMore = data.has_more;
+    pane.scrollTop += pane.scrollHeight - before;
+    loading = false;
+}
+
+async function boot() {
+    await sleep(CONFIG.renderDelayMs);
+    document.getElementById("boot").remove();
+    const header = document.createElement("div");
+    header.dataset.qa = "channel_header";
+    header.textContent = "# attendance";
+    document.body.appendChild(header);
+    pane = document.createElement("div");
+    pane.dataset.qa = "message_pane";
+    list = document.createElement("div");
+    list.className = "c-virtual_list__scroll_container";
+    pane.appendChild(list);
+    document.body.appendChild(pane);
+
+    const data = await history(CONFIG.focusTs ? { around: CONFIG.focusTs } : {});
+    for (const message of data.messages.slice().reverse()) {
+        list.appendChild(renderMessage(message));
+    }
+    if (data.messages.length) oldestTs = data.messages[data.messages.length - 1].ts;
+    hasMore = data.has_more;
+    const focused = CONFIG.focusTs && document.querySelector('[data-item-key="' + CONFIG.focusTs + '"]');
+    pane.scrollTop = focused ? focused.offsetTop - pane.offsetTop : pane.scrollHeight;
+    pane.addEventListener("scroll", () => {
+        if (pane.scrollTop <= 0) loadOlder();
+    });
+}
+
+boot();
+</script>"""
+
+
+class FakeSlackState:
+    def __init__(self, options):
+        self.options = dict(DEFAULT_OPTIONS)
+        self.options.update(options or {})
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.authenticated = bool(self.options["authenticated"])
+            self.requests = 0
+            self.api_calls = {}
+            self.votes = []
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "authenticated": self.authenticated,
+                "requests": self.requests,
+                "api_calls": dict(self.api_calls),
+                "votes": list(self.votes),
+            }
+
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    server_version = "FakeSlack/1.0"
+    verbose = False
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def begin(self):
+        with self.state.lock:
+            self.state.requests += 1
+        latency_ms = self.state.options["latency_ms"]
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+
+    def send_body(self, body, content_type="text/html; charset=utf-8", status=200):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_page(self, title, body):
+        self.send_body(PAGE_TEMPLATE.format(title=title, body=body))
+
+    def send_json(self, data):
+        self.send_body(json.dumps(data), content_type="application/json")
+
+    def redirect(self, location):
+        self.send_response(303)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def read_form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8") if length else ""
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw or "{}")
+        return {key: values[-1] for key, values in parse_qs(raw).items()}
+
+    def channel_from_path(self, parts):
+        # /client/<team>/<channel> or /archives/<channel>[/p<ts>]
+        if parts[0] == "client" and len(parts) >= 3:
+            return parts[2], None
+        if parts[0] == "archives" and len(parts) >= 2:
+            focus = parts[2][1:] if len(parts) >= 3 and parts[2].startswith("p") else None
+            return parts[1], permalink_ts(focus) if focus and focus.isdigit() else None
+        return None, None
+
+    def do_GET(self):
+        self.begin()
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split("/") if part]
+        redir = query.get("redir", "/")
+
+        if url.path == "/__state":
+            self.send_json(self.state.snapshot())
+        elif url.path == "/sign_in_with_password":
+            self.send_page("Sign in | Slack", SIGNIN_BODY.format(redir=redir))
+        elif url.path == "/signin/otp":
+            self.send_page("Enter code | Slack", OTP_BODY.format(redir=redir))
+        elif url.path == "/workspace-signin":
+            self.send_page("Find your workspace | Slack", WORKSPACE_SIGNIN_BODY.format(redir=redir))
+        elif url.path.startswith("/api/"):
+            self.handle_api(url.path[len("/api/"):], query)
+        elif parts and parts[0] in {"client", "archives"}:
+            self.handle_channel(parts)
+        else:
+            self.send_body("not found\n", content_type="text/plain", status=404)
+
+    def do_POST(self):
+        self.begin()
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path.startswith("/api/"):
+            query.update(self.read_form())
+            self.handle_api(url.path[len("/api/"):], query)
+            return
+
+        form = self.read_form()
+        redir = form.get("redir") or "/"
+        options = self.state.options
+        if url.path == "/sign_in_with_password":
+            if not form.get("email") or not form.get("password"):
+                self.redirect(f"/sign_in_with_password?redir={quote(redir)}")
+            elif options["otp_code"]:
+                self.redirect(f"/signin/otp?redir={quote(redir)}")
+            else:
+                self.sign_in(redir)
+        elif url.path == "/signin/otp":
+            if form.get("code", "").strip() == str(options["otp_code"]):
+                self.sign_in(redir)
+            else:
+                self.redirect(f"/signin/otp?redir={quote(redir)}")
+        elif url.path == "/workspace-signin":
+            if form.get("domain"):
+                self.sign_in(redir)
+            else:
+                self.redirect(f"/workspace-signin?redir={quote(redir)}")
+        else:
+            self.send_body("not found\n", content_type="text/plain", status=404)
+
+    def sign_in(self, redir):
+        with self.state.lock:
+            self.state.authenticated = True
+        self.redirect(redir if redir.startswith("/") else "/")
+
+    def handle_channel(self, parts):
+        options = self.state.options
+        if not self.state.authenticated:
+            target = "/workspace-signin" if options["signin"] == "workspace" else "/sign_in_with_password"
+            self.redirect(f"{target}?redir={quote(self.path)}")
+            return
+        if options["glitch"]:
+            self.send_page("Slack", GLITCH_BODY)
+            return
+        channel, focus_ts = self.channel_from_path(parts)
+        config = {
+            "channel": channel,
+            "focusTs": focus_ts,
+            "renderDelayMs": options["render_delay_ms"],
+            "historyDelayMs": options["history_delay_ms"],
+        }
+        self.send_page(
+            "attendance (Channel) - Slack",
+            CHANNEL_SCRIPT.replace("__CONFIG__", json.dumps(config)),
+        )
+
+    def handle_api(self, method, params):
+        with self.state.lock:
+            self.state.api_calls[method] = self.state.api_calls.get(method, 0) + 1
+        if not self.state.authenticated:
+            self.send_json({"ok": False, "error": "not_authed"})
+        elif method == "conversations.history":
+            self.send_json(self.conversations_history(params))
+        elif method == "blocks.actions":
+            self.send_json(self.blocks_actions(params))
+        else:
+            self.send_json({"ok": False, "error": "unknown_method"})
+
+    def conversations_history(self, params):
+        # Newest first, page_size at a time, older than *latest* or centred on *around*.
+        options = self.state.options
+        messages = build_messages(options, params.get("channel"))
+        page_size = max(1, options["page_size"])
+        end = len(messages)
+        if params.get("latest"):
+            end = sum(1 for message in messages if float(message["ts"]) < float(params["latest"]))
+        elif params.get("around"):
+            index = next(
+                (i for i, message in enumerate(messages) if message["ts"] == params["around"]),
+                len(messages) - 1,
+            )
+            end = min(len(messages), index + page_size // 2 + 1)
+        start = max(0, end - page_size)
+        return {
+            "ok": True,
+            "messages": list(reversed(messages[start:end])),
+            "has_more": start > 0,
+        }
+
+    def blocks_actions(self, params):
+        options = self.state.options
+        with self.state.lock:
+            self.state.votes.append({"ts": params.get("ts"), "value": params.get("value")})
+        time.sleep(options["confirm_delay_ms"] / 1000)
+        replies = {"recorded": CONFIRMATION_TEXT, "closed": CLOSED_TEXT}
+        text = replies.get(options["confirm"])
+        if not text:
+            return {"ok": True, "reply": None}
+        return {
+            "ok": True,
+            "reply": {
+                "ts": f"{time.time():.6f}",
+                "username": BOT_NAME,
+                "blocks": [{"type": "section", "block_id": "reply", "text": {"type": "mrkdwn", "text": text}}],
+            },
+        }
+
+
+def start_server(options=None, host="127.0.0.1", port=0, verbose=False):
+    # Serve in a daemon thread; returns the server (server.server_port, .state).
+    handler = type("Handler", (FakeSlackHandler,), {"verbose": verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = FakeSlackState(options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def bot_environment(server, slug="wbs"):
+    # Environment overrides that point attendance_bot.py at *server*.
+    port = server.server_port
+    return {
+        "SLACK_URL_SCHEME": "http",
+        "SLACK_APP_HOST": f"app.localhost:{port}",
+        "WORKSPACE_DOMAIN": f"{slug}.localhost:{port}",
+        "WORKSPACE_SLUG": slug,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve an offline Slack stand-in.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unauthenticated", action="store_true", help="require a sign-in first")
+    parser.add_argument("--signin", choices=["password", "workspace"], default="password")
+    parser.add_argument("--otp-code", help="ask for this code after the password form")
+    parser.add_argument("--glitch", action="store_true")
+    parser.add_argument("--messages", type=int, default=DEFAULT_OPTIONS["messages"])
+    parser.add_argument("--survey", choices=["open", "closed", "none"], default="open")
+    parser.add_argument("--survey-offset", type=int, default=0)
+    parser.add_argument("--page-size", type=int, default=DEFAULT_OPTIONS["page_size"])
+    parser.add_argument("--confirm", choices=["recorded", "closed", "none"], default="recorded")
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--render-delay-ms", type=int, default=DEFAULT_OPTIONS["render_delay_ms"])
+    parser.add_argument("--history-delay-ms", type=int, default=DEFAULT_OPTIONS["history_delay_ms"])
+    parser.add_argument("--confirm-delay-ms", type=int, default=DEFAULT_OPTIONS["confirm_delay_ms"])
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = start_server(
+        {
+            "authenticated": not args.unauthenticated,
+            "signin": args.signin,
+            "otp_code": args.otp_code,
+            "glitch": args.glitch,
+            "messages": args.messages,
+            "survey": None if args.survey == "none" else args.survey,
+            "survey_offset": args.survey_offset,
+            "page_size": args.page_size,
+            "confirm": args.confirm,
+            "latency_ms": args.latency_ms,
+            "render_delay_ms": args.render_delay_ms,
+            "history_delay_ms": args.history_delay_ms,
+            "confirm_delay_ms": args.confirm_delay_ms,
+        },
+        port=args.port,
+        verbose=args.verbose,
+    )
+    print(f"Fake Slack listening on http://127.0.0.1:{server.server_port}")
+    for key, value in bot_environment(server).items():
+        print(f"{key}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,296 @@
+"""End-to-end benchmarks of attendance_bot.py against the offline fake Slack.
+
+Each scenario starts benchmarks/fake_slack.py with its own options, runs the
+bot once per repeat in a fresh subprocess (headless, isolated SESSION_FILE),
+and reads the JSON run report for latency, browser round trips and outcome.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --scenario survey_open --scenario login --repeat 5
+
+Results are printed as a table and appended to benchmarks/results.jsonl so
+runs can be compared over time.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from fake_slack import bot_environment, start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT = os.path.join(ROOT, "attendance_bot.py")
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results.jsonl")
+RUN_TIMEOUT_S = 300
+OTP_CODE = "424242"
+
+# name -> server options, extra bot environment, expected outcome
+SCENARIOS = {
+    "survey_open": {
+        "server": {},
+        "expected": "PRESENT_RECORDED",
+    },
+    "survey_deep": {
+        "server": {"messages": 400, "survey_offset": 150, "page_size": 40},
+        "expected": "PRESENT_RECORDED",
+    },
+    "slow_render": {
+        "server": {"latency_ms": 150, "render_delay_ms": 4000, "history_delay_ms": 1500},
+        "expected": "PRESENT_RECORDED",
+    },
+    "survey_closed": {
+        "server": {"survey": "closed"},
+        "expected": "SURVEY_CLOSED",
+    },
+    "no_survey": {
+        "server": {"survey": None},
+        "env": {"FIND_PRESENT_TIMEOUT_S": "10"},
+        "expected": "PRESENT_OPTION_NOT_FOUND",
+    },
+    "closed_after_click": {
+        "server": {"confirm": "closed"},
+        "expected": "SURVEY_CLOSED",
+    },
+    "no_confirmation": {
+        "server": {"confirm": "none"},
+        "expected": "NO_CONFIRMATION_AFTER_CLICK",
+    },
+    "glitch": {
+        "server": {"glitch": True},
+        "expected": "NO_VALID_SESSION",
+    },
+    "workspace_signin": {
+        "server": {"authenticated": False, "signin": "workspace"},
+        "expected": "PRESENT_RECORDED",
+    },
+    "login": {
+        "server": {"authenticated": False},
+        "session": False,
+        "env": {"ALLOW_INTERACTIVE_LOGIN": "true"},
+        "expected": "PRESENT_RECORDED",
+    },
+    "login_otp": {
+        "server": {"authenticated": False, "otp_code": OTP_CODE},
+        "session": False,
+        "env": {"ALLOW_INTERACTIVE_LOGIN": "true"},
+        "otp": True,
+        "expected": "PRESENT_RECORDED",
+    },
+}
+
+
+def bot_env(server, workdir, scenario, headed=False, lean=False):
+    env = dict(os.environ)
+    # Explicit values (even empty ones) also keep a developer's .env out of the run.
+    env.update(
+        {
+            "SLACK_EMAIL": "bench@example.com",
+            "SLACK_PASSWORD": "bench-password",
+            "SESSION_FILE": os.path.join(workdir, "session.json"),
+            "RUN_REPORT": "true",
+            "RUN_REPORT_FILE": os.path.join(workdir, "run_report.json"),
+            "BROWSER_PROFILE_DIR": "",
+            "HEADLESS": "false" if headed else "true",
+            "ALLOW_INTERACTIVE_LOGIN": "false",
+            "KEEP_BROWSER_OPEN_SECONDS": "0",
+            "LEAN_MODE": "true" if lean else "false",
+            "LOG_FILE": "",
+            "METRICS_TEXTFILE": "",
+            "METRICS_PORT": "0",
+        }
+    )
+    env.update(bot_environment(server))
+    env.update(scenario.get("env") or {})
+    return env
+
+
+def run_bot(env, workdir, otp=False):
+    # One bot process; stdin is a pty for OTP scenarios so the code prompt works.
+    log_path = os.path.join(workdir, "bot.log")
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        if not otp:
+            completed = subprocess.run(
+                [sys.executable, BOT],
+                cwd=workdir,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                timeout=RUN_TIMEOUT_S,
+            )
+            return completed.returncode, log_path
+
+        import pty
+
+        master, slave = pty.openpty()
+        try:
+            process = subprocess.Popen(
+                [sys.executable, BOT],
+                cwd=workdir,
+                env=env,
+                stdin=slave,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+            )
+            os.write(master, f"{OTP_CODE}\n".encode())
+            return process.wait(timeout=RUN_TIMEOUT_S), log_path
+        finally:
+            os.close(slave)
+            os.close(master)
+
+
+def run_scenario(name, scenario, repeat, headed=False, lean=False):
+    runs = []
+    for attempt in range(repeat):
+        server = start_server(scenario["server"])
+        try:
+            with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+                if scenario.get("session", True):
+                    with open(os.path.join(workdir, "session.json"), "w", encoding="utf-8") as file:
+                        json.dump({"cookies": [], "origins": []}, file)
+                env = bot_env(server, workdir, scenario, headed=headed, lean=lean)
+                started = time.monotonic()
+                try:
+                    exit_code, log_path = run_bot(env, workdir, otp=scenario.get("otp", False))
+                except subprocess.TimeoutExpired:
+                    exit_code, log_path = None, None
+                wall_ms = round((time.monotonic() - started) * 1000, 1)
+
+                report = {}
+                report_path = env["RUN_REPORT_FILE"]
+                if os.path.exists(report_path):
+                    with open(report_path, encoding="utf-8") as file:
+                        report = json.load(file)
+                outcome = report.get("outcome") or ("TIMEOUT" if exit_code is None else "NO_REPORT")
+                run = {
+                    "attempt": attempt + 1,
+                    "outcome": outcome,
+                    "ok": outcome == scenario["expected"],
+                    "exit_code": exit_code,
+                    "run_ms": report.get("duration_ms"),
+                    "wall_ms": wall_ms,
+                    "round_trips": report.get("round_trips"),
+                    "milestones": report.get("milestones") or {},
+                    "strategies": report.get("strategies") or {},
+                    "server": server.state.snapshot(),
+                }
+                if not run["ok"] and log_path and os.path.exists(log_path):
+                    with open(log_path, encoding="utf-8") as file:
+                        run["log_tail"] = file.read().splitlines()[-15:]
+                runs.append(run)
+        finally:
+            server.shutdown()
+            server.server_close()
+    return runs
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile; fine for the handful of repeats we run.
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(name, scenario, runs):
+    timings = [run["run_ms"] for run in runs if run["run_ms"] is not None]
+    round_trips = [run["round_trips"] for run in runs if run["round_trips"] is not None]
+    return {
+        "scenario": name,
+        "expected": scenario["expected"],
+        "runs": len(runs),
+        "ok": sum(run["ok"] for run in runs),
+        "median_ms": statistics.median(timings) if timings else None,
+        "p95_ms": percentile(timings, 0.95) if timings else None,
+        "min_ms": min(timings) if timings else None,
+        "median_round_trips": statistics.median(round_trips) if round_trips else None,
+    }
+
+
+def print_table(summaries):
+    columns = ["scenario", "ok", "median_ms", "p95_ms", "min_ms", "median_round_trips"]
+    rows = [
+        [
+            summary["scenario"],
+            f"{summary['ok']}/{summary['runs']}",
+            *("-" if summary[key] is None else f"{summary[key]:.0f}" for key in columns[2:]),
+        ]
+        for summary in summaries
+    ]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print(" | ".join(column.ljust(widths[i]) for i, column in enumerate(columns)))
+    print("-+-".join("-" * width for width in widths))
+    for row in rows:
+        print(" | ".join(value.ljust(widths[i]) for i, value in enumerate(row)))
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bot against the offline fake Slack.")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run (repeatable; default: all)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario (default: %(default)s)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help='JSON lines file to append to, or "-" for none')
+    parser.add_argument("--headed", action="store_true", help="show the browser")
+    parser.add_argument("--lean", action="store_true", help="run the bot with LEAN_MODE=true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.scenario or list(SCENARIOS)
+    if os.name != "posix" and "login_otp" in names:
+        # The OTP prompt needs a pty for stdin.
+        names.remove("login_otp")
+
+    summaries = []
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "lean": args.lean,
+        "scenarios": {},
+    }
+    for name in names:
+        scenario = SCENARIOS[name]
+        print(f"Running {name} x{args.repeat} ...", flush=True)
+        runs = run_scenario(name, scenario, max(1, args.repeat), headed=args.headed, lean=args.lean)
+        summary = summarize(name, scenario, runs)
+        summaries.append(summary)
+        record["scenarios"][name] = {"summary": summary, "runs": runs}
+        for run in runs:
+            if not run["ok"]:
+                print(f"  attempt {run['attempt']}: expected {scenario['expected']}, got {run['outcome']}")
+                for line in run.get("log_tail", []):
+                    print(f"    {line}")
+
+    print()
+    print_table(summaries)
+    if args.output != "-":
+        with open(args.output, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record) + "\n")
+        print(f"\nResults appended to {args.output}")
+    return 0 if all(summary["ok"] == summary["runs"] for summary in summaries) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
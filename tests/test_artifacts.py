@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import attendance_bot as bot
+
+
+@pytest.fixture
+def artifacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "ARTIFACT_MAX_BUNDLES", 3)
+    monkeypatch.setattr(bot, "ARTIFACT_MAX_MB", 50)
+    return tmp_path
+
+
+def bundle_path(directory, index):
+    return os.path.join(directory, f"20261019-090500-{index:06d}_present_option_not_found.tar.gz")
+
+
+def test_keeps_newest_bundles(artifacts):
+    for index in range(5):
+        bot.write_artifact_bundle(bundle_path(artifacts, index), {"meta.json": b"{}"})
+    assert sorted(os.listdir(artifacts)) == [os.path.basename(bundle_path(artifacts, i)) for i in (2, 3, 4)]
+
+
+def test_size_limit_keeps_the_newest(artifacts, monkeypatch):
+    monkeypatch.setattr(bot, "ARTIFACT_MAX_MB", 0)
+    for index in range(2):
+        bot.write_artifact_bundle(bundle_path(artifacts, index), {"meta.json": b"{}"})
+    assert os.listdir(artifacts) == [os.path.basename(bundle_path(artifacts, 1))]
+
+
+def test_bundle_removed_during_rotation(artifacts, monkeypatch):
+    for index in range(5):
+        open(bundle_path(artifacts, index), "wb").close()
+    real_remove = os.remove
+
+    def remove_twice(path):
+        # Another process rotated the same bundle first.
+        real_remove(path)
+        real_remove(path)
+
+    monkeypatch.setattr(bot.os, "remove", remove_twice)
+    bot.rotate_artifacts(str(artifacts))
+    assert len(os.listdir(artifacts)) == 3
+
+
+def test_concurrent_writers(artifacts):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        sizes = list(
+            pool.map(
+                lambda index: bot.write_artifact_bundle(bundle_path(artifacts, index), {"meta.json": b"{}"}),
+                range(24),
+            )
+        )
+    assert all(size > 0 for size in sizes)
+    assert len(os.listdir(artifacts)) == 3
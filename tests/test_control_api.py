@@ -0,0 +1,180 @@
+import asyncio
+import http.client
+import json
+import socket
+
+import pytest
+
+import attendance_bot as bot
+
+SCHEDULE = "5 9,14 * * 1-5"
+
+
+@pytest.fixture
+def daemon_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "SESSION_FILE", str(tmp_path / "slack_auth.json"))
+    monkeypatch.setattr(bot, "LEDGER_FILE", "")
+    monkeypatch.setattr(bot, "LEDGER", True)
+    monkeypatch.setattr(bot, "LEDGER_SLOT_WINDOW_MINUTES", 60)
+    monkeypatch.setattr(bot, "EMAIL", "me@example.com")
+    monkeypatch.setattr(bot, "DAEMON_CONTROL_HOST", "127.0.0.1")
+    monkeypatch.setattr(bot, "DAEMON_CONTROL_PORT", 0)
+    runs = []
+
+    async def fake_run(daemon, force=False, **kwargs):
+        # Stands in for the browser run; a test can hold it open with "release".
+        runs.append({"force": force})
+        release = daemon.get("release")
+        if release is not None:
+            await release.wait()
+        report = {"outcome": "PRESENT_RECORDED", "run": len(runs)}
+        daemon["last_report"] = report
+        return report
+
+    monkeypatch.setattr(bot, "run_daemon_attendance", fake_run)
+    return runs
+
+
+def request(port, method, path):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request(method, path)
+        response = connection.getresponse()
+        return response.status, response.getheader("Content-Type"), response.read().decode("utf-8")
+    finally:
+        connection.close()
+
+
+def serve(test):
+    # Run *test(daemon, call)* against a control server on an ephemeral port;
+    # *call* issues a blocking stdlib request off the event loop.
+    async def main():
+        daemon = bot.new_daemon_state(None, None, SCHEDULE)
+        server = await bot.start_control_server(daemon)
+        port = server.sockets[0].getsockname()[1]
+
+        async def call(method, path):
+            status, content_type, text = await asyncio.to_thread(request, port, method, path)
+            data = json.loads(text) if content_type == "application/json" else text
+            return status, data
+
+        try:
+            return await test(daemon, call)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    return asyncio.run(main())
+
+
+async def wait_until(predicate):
+    for _ in range(200):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_health_and_routing(daemon_env):
+    async def test(daemon, call):
+        assert await call("GET", "/health") == (200, {"ok": True, "running": False, "queued": False})
+        assert (await call("GET", "/health/"))[0] == 200
+        assert await call("GET", "/missing") == (404, "not found\n")
+        assert (await call("DELETE", "/run"))[0] == 404
+
+    serve(test)
+
+
+def test_malformed_request_line(daemon_env):
+    async def main():
+        daemon = bot.new_daemon_state(None, None, SCHEDULE)
+        server = await bot.start_control_server(daemon)
+        port = server.sockets[0].getsockname()[1]
+
+        def send_raw():
+            with socket.create_connection(("127.0.0.1", port), timeout=5) as client:
+                client.sendall(b"GARBAGE\r\n\r\n")
+                return client.recv(4096).decode("latin-1")
+
+        try:
+            return await asyncio.to_thread(send_raw)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    assert asyncio.run(main()).startswith("HTTP/1.0 400 Bad Request")
+
+
+def test_report_before_any_run(daemon_env):
+    async def test(daemon, call):
+        assert await call("GET", "/report") == (404, {"error": "no run report yet"})
+
+    serve(test)
+
+
+def test_run_queues_and_reports(daemon_env):
+    async def test(daemon, call):
+        status, data = await call("POST", "/run")
+        assert (status, data) == (202, {"queued": True, "coalesced": False})
+        await wait_until(lambda: daemon["last_report"] is not None)
+        assert await call("GET", "/report") == (200, {"outcome": "PRESENT_RECORDED", "run": 1})
+
+    serve(test)
+    assert daemon_env == [{"force": False}]
+
+
+def test_triggers_before_the_run_starts_are_coalesced(daemon_env):
+    async def test(daemon, call):
+        await daemon["lock"].acquire()
+        try:
+            first = await call("POST", "/run")
+            second = await call("POST", "/run")
+            assert (await call("GET", "/health"))[1]["queued"] is True
+        finally:
+            daemon["lock"].release()
+        await wait_until(lambda: daemon["last_report"] is not None)
+        return first, second
+
+    first, second = serve(test)
+    assert first == (202, {"queued": True, "coalesced": False})
+    assert second == (202, {"queued": True, "coalesced": True})
+    assert len(daemon_env) == 1
+
+
+def test_wait_during_a_run_gets_the_follow_up_run(daemon_env):
+    async def test(daemon, call):
+        daemon["release"] = asyncio.Event()
+        assert (await call("POST", "/run"))[0] == 202
+        await wait_until(lambda: len(daemon_env) == 1)
+        waiting = asyncio.ensure_future(call("POST", "/run?wait=1"))
+        await wait_until(lambda: daemon["queued"] is not None)
+        assert not waiting.done()
+        assert (await call("GET", "/health"))[1] == {"ok": True, "running": True, "queued": True}
+        daemon["release"].set()
+        return await waiting
+
+    assert serve(test) == (200, {"coalesced": False, "report": {"outcome": "PRESENT_RECORDED", "run": 2}})
+    assert len(daemon_env) == 2
+
+
+def test_recorded_slot_is_not_rerun_unless_forced(daemon_env, monkeypatch):
+    monkeypatch.setattr(bot, "ledger_slot_key", lambda *args, **kwargs: "2026-10-19T09:05")
+    bot.record_ledger_entry(
+        "2026-10-19T09:05",
+        {"outcome": "PRESENT_RECORDED", "exit_code": 0, "started_at": "2026-10-19T09:05:01", "duration_ms": 1200},
+        "schedule",
+    )
+
+    async def test(daemon, call):
+        skipped = await call("POST", "/run")
+        forced = await call("POST", "/run?force=1&wait=1")
+        history = await call("GET", "/history?limit=1")
+        return skipped, forced, history
+
+    skipped, forced, history = serve(test)
+    assert skipped[0] == 200
+    assert skipped[1]["report"]["outcome"] == "ALREADY_RECORDED"
+    assert skipped[1]["report"]["ledger"]["slot"] == "2026-10-19T09:05"
+    assert forced == (200, {"coalesced": False, "report": {"outcome": "PRESENT_RECORDED", "run": 1}})
+    assert daemon_env == [{"force": True}]
+    assert len(history[1]["runs"]) == 1
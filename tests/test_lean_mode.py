@@ -0,0 +1,45 @@
+import pytest
+
+import attendance_bot as bot
+
+
+@pytest.fixture
+def lean(monkeypatch):
+    monkeypatch.setattr(bot, "LEAN_BLOCK_RESOURCE_TYPES", {"image", "media", "font"})
+    monkeypatch.setattr(bot, "LEAN_BLOCK_HOSTS", ["slackb.com", "*.slackb.com", "*.sentry.io"])
+    monkeypatch.setattr(bot, "LEAN_ALLOW_URLS", [])
+    bot.reset_lean_mode_stats()
+
+
+@pytest.mark.parametrize(
+    "url, resource_type, expected",
+    [
+        ("https://a.slack-edge.com/avatar.png", "image", "image"),
+        ("https://a.slack-edge.com/font.woff2", "font", "font"),
+        ("https://files.slack.com/clip.mp4", "media", "media"),
+        ("https://slackb.com/beacon", "fetch", "telemetry"),
+        ("https://o1.ingest.sentry.io/api/1/envelope/", "xhr", "telemetry"),
+        ("https://SLACKB.COM/beacon", "fetch", "telemetry"),
+        ("https://app.slack.com/api/conversations.history", "fetch", None),
+        ("https://app.slack.com/client/T1/C1", "document", None),
+        ("https://a.slack-edge.com/app.js", "script", None),
+        ("https://notslackb.com/x", "fetch", None),
+    ],
+)
+def test_block_reason(lean, url, resource_type, expected):
+    assert bot.get_lean_block_reason(url, resource_type) == expected
+
+
+def test_allow_list_wins(lean, monkeypatch):
+    monkeypatch.setattr(bot, "LEAN_ALLOW_URLS", ["*/emoji/*"])
+    assert bot.get_lean_block_reason("https://emoji.slack-edge.com/T1/emoji/party.png", "image") is None
+    assert bot.get_lean_block_reason("https://a.slack-edge.com/avatar.png", "image") == "image"
+
+
+def test_bytes_saved_estimate(lean, monkeypatch):
+    monkeypatch.setattr(bot, "LEAN_TYPICAL_BYTES", {"image": 20_000, "telemetry": 2_000})
+    monkeypatch.setattr(bot, "LEAN_TYPICAL_BYTES_DEFAULT", 1_000)
+    bot.lean_mode_stats["blocked_by_type"].update({"image": 3, "telemetry": 2, "font": 1})
+    # Images loaded this run average 5 kB, which wins over the typical size.
+    bot.lean_mode_stats["allowed_by_type"]["image"] = (2, 10_000)
+    assert bot.estimate_lean_bytes_saved() == {"image": 15_000, "telemetry": 4_000, "font": 1_000}
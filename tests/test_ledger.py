@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+import attendance_bot as bot
+
+SCHEDULE = "5 9,14 * * 1-5"
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "SESSION_FILE", str(tmp_path / "slack_auth.json"))
+    monkeypatch.setattr(bot, "LEDGER_FILE", "")
+    monkeypatch.setattr(bot, "LEDGER", True)
+    monkeypatch.setattr(bot, "LEDGER_SLOT_WINDOW_MINUTES", 60)
+    monkeypatch.setattr(bot, "EMAIL", "me@example.com")
+    return tmp_path
+
+
+def report(outcome, survey_ts=None):
+    return {
+        "outcome": outcome,
+        "exit_code": 0,
+        "started_at": "2026-10-19T09:05:01",
+        "duration_ms": 1200,
+        "survey_ts": survey_ts,
+    }
+
+
+@pytest.mark.parametrize(
+    "now, expected",
+    [
+        (datetime(2026, 10, 19, 9, 5), "2026-10-19T09:05"),
+        (datetime(2026, 10, 19, 9, 20, 30), "2026-10-19T09:05"),
+        (datetime(2026, 10, 19, 10, 5), "2026-10-19T09:05"),
+        (datetime(2026, 10, 19, 14, 30), "2026-10-19T14:05"),
+    ],
+)
+def test_slot_key_within_window(ledger, now, expected):
+    assert bot.ledger_slot_key(schedule_expression=SCHEDULE, now=now) == expected
+
+
+@pytest.mark.parametrize(
+    "now",
+    [
+        datetime(2026, 10, 19, 9, 0),  # Monday, before the first slot
+        datetime(2026, 10, 19, 13, 0),  # hours after the morning slot
+        datetime(2026, 10, 19, 10, 6),  # just past the window
+        datetime(2026, 10, 18, 12, 0),  # Sunday
+    ],
+)
+def test_slot_key_outside_window(ledger, now):
+    assert bot.ledger_slot_key(schedule_expression=SCHEDULE, now=now) is None
+
+
+def test_slot_key_uses_given_schedule(ledger):
+    now = datetime(2026, 10, 19, 9, 2)
+    assert bot.ledger_slot_key(schedule_expression=SCHEDULE, now=now) is None
+    assert bot.ledger_slot_key(schedule_expression="0 9 * * 1-5", now=now) == "2026-10-19T09:00"
+
+
+def test_slot_key_for_explicit_slot(ledger):
+    assert bot.ledger_slot_key(datetime(2026, 10, 19, 14, 5)) == "2026-10-19T14:05"
+
+
+def test_slot_key_invalid_schedule(ledger):
+    assert bot.ledger_slot_key(schedule_expression="not a cron", now=datetime(2026, 10, 19, 9, 5)) is None
+
+
+def test_recorded_slot_is_skipped(ledger):
+    bot.record_ledger_entry("2026-10-19T09:05", report("PRESENT_RECORDED", "1760000000.1"), "once")
+    assert bot.skip_recorded_slot("2026-10-19T09:05")
+    assert not bot.skip_recorded_slot("2026-10-19T14:05")
+    assert not bot.skip_recorded_slot(None)
+
+
+def test_failed_slot_is_not_skipped(ledger):
+    bot.record_ledger_entry("2026-10-19T09:05", report("PRESENT_OPTION_NOT_FOUND"), "once")
+    assert not bot.skip_recorded_slot("2026-10-19T09:05")
+
+
+def test_survey_done_per_account(ledger, monkeypatch):
+    bot.record_ledger_entry(None, report("PRESENT_RECORDED", "1760000000.1"), "once")
+    assert bot.ledger_survey_done("1760000000.1")["slot"] is None
+    assert bot.ledger_survey_done("1760000000.2") is None
+    assert bot.ledger_survey_done(None) is None
+    monkeypatch.setattr(bot, "EMAIL", "other@example.com")
+    assert bot.ledger_survey_done("1760000000.1") is None
+
+
+def test_closed_survey_is_not_recorded_present(ledger):
+    bot.record_ledger_entry(None, report("SURVEY_CLOSED", "1760000000.1"), "once")
+    assert bot.ledger_survey_done("1760000000.1")
+    assert bot.ledger_survey_done("1760000000.1", ("PRESENT_RECORDED",)) is None
+
+
+def test_ledger_disabled(ledger, monkeypatch):
+    monkeypatch.setattr(bot, "LEDGER", False)
+    bot.record_ledger_entry("2026-10-19T09:05", report("PRESENT_RECORDED", "1"), "once")
+    assert bot.load_ledger() == []
+    assert not bot.skip_recorded_slot("2026-10-19T09:05")
+
+
+def test_concurrent_writers_keep_every_entry(ledger):
+    # Each writer stands in for another process sharing the ledger.
+    def write(index):
+        bot.record_ledger_entry(None, report("PRESENT_RECORDED", f"1760000000.{index}"), "batch")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(40)))
+    assert sorted(entry["survey_ts"] for entry in bot.load_ledger()) == sorted(
+        f"1760000000.{index}" for index in range(40)
+    )
+    assert not [name for name in os.listdir(ledger) if name.endswith(".tmp")]
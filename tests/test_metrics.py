@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import attendance_bot as bot
+
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "SESSION_FILE", str(tmp_path / "slack_auth.json"))
+    monkeypatch.setattr(bot, "METRICS_TEXTFILE", str(tmp_path / "attendance.prom"))
+    bot.reset_run_metrics()
+    return tmp_path
+
+
+def sample_lines(text):
+    return [line for line in text.splitlines() if not line.startswith("#")]
+
+
+def test_empty_state(metrics):
+    text = bot.render_metrics(bot.new_metrics_state())
+    assert text.endswith("\n")
+    assert "# TYPE attendance_runs_total counter" in text
+    assert "attendance_last_run_timestamp_seconds" not in text
+    assert "attendance_session_age_seconds" not in text
+    assert 'attendance_run_duration_seconds_bucket{le="+Inf"} 0' in text
+
+
+def test_histogram_buckets_are_cumulative(metrics):
+    state = bot.new_metrics_state()
+    for value in (0.5, 3, 200):
+        bot.observe_histogram(state["histograms"]["confirmation"], value)
+    lines = sample_lines(bot.render_metrics(state))
+    assert 'attendance_confirmation_seconds_bucket{le="1"} 1' in lines
+    assert 'attendance_confirmation_seconds_bucket{le="5"} 2' in lines
+    assert 'attendance_confirmation_seconds_bucket{le="180"} 2' in lines
+    assert 'attendance_confirmation_seconds_bucket{le="+Inf"} 3' in lines
+    assert "attendance_confirmation_seconds_sum 203.5" in lines
+    assert "attendance_confirmation_seconds_count 3" in lines
+
+
+def test_observed_run(metrics):
+    state = bot.new_metrics_state()
+    bot.run_metrics["milestones"].update({"attempt_started": 1000.0, "present_found": 3500.0, "confirmed": 4000.0})
+    bot.observe_run(state, "PRESENT_RECORDED", 0)
+    bot.observe_run(state, None, 2)
+    lines = sample_lines(bot.render_metrics(state))
+    assert 'attendance_runs_total{outcome="NO_VALID_SESSION"} 1' in lines
+    assert 'attendance_runs_total{outcome="PRESENT_RECORDED"} 1' in lines
+    assert 'attendance_present_found_seconds_bucket{le="2.5"} 2' in lines
+    assert "attendance_present_found_seconds_count 2" in lines
+    assert "attendance_channel_ready_seconds_count 0" in lines
+    assert 'attendance_last_run_exit_code{outcome="NO_VALID_SESSION"} 2' in lines
+
+
+def test_label_escaping(metrics):
+    state = bot.new_metrics_state()
+    state["runs"]['odd "outcome"\\\n'] = 1
+    assert 'attendance_runs_total{outcome="odd \\"outcome\\"\\\\\\n"} 1' in bot.render_metrics(state)
+
+
+def test_session_gauges(metrics):
+    (metrics / "slack_auth.json").write_text(
+        json.dumps({"cookies": [{"name": "d", "domain": ".slack.com", "expires": 1900000000}]}),
+        encoding="utf-8",
+    )
+    text = bot.render_metrics(bot.new_metrics_state())
+    assert "attendance_session_age_seconds " in text
+    assert "attendance_session_expiry_timestamp_seconds 1900000000" in text
+
+
+def test_textfile_state_survives_restart(metrics):
+    state = bot.new_metrics_state()
+    bot.record_run_metrics(state, "PRESENT_RECORDED", 0)
+    assert (metrics / "attendance.prom").read_text(encoding="utf-8") == bot.render_metrics(state)
+
+    reloaded = bot.load_metrics_state()
+    assert reloaded["runs"] == {"PRESENT_RECORDED": 1}
+    assert reloaded["histograms"]["run_duration"]["count"] == 1
+    assert reloaded["last_run"]["outcome"] == "PRESENT_RECORDED"
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+import attendance_bot as bot
+
+
+@pytest.mark.parametrize(
+    "field, low, high, expected",
+    [
+        ("*", 0, 6, {0, 1, 2, 3, 4, 5, 6}),
+        ("5", 0, 59, {5}),
+        ("1-5", 0, 7, {1, 2, 3, 4, 5}),
+        ("9,14", 0, 23, {9, 14}),
+        ("*/15", 0, 59, {0, 15, 30, 45}),
+        ("10-20/5", 0, 59, {10, 15, 20}),
+        ("50/5", 0, 59, {50, 55}),
+        (" 1 , 3 ", 1, 12, {1, 3}),
+    ],
+)
+def test_parse_cron_field(field, low, high, expected):
+    assert bot.parse_cron_field(field, low, high) == expected
+
+
+@pytest.mark.parametrize("field", ["60", "5-1", "*/0", "x", "1-"])
+def test_parse_cron_field_rejects(field):
+    with pytest.raises(ValueError):
+        bot.parse_cron_field(field, 0, 59)
+
+
+def test_parse_cron_schedule_sunday_and_restrictions():
+    (schedule,) = bot.parse_cron_schedule("0 9 * * 7")
+    assert schedule["weekdays"] == {0}
+    assert not schedule["days_restricted"]
+    assert schedule["weekdays_restricted"]
+
+
+@pytest.mark.parametrize("expression", ["", " ; ", "0 9 * *", "0 9 * * * *", "0 24 * * *"])
+def test_parse_cron_schedule_rejects(expression):
+    with pytest.raises(ValueError):
+        bot.parse_cron_schedule(expression)
+
+
+@pytest.mark.parametrize(
+    "expression, after, expected",
+    [
+        # Friday afternoon rolls over the weekend to Monday morning.
+        ("5 9,14 * * 1-5", datetime(2026, 10, 16, 14, 5), datetime(2026, 10, 19, 9, 5)),
+        ("5 9,14 * * 1-5", datetime(2026, 10, 19, 9, 4, 59), datetime(2026, 10, 19, 9, 5)),
+        ("5 9,14 * * 1-5", datetime(2026, 10, 19, 9, 5, 30), datetime(2026, 10, 19, 14, 5)),
+        # Several ";"-separated expressions: the earliest slot wins.
+        ("0 10 * * 1; 30 8 * * 2", datetime(2026, 10, 19, 11, 0), datetime(2026, 10, 20, 8, 30)),
+        # Day-of-month and day-of-week both restricted: either one matches.
+        ("0 9 1 * 5", datetime(2026, 10, 19, 0, 0), datetime(2026, 10, 23, 9, 0)),
+        ("0 9 1 * 5", datetime(2026, 10, 30, 10, 0), datetime(2026, 11, 1, 9, 0)),
+    ],
+)
+def test_next_cron_time(expression, after, expected):
+    assert bot.next_cron_time(bot.parse_cron_schedule(expression), after) == expected
+
+
+def test_next_cron_time_impossible_schedule():
+    with pytest.raises(ValueError):
+        bot.next_cron_time(bot.parse_cron_schedule("0 9 31 2 *"), datetime(2026, 1, 1))
+
+
+def test_previous_cron_time():
+    schedules = bot.parse_cron_schedule("5 9,14 * * 1-5")
+    assert bot.previous_cron_time(schedules, datetime(2026, 10, 19, 13, 0)) == datetime(2026, 10, 19, 9, 5)
+    assert bot.previous_cron_time(schedules, datetime(2026, 10, 19, 9, 5, 40)) == datetime(2026, 10, 19, 9, 5)
+    assert bot.previous_cron_time(schedules, datetime(2026, 10, 19, 9, 0), max_minutes=60) is None
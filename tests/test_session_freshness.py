@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+import attendance_bot as bot
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    session_file = tmp_path / "slack_auth.json"
+    session_file.write_text('{"cookies": []}', encoding="utf-8")
+    monkeypatch.setattr(bot, "SESSION_FILE", str(session_file))
+    monkeypatch.setattr(bot, "BROWSER_PROFILE_DIR", "")
+    monkeypatch.setattr(bot, "SESSION_FRESH_SECONDS", 3600)
+    monkeypatch.setattr(bot, "SESSION_COOKIE_MIN_TTL_HOURS", 72)
+    monkeypatch.setattr(bot, "SESSION_COOKIE_NAMES", ["d"])
+    return session_file
+
+
+def fresh_meta(**changes):
+    meta = {
+        "verified_at": time.time() - 60,
+        "profile": bot.get_profile_fingerprint(),
+        "session_file_mtime": bot.get_session_file_mtime(),
+        "cookie_expiry": {"d": time.time() + 30 * 86400},
+    }
+    meta.update(changes)
+    return meta
+
+
+def test_fresh_session(session):
+    assert bot.get_session_staleness(fresh_meta()) is None
+
+
+def test_disabled(session, monkeypatch):
+    monkeypatch.setattr(bot, "SESSION_FRESH_SECONDS", 0)
+    assert bot.get_session_staleness(fresh_meta()) == "disabled"
+
+
+@pytest.mark.parametrize("meta", [None, {}])
+def test_never_verified(session, meta):
+    assert bot.get_session_staleness(meta) == "never_verified"
+
+
+def test_old_verification(session):
+    assert bot.get_session_staleness(fresh_meta(verified_at=time.time() - 3601)) == "verification_old"
+
+
+def test_profile_changed(session, monkeypatch):
+    meta = fresh_meta()
+    monkeypatch.setattr(bot, "BROWSER_PROFILE_DIR", str(session.parent / "profile"))
+    assert bot.get_session_staleness(meta) == "profile_changed"
+
+
+def test_session_file_changed(session):
+    meta = fresh_meta(session_file_mtime=bot.get_session_file_mtime() - 10)
+    assert bot.get_session_staleness(meta) == "session_file_changed"
+
+
+@pytest.mark.parametrize(
+    "expiry, expected",
+    [
+        ({}, "cookie_d_unknown"),
+        ({"d": -1}, "cookie_d_unknown"),
+        ({"d": time.time() + 3600}, "cookie_d_expiring"),
+    ],
+)
+def test_cookie_expiry(session, expiry, expected):
+    assert bot.get_session_staleness(fresh_meta(cookie_expiry=expiry)) == expected
+
+
+def test_every_named_cookie_is_checked(session, monkeypatch):
+    monkeypatch.setattr(bot, "SESSION_COOKIE_NAMES", ["d", "d-s"])
+    assert bot.get_session_staleness(fresh_meta()) == "cookie_d-s_unknown"
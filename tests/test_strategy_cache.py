@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import attendance_bot as bot
+
+STRATEGIES = [{"name": "a"}, {"name": "b"}, {"name": "c"}, {"name": "d"}]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "SESSION_FILE", str(tmp_path / "slack_auth.json"))
+    monkeypatch.setattr(bot, "STRATEGY_CACHE", True)
+    monkeypatch.setattr(bot, "STRATEGY_CACHE_FILE", "")
+    monkeypatch.setattr(bot, "strategy_cache", {"path": None, "kinds": {}})
+    return tmp_path / "slack_auth.strategies.json"
+
+
+def write_cache(path, kinds):
+    path.write_text(json.dumps({"kinds": kinds}), encoding="utf-8")
+
+
+def names(strategies):
+    return [strategy["name"] for strategy in strategies]
+
+
+def test_empty_cache_keeps_order(cache):
+    assert bot.ordered_strategies("present_option", STRATEGIES) is STRATEGIES
+
+
+def test_most_recent_winner_first(cache):
+    write_cache(
+        cache,
+        {
+            "present_option": {
+                "b": {"hits": 9, "last_success": "2026-10-18T09:05:00"},
+                "c": {"hits": 1, "last_success": "2026-10-19T09:05:00"},
+            }
+        },
+    )
+    assert names(bot.ordered_strategies("present_option", STRATEGIES)) == ["c", "b", "a", "d"]
+
+
+def test_hits_break_ties_and_bad_dates_rank_last(cache):
+    write_cache(
+        cache,
+        {
+            "survey_root": {
+                "d": {"hits": 5, "last_success": "2026-10-19T09:05:00"},
+                "a": {"hits": 2, "last_success": "2026-10-19T09:05:00"},
+                "b": {"hits": 50, "last_success": "garbage"},
+            }
+        },
+    )
+    assert names(bot.ordered_strategies("survey_root", STRATEGIES)) == ["d", "a", "b", "c"]
+    assert bot.ordered_strategies("present_option", STRATEGIES) is STRATEGIES
+
+
+def test_disabled_cache_keeps_order(cache, monkeypatch):
+    write_cache(cache, {"present_option": {"d": {"hits": 1, "last_success": "2026-10-19T09:05:00"}}})
+    monkeypatch.setattr(bot, "STRATEGY_CACHE", False)
+    assert names(bot.ordered_strategies("present_option", STRATEGIES)) == ["a", "b", "c", "d"]
+
+
+def test_unreadable_cache_is_ignored(cache):
+    cache.write_text("{not json", encoding="utf-8")
+    assert bot.ordered_strategies("present_option", STRATEGIES) is STRATEGIES
+
+
+def test_remember_hit_persists(cache, monkeypatch):
+    bot.remember_strategy_hit("present_option", "c")
+    bot.remember_strategy_hit("present_option", "c")
+    bot.remember_strategy_hit("not_a_cached_kind", "x")
+    saved = json.loads(cache.read_text(encoding="utf-8"))["kinds"]
+    assert list(saved) == ["present_option"]
+    assert saved["present_option"]["c"]["hits"] == 2
+
+    # A fresh process reads the file back.
+    monkeypatch.setattr(bot, "strategy_cache", {"path": None, "kinds": {}})
+    assert names(bot.ordered_strategies("present_option", STRATEGIES)) == ["c", "a", "b", "d"]
+
+
+def test_record_strategy_hit_without_remembering(cache):
+    bot.reset_run_metrics()
+    bot.record_strategy_hit("present_option", "network-option-value", remember=False)
+    assert bot.run_metrics["strategies"]["present_option"] == "network-option-value"
+    assert not cache.exists()
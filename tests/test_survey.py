@@ -0,0 +1,114 @@
+import pytest
+
+import attendance_bot as bot
+
+
+@pytest.fixture
+def survey_env(monkeypatch):
+    monkeypatch.setattr(bot, "CHANNEL_ID", "C123")
+    monkeypatch.setattr(bot, "SURVEY_BOT_NAME", "Mia")
+
+
+def option(text, value):
+    return {"text": {"type": "plain_text", "text": text}, "value": value}
+
+
+def survey_message(*options, **fields):
+    message = {
+        "ts": "1760000000.000100",
+        "username": "Mia",
+        "blocks": [
+            {"type": "section", "block_id": "prompt", "text": {"type": "mrkdwn", "text": "Please select an option"}},
+            {
+                "type": "actions",
+                "block_id": "attendance",
+                "elements": [{"type": "radio_buttons", "action_id": "vote", "options": list(options)}],
+            },
+        ],
+    }
+    message.update(fields)
+    return message
+
+
+@pytest.mark.parametrize(
+    "label, value, expected",
+    [
+        ("present", "anything", "exact"),
+        ("in the office", "PRESENT", "exact"),
+        ("present ✅", "opt-1", "word"),
+        ("i am present today", "opt-1", "word"),
+        ("not present", "opt-2", None),
+        ("i'm present, not remote", "opt-2", None),
+        ("isn't present", "opt-2", None),
+        ("non-present", "opt-2", None),
+        ("omnipresent", "opt-3", None),
+        ("absent", "absent", None),
+    ],
+)
+def test_is_present_label(label, value, expected):
+    assert bot.is_present_label(label, value) == expected
+
+
+def test_extracts_exact_option_over_word_match(survey_env):
+    message = survey_message(option("Present ✅", "yes"), option("Not present", "no"), option("Present", "p"))
+    assert bot.extract_survey_block(message) == {
+        "ts": "1760000000.000100",
+        "block_id": "attendance",
+        "action_id": "vote",
+        "value": "p",
+        "label": "Present",
+    }
+
+
+def test_falls_back_to_first_word_match(survey_env):
+    message = survey_message(option("Not present", "no"), option("Present ✅", "yes"), option("Present  today", "t"))
+    survey = bot.extract_survey_block(message)
+    assert (survey["value"], survey["label"]) == ("yes", "Present ✅")
+
+
+def test_accessory_button(survey_env):
+    message = survey_message()
+    message["blocks"][1] = {
+        "type": "section",
+        "block_id": "button-block",
+        "accessory": {"type": "button", "action_id": "press", "value": "present", "text": {"text": "I'm here"}},
+    }
+    survey = bot.extract_survey_block(message)
+    assert (survey["block_id"], survey["action_id"], survey["value"]) == ("button-block", "press", "present")
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        {"channel": "C999"},
+        {"username": "Someone else"},
+        {"bot_profile": {"name": "Other bot"}, "username": ""},
+    ],
+)
+def test_ignores_other_channels_and_senders(survey_env, fields):
+    assert bot.extract_survey_block(survey_message(option("Present", "p"), **fields)) is None
+
+
+def test_message_without_bot_name_is_eligible(survey_env):
+    message = survey_message(option("Present", "p"), username=None, channel="C123")
+    assert bot.extract_survey_block(message)["value"] == "p"
+
+
+def test_requires_survey_prompt(survey_env):
+    message = survey_message(option("Present", "p"))
+    message["blocks"][0]["text"]["text"] = "Lunch order"
+    assert bot.extract_survey_block(message) is None
+
+
+def test_no_present_option(survey_env):
+    assert bot.extract_survey_block(survey_message(option("Not present", "no"), option("Remote", "r"))) is None
+
+
+def test_record_network_messages_keeps_newest_survey(survey_env):
+    network = {"survey": None}
+    older = survey_message(option("Present", "p"))
+    newer = survey_message(option("Present", "p"), ts="1760000100.000200")
+    assert bot.record_network_messages(network, {"messages": [newer, older]})
+    assert network["survey"]["ts"] == "1760000100.000200"
+    assert not bot.record_network_messages(network, {"messages": [older]})
+    assert network["survey"]["ts"] == "1760000100.000200"